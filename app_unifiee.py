@@ -1,10 +1,19 @@
 import streamlit as st
 import os
 import sys
+import time
+
+# Début du rerun (durée exportée dans les métriques)
+rerun_start = time.perf_counter()
 
 # Ajouter le répertoire parent au path pour les imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from modules.memoire import memory_sidebar
+from modules.metriques import record_rerun
+from modules.mesures import performance_sidebar
+from modules.registre import registry_sidebar
+
 # Configuration de la page
 st.set_page_config(
     page_title="Plateforme d'Analyse Scolaire",
@@ -49,7 +58,8 @@ st.markdown("""
 st.sidebar.title("Navigation")
 page = st.sidebar.radio(
     "Aller à",
-    ["Accueil", "Tableaux Scolaires", "Analyse des Salles", "Totaux par École", "Ratios et Statistiques"]
+    ["Accueil", "Tableaux Scolaires", "Analyse des Salles", "Totaux par École", "Ratios et Statistiques", "Profil d'École",
+     "Comparaison de Versions"]
 )
 
 # Fonction pour gérer les imports dynamiques
@@ -103,6 +113,34 @@ elif page == "Ratios et Statistiques":
     else:
         st.error("Impossible de charger le module ratios")
 
+elif page == "Profil d'École":
+    profil = load_module("profil")
+    if profil and hasattr(profil, "main"):
+        profil.main()
+    elif profil:
+        st.error("La fonction 'main' est introuvable dans le module profil")
+    else:
+        st.error("Impossible de charger le module profil")
+
+elif page == "Comparaison de Versions":
+    comparaison = load_module("comparaison")
+    if comparaison and hasattr(comparaison, "main"):
+        comparaison.main()
+    elif comparaison:
+        st.error("La fonction 'main' est introuvable dans le module comparaison")
+    else:
+        st.error("Impossible de charger le module comparaison")
+
+# Mémoire de la session et des jeux de données partagés par les sessions
+memory_sidebar()
+registry_sidebar()
+
+# Durée des étapes des derniers reruns (panneau facultatif)
+performance_sidebar()
+
 # Ajout d'un pied de page
 st.sidebar.markdown("---")
-st.sidebar.info("Plateforme d'Analyse Scolaire - © 2024")
\ No newline at end of file
+st.sidebar.info("Plateforme d'Analyse Scolaire - © 2024")
+
+# Durée du rerun pour les métriques exportées (fichier Prometheus et journal JSON Lines)
+record_rerun(page, time.perf_counter() - rerun_start)
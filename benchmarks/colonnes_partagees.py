@@ -0,0 +1,102 @@
+"""Mémoire occupée par plusieurs processus qui ouvrent la même feuille
+
+Chaque processus charge Sheet4 (agrandie) soit en désérialisant une copie du DataFrame, comme le
+fait st.cache_data pour chaque session, soit en ouvrant le stockage par colonnes projeté en mémoire.
+La mémoire proportionnelle (PSS, Linux) répartit les pages partagées entre les processus qui les
+utilisent : elle diminue quand les colonnes sont partagées.
+
+    python benchmarks/colonnes_partagees.py --facteur 3000 --processus 4
+"""
+import argparse
+import multiprocessing
+import os
+import pickle
+import sys
+import tempfile
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.colonnes import write_columns  # noqa: E402
+from modules.lecture import read_columns  # noqa: E402
+from modules.nettoyage import SHEET_SCHEMAS, clean_sheet4_data  # noqa: E402
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+
+def proportional_memory():
+    """PSS du processus courant en Mo (None hors Linux)"""
+    try:
+        with open('/proc/self/smaps_rollup') as rollup:
+            for line in rollup:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+def open_copy(path, ready, done):
+    """Session servie par une copie désérialisée"""
+    with open(path, 'rb') as source:
+        df = pickle.load(source)
+    df['Nbre élèves total'].sum()
+    ready.put(proportional_memory())
+    done.wait()
+
+def open_mapped(path, ready, done):
+    """Session servie par les colonnes projetées en mémoire"""
+    from modules.colonnes import open_columns
+    df = open_columns(path)
+    df['Nbre élèves total'].sum()
+    ready.put(proportional_memory())
+    done.wait()
+
+def measure(target, path, processes):
+    """Démarre les processus, attend qu'ils aient tous chargé la table ; retourne leurs PSS"""
+    context = multiprocessing.get_context('spawn')
+    ready, done = context.Queue(), context.Event()
+    workers = [context.Process(target=target, args=(path, ready, done)) for _ in range(processes)]
+
+    for worker in workers:
+        worker.start()
+    memory = [ready.get() for _ in workers]
+    done.set()
+    for worker in workers:
+        worker.join()
+
+    return memory
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--facteur', type=int, default=3000, help="Nombre de répétitions des lignes")
+    parser.add_argument('--processus', type=int, default=4, help="Nombre de sessions simulées")
+    args = parser.parse_args()
+
+    with open(os.path.join(DATA_DIR, 'FIFA project.xlsx'), 'rb') as source:
+        sheet = clean_sheet4_data(read_columns(source, 'Sheet4', SHEET_SCHEMAS['Sheet4']))
+    df = pd.concat([sheet] * args.facteur, ignore_index=True)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        pickled = os.path.join(workdir, 'copie.pkl')
+        with open(pickled, 'wb') as target:
+            pickle.dump(df, target, protocol=pickle.HIGHEST_PROTOCOL)
+        mapped = os.path.join(workdir, 'table')
+        write_columns(df, mapped)
+
+        results = []
+        for label, target, path in [('Copie par session', open_copy, pickled),
+                                    ('Colonnes projetées', open_mapped, mapped)]:
+            memory = measure(target, path, args.processus)
+            results.append({
+                'Chargement': label,
+                'Processus': args.processus,
+                'PSS moyen (Mo)': round(sum(memory) / len(memory), 1) if None not in memory else None,
+                'PSS total (Mo)': round(sum(memory), 1) if None not in memory else None,
+            })
+
+    print(f"Sheet4 agrandie {args.facteur} fois : {len(df)} lignes, "
+          f"{df.memory_usage(deep=True).sum() / 2 ** 20:.1f} Mo en DataFrame")
+    print(pd.DataFrame(results).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Compare la lecture complète (pandas, inférence de type) et la lecture par schéma (read_columns)
+
+Les classeurs d'exemple sont agrandis en répétant leurs lignes, puis chaque feuille est lue des deux
+façons. Temps (meilleur de --repetitions) et mémoire (pic tracemalloc, taille du DataFrame) sont
+mesurés séparément, tracemalloc ralentissant fortement la lecture.
+
+Chaque feuille est ensuite exportée en CSV, Parquet et JSON Lines pour comparer la lecture par
+schéma des différents formats acceptés par les téléverseurs.
+
+    python benchmarks/lecture_colonnes.py --facteur 200 > bench_output.txt
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import openpyxl
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.annees import BD_SCHEMA  # noqa: E402
+from modules.lecture import FLAT_FORMATS, read_columns  # noqa: E402
+from modules.nettoyage import SHEET_SCHEMAS  # noqa: E402
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+# (page, classeur, feuille, schéma)
+READS = [
+    ('Tableaux Scolaires', 'BD.xlsx', 0, BD_SCHEMA),
+    ('Totaux par École', 'FIFA project.xlsx', 'Sheet4', SHEET_SCHEMAS['Sheet4']),
+    ('Ratios et Statistiques', 'FIFA project.xlsx', 'Sheet3', SHEET_SCHEMAS['Sheet3']),
+    ('Analyse des Salles', 'FIFA project.xlsx', 'Sheet5', SHEET_SCHEMAS['Sheet5']),
+]
+
+
+def scale_workbook(path, factor, output):
+    """Écrit une copie du classeur dont les lignes de données sont répétées `factor` fois"""
+    source = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    scaled = openpyxl.Workbook(write_only=True)
+
+    for worksheet in source.worksheets:
+        rows = list(worksheet.iter_rows(values_only=True))
+        target = scaled.create_sheet(worksheet.title)
+        target.append(rows[0])
+        for _ in range(factor):
+            for row in rows[1:]:
+                target.append(row)
+
+    source.close()
+    scaled.save(output)
+
+def export_flat(df, stem):
+    """Écrit la feuille dans chacun des formats à table unique ; retourne format -> chemin"""
+    df = df.rename(columns=str)
+    writers = {
+        'csv': lambda path: df.to_csv(path, index=False),
+        'parquet': lambda path: df.astype({col: 'string' for col in df.select_dtypes('object')})
+                                  .to_parquet(path, index=False),
+        'jsonl': lambda path: df.to_json(path, orient='records', lines=True, force_ascii=False),
+    }
+
+    paths = {}
+    for extension, fmt in FLAT_FORMATS.items():
+        paths[fmt] = f"{stem}{extension}"
+        writers[fmt](paths[fmt])
+
+    return paths
+
+def measure(read, repetitions):
+    """Meilleur temps de lecture, pic mémoire pendant la lecture et taille du résultat"""
+    timings = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        df = read()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    read()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return df, min(timings), peak, df.memory_usage(deep=True).sum()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--facteur', type=int, default=100, help="Nombre de répétitions des lignes")
+    parser.add_argument('--repetitions', type=int, default=1, help="Lectures chronométrées par mesure")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        scaled = {}
+        for workbook in sorted({workbook for _, workbook, _, _ in READS}):
+            scaled[workbook] = os.path.join(workdir, workbook)
+            scale_workbook(os.path.join(DATA_DIR, workbook), args.facteur, scaled[workbook])
+
+        results, formats = [], []
+        for page, workbook, sheet, schema in READS:
+            with open(scaled[workbook], 'rb') as source:
+                def full_read():
+                    source.seek(0)
+                    return pd.read_excel(source, sheet_name=sheet, engine='openpyxl')
+
+                before, before_time, before_peak, before_size = measure(full_read, args.repetitions)
+                after, after_time, after_peak, after_size = measure(
+                    lambda: read_columns(source, sheet, schema), args.repetitions
+                )
+
+            results.append({
+                'Page': page,
+                'Lignes': len(after),
+                'Colonnes avant': before.shape[1],
+                'Colonnes après': after.shape[1],
+                'Temps avant (s)': round(before_time, 2),
+                'Temps après (s)': round(after_time, 2),
+                'Pic avant (Mo)': round(before_peak / 2 ** 20, 1),
+                'Pic après (Mo)': round(after_peak / 2 ** 20, 1),
+                'DataFrame avant (Mo)': round(before_size / 2 ** 20, 2),
+                'DataFrame après (Mo)': round(after_size / 2 ** 20, 2),
+            })
+
+            # Même feuille, même schéma, autres formats
+            timings = {'Page': page, 'Excel (s)': round(after_time, 2)}
+            for fmt, path in export_flat(before, os.path.join(workdir, str(sheet))).items():
+                with open(path, 'rb') as source:
+                    _, elapsed, _, _ = measure(lambda: read_columns(source, 0, schema), args.repetitions)
+                timings[f'{fmt.upper()} (s)'] = round(elapsed, 3)
+            formats.append(timings)
+
+    print(f"Classeurs agrandis {args.facteur} fois")
+    print(pd.DataFrame(results).to_string(index=False))
+    print()
+    print("Lecture par schéma selon le format")
+    print(pd.DataFrame(formats).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import hashlib
+import numpy as np
+import pandas as pd
+from modules.consolidation import AREA_COLUMNS, school_keys
+from modules.stockage import latest_snapshot, save_snapshot
+from modules.mesures import measured
+
+# Indicateurs agrégés par zone (somme et effectif renseigné) et classés, par disposition
+CUBE_METRICS = {
+    'Sheet4': ['Nbre élèves total', 'Nbre enseignants total', 'Nbre DP total',
+               'Ratio élèves/DP total', 'Ratio élèves/enseignants total'],
+    'Sheet3': ['Total salles', 'Salles utilisées', 'Salles non utilisées', 'Autres usages'],
+    'Sheet5': ['Superficie (m²)', 'Nombre de prises', 'Nombre de fenêtres'],
+    'BD': ['Nbre DP.5', 'Nbre enseign.5', 'Nbre Eleves.5']
+}
+
+# Colonnes catégorielles dont les effectifs par modalité sont tenus à jour
+CUBE_CATEGORIES = {
+    'Sheet4': ['Catégorie taille', 'Catégorie ratio']
+}
+
+# Part minimale d'écoles communes avec la version précédente pour une mise à jour incrémentale
+MIN_SHARED_SCHOOLS = 0.5
+
+# Version du format de l'état : tout changement impose un recalcul complet des états enregistrés
+SNAPSHOT_VERSION = 2
+
+# Multiplicateur mêlant le rang de la ligne à son empreinte (ordre des lignes d'une école)
+_RANK_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def schema_hash(df):
+    """Empreinte des colonnes et de leurs types : tout changement impose un recalcul complet"""
+    schema = [SNAPSHOT_VERSION] + [(str(col), str(dtype)) for col, dtype in df.dtypes.items()]
+    return hashlib.sha1(repr(schema).encode('utf-8')).hexdigest()
+
+def dataset_lineage(df, layout):
+    """Lignée d'un jeu : ensemble des zones qu'il couvre
+
+    Les versions successives d'un même fichier régional partagent leur état ; deux fichiers
+    de régions différentes (deux inspecteurs, par exemple) ne se comparent jamais entre eux.
+    """
+    area_column = AREA_COLUMNS[layout]
+    zones = df[area_column].dropna().astype(str).str.strip().unique() if area_column in df.columns else []
+    return hashlib.sha1(repr(sorted(zones)).encode('utf-8')).hexdigest()
+
+def row_keys(df, layout):
+    """Clé d'école de chaque ligne (lignes sans nom regroupées par zone) et rang de la ligne dans l'école"""
+    keys, _ = school_keys(df, layout)
+    codes, _ = pd.factorize(keys)
+    ranks = pd.Series(codes).groupby(codes, sort=False).cumcount().to_numpy()
+
+    return keys, ranks
+
+def line_labels(keys, ranks):
+    """Clés de ligne « école#rang » servant aux classements"""
+    return keys.to_numpy(dtype=object) + '#' + ranks.astype(str).astype(object)
+
+def school_hashes(df, keys, ranks):
+    """Empreinte de chaque école : empreintes de ses lignes, mêlées à leur rang puis sommées"""
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+    with np.errstate(over='ignore'):
+        mixed = pd.util.hash_array(row_hashes ^ (ranks.astype(np.uint64) * _RANK_MIX))
+
+    codes, uniques = pd.factorize(keys)
+    sums = pd.Series(mixed).groupby(codes, sort=False).sum()
+    return pd.Series(sums.to_numpy(), index=pd.Index(uniques, dtype=object)[sums.index])
+
+def school_partials(df, keys, layout):
+    """Agrégats partiels par école : zone, lignes, sommes et effectifs des valeurs finies, infinis, modalités
+
+    Les valeurs infinies (ratio d'une école sans DP, par exemple) sont comptées à part pour
+    que les sommes restent exactes et que la moyenne vaille ±inf comme avec pandas.
+    """
+    area_column = AREA_COLUMNS[layout]
+    zones = df[area_column] if area_column in df.columns else pd.Series(np.nan, index=df.index)
+
+    columns = {'Zone': zones.to_numpy(dtype=object), 'Lignes': np.ones(len(df), dtype='int64')}
+    for metric in (m for m in CUBE_METRICS[layout] if m in df.columns):
+        values = pd.to_numeric(df[metric], errors='coerce').to_numpy(dtype=float)
+        finite = np.isfinite(values)
+        columns[f'{metric}|somme'] = np.where(finite, values, 0.0)
+        columns[f'{metric}|n'] = finite.astype('int64')
+        columns[f'{metric}|+inf'] = (values == np.inf).astype('int64')
+        columns[f'{metric}|-inf'] = (values == -np.inf).astype('int64')
+    for category in (c for c in CUBE_CATEGORIES.get(layout, []) if c in df.columns):
+        for value, indicator in pd.get_dummies(df[category].astype(str)).items():
+            columns[f'{category}={value}'] = indicator.to_numpy(dtype='int64')
+
+    partials = pd.DataFrame(columns, index=keys.to_numpy())
+    counts = partials.drop(columns='Zone').groupby(level=0).sum()
+    counts.insert(0, 'Zone', partials['Zone'].groupby(level=0).first())
+
+    return counts
+
+def zone_cube(partials):
+    """Cube par zone : somme des agrégats partiels des écoles (zone manquante : « Non renseignée »)"""
+    zones = partials['Zone'].fillna('Non renseignée').astype(str)
+    return partials.drop(columns='Zone').groupby(zones.to_numpy()).sum()
+
+def metric_rankings(df, keys, ranks, layout):
+    """Classement décroissant de chaque indicateur : clé de ligne, clé d'école, valeur"""
+    rankings = {}
+    for metric in (m for m in CUBE_METRICS[layout] if m in df.columns):
+        values = pd.to_numeric(df[metric], errors='coerce').to_numpy(dtype=float)
+        present = ~np.isnan(values)
+        order = np.argsort(-values[present], kind='stable')
+        rankings[metric] = pd.DataFrame({
+            'Ligne': line_labels(keys[present], ranks[present])[order],
+            'École': keys.to_numpy()[present][order],
+            'Valeur': values[present][order]
+        })
+
+    return rankings
+
+def merge_ranking(ranking, changed, additions):
+    """Retire les lignes des écoles modifiées et insère les nouvelles à leur rang (fusion de listes triées)"""
+    kept = ranking[~ranking['École'].isin(changed)]
+    additions = additions.iloc[np.argsort(-additions['Valeur'].to_numpy(), kind='stable')]
+
+    positions = np.searchsorted(-kept['Valeur'].to_numpy(), -additions['Valeur'].to_numpy(), side='right')
+    merged = {
+        col: np.insert(kept[col].to_numpy(), positions, additions[col].to_numpy())
+        for col in ranking.columns
+    }
+    return pd.DataFrame(merged)
+
+def _counts_as_int(table):
+    """Effectifs remis en entiers après une somme ou une différence alignée (colonnes absentes : 0)"""
+    counts = [col for col in table.columns if col != 'Zone' and not col.endswith('|somme')]
+    table[counts] = table[counts].fillna(0).astype('int64')
+    return table
+
+def build_snapshot(df, layout):
+    """État complet d'une feuille : empreintes, agrégats partiels, cube et classements"""
+    keys, ranks = row_keys(df, layout)
+    partials = school_partials(df, keys, layout)
+
+    return {
+        'schema': schema_hash(df),
+        'hashes': school_hashes(df, keys, ranks),
+        'partials': partials,
+        'cube': zone_cube(partials),
+        'rankings': metric_rankings(df, keys, ranks, layout)
+    }
+
+def update_snapshot(previous, df, layout):
+    """Met à jour l'état précédent à partir des seules écoles ajoutées, supprimées ou modifiées
+
+    Retourne le nouvel état et les clés des écoles concernées ; l'état vaut None si les deux
+    versions ont moins de MIN_SHARED_SCHOOLS écoles inchangées en commun (recalcul complet).
+    """
+    keys, ranks = row_keys(df, layout)
+    hashes = school_hashes(df, keys, ranks)
+
+    old_hashes = previous['hashes']
+    common = hashes.index.intersection(old_hashes.index)
+    changed = (
+        hashes.index.difference(old_hashes.index)
+        .union(old_hashes.index.difference(hashes.index))
+        .union(common[hashes[common].to_numpy() != old_hashes[common].to_numpy()])
+    )
+    schools = hashes.index.union(old_hashes.index)
+    if len(schools) and 1 - len(changed) / len(schools) < MIN_SHARED_SCHOOLS:
+        return None, changed
+
+    # Seules les lignes des écoles concernées sont agrégées et classées
+    subset = keys.isin(changed).to_numpy()
+    new_partials = school_partials(df[subset], keys[subset], layout)
+    old_partials = previous['partials'].loc[previous['partials'].index.intersection(changed)]
+
+    partials = _counts_as_int(pd.concat([previous['partials'].drop(old_partials.index), new_partials]))
+    cube = _counts_as_int(
+        previous['cube']
+        .sub(zone_cube(old_partials), fill_value=0)
+        .add(zone_cube(new_partials), fill_value=0)
+    )
+    cube = cube[cube['Lignes'] > 0]
+
+    additions = metric_rankings(df[subset], keys[subset], ranks[subset], layout)
+    rankings = {
+        metric: merge_ranking(ranking, changed, additions[metric])
+        for metric, ranking in previous['rankings'].items()
+    }
+
+    snapshot = {
+        'schema': previous['schema'],
+        'hashes': hashes,
+        'partials': partials,
+        'cube': cube,
+        'rankings': rankings
+    }
+    return snapshot, changed
+
+@measured("Agrégats par zone et classements")
+def ingest_snapshot(layout, df, file_digest):
+    """État agrégé d'une feuille, calculé de façon incrémentale par rapport à la dernière version
+    enregistrée de la même lignée (voir dataset_lineage)
+
+    Un recalcul complet a lieu en l'absence de version précédente, si le schéma change ou si
+    les deux versions ont trop peu d'écoles en commun.
+    Retourne l'état et un résumé : mode ('complet', 'incrémental' ou 'identique') et écoles concernées.
+    """
+    lineage = dataset_lineage(df, layout)
+    previous = latest_snapshot(layout, lineage)
+
+    if previous is not None and previous['digest'] == file_digest:
+        return previous, {'mode': 'identique', 'écoles': len(previous['hashes']), 'modifiées': 0}
+
+    snapshot = None
+    if previous is not None and previous['schema'] == schema_hash(df):
+        snapshot, changed = update_snapshot(previous, df, layout)
+
+    if snapshot is None:
+        snapshot = build_snapshot(df, layout)
+        summary = {'mode': 'complet', 'écoles': len(snapshot['hashes']), 'modifiées': len(snapshot['hashes'])}
+    else:
+        summary = {'mode': 'incrémental', 'écoles': len(snapshot['hashes']), 'modifiées': len(changed)}
+
+    snapshot['digest'] = file_digest
+    save_snapshot(layout, lineage, file_digest, snapshot)
+
+    return snapshot, summary
+
+def ranked_positions(snapshot, df, layout, metric):
+    """Positions des lignes de `df` dans l'ordre du classement (valeurs manquantes en dernier)"""
+    ranked = pd.Index(line_labels(*row_keys(df, layout))).get_indexer(snapshot['rankings'][metric]['Ligne'].to_numpy())
+    missing = np.setdiff1d(np.arange(len(df)), ranked, assume_unique=True)
+
+    return np.concatenate([ranked, missing])
@@ -0,0 +1,85 @@
+import heapq
+import numpy as np
+import pandas as pd
+from modules.nettoyage import RATIO_CATEGORIES, ratio_category
+
+# Ressources pouvant être réparties : colonne de la ressource -> colonne du ratio correspondant
+RESOURCES = {
+    'Nbre DP total': 'Ratio élèves/DP total',
+    'Nbre enseignants total': 'Ratio élèves/enseignants total'
+}
+
+OBJECTIVES = ['Ratio maximal', 'Variance des ratios']
+
+
+def _priorities(pupils, resources, objective):
+    """Gain (négatif, pour le tas min) apporté par une unité supplémentaire à chaque école"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        current = np.where(resources > 0, pupils / resources, np.inf)
+
+        if objective == 'Ratio maximal':
+            # Servir d'abord l'école la plus chargée
+            return -current
+
+        # Variance : plus forte baisse du carré du ratio
+        after = pupils / (resources + 1)
+        return -(np.where(np.isinf(current), np.inf, current ** 2 - after ** 2))
+
+def allocate_group(pupils, resources, budget, objective='Ratio maximal'):
+    """Répartit `budget` unités entre les écoles d'un groupe à l'aide d'une file de priorité
+
+    Retourne le nombre d'unités attribuées à chaque école.
+    """
+    added = np.zeros(len(pupils), dtype=int)
+    valid = np.flatnonzero(~np.isnan(pupils) & ~np.isnan(resources) & (pupils > 0))
+
+    if budget <= 0 or len(valid) == 0:
+        return added
+
+    heap = list(zip(_priorities(pupils[valid], resources[valid], objective).tolist(), valid.tolist()))
+    heapq.heapify(heap)
+
+    for _ in range(budget):
+        _, school = heapq.heappop(heap)
+        added[school] += 1
+
+        new_priority = _priorities(
+            pupils[school:school + 1], resources[school:school + 1] + added[school], objective
+        )[0]
+        heapq.heappush(heap, (float(new_priority), school))
+
+    return added
+
+def allocate_resources(df, group_col, resource_col, budget, objective='Ratio maximal'):
+    """Attribue `budget` unités de `resource_col` par groupe (Moughataa ou région)
+
+    Retourne le DataFrame des écoles avec les unités ajoutées et le ratio avant/après.
+    """
+    ratio_col = RESOURCES[resource_col]
+    pupils = pd.to_numeric(df['Nbre élèves total'], errors='coerce').to_numpy(dtype=float)
+    resources = pd.to_numeric(df[resource_col], errors='coerce').to_numpy(dtype=float)
+    added = np.zeros(len(df), dtype=int)
+
+    for positions in df.groupby(group_col, sort=False).indices.values():
+        added[positions] = allocate_group(pupils[positions], resources[positions], budget, objective)
+
+    result = df[[group_col, 'Ecole', 'Nbre élèves total', resource_col]].copy()
+    result['Unités ajoutées'] = added
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result[f'{ratio_col} (avant)'] = np.where(resources > 0, pupils / resources, np.nan).round(1)
+        result[f'{ratio_col} (après)'] = np.where(
+            resources + added > 0, pupils / (resources + added), np.nan
+        ).round(1)
+
+    result['Catégorie (avant)'] = ratio_category(result[f'{ratio_col} (avant)'])
+    result['Catégorie (après)'] = ratio_category(result[f'{ratio_col} (après)'])
+
+    return result
+
+def category_shift(result):
+    """Nombre d'écoles par catégorie de ratio avant et après répartition"""
+    return pd.DataFrame({
+        'Avant': result['Catégorie (avant)'].value_counts(),
+        'Après': result['Catégorie (après)'].value_counts()
+    }).reindex(RATIO_CATEGORIES + ['Non définie']).fillna(0).astype(int).rename_axis('Catégorie ratio')
@@ -0,0 +1,137 @@
+import warnings
+import numpy as np
+import pandas as pd
+from modules.mesures import measured
+
+# Structure de la base BD : 3 colonnes d'identification puis 3 indicateurs par année
+BASE_COLUMNS = ['Region', 'Moughataa', "Nom de l'ecole"]
+YEAR_METRICS = ['Nbre DP', 'Nbre enseign', 'Nbre Eleves']
+N_YEARS = 6
+
+# Colonnes lues dans la base BD (les indicateurs répétés chaque année reçoivent les suffixes .1 à .5)
+BD_SCHEMA = {**{col: 'object' for col in BASE_COLUMNS}, **{metric: 'int64' for metric in YEAR_METRICS}}
+
+
+def metric_matrix(df, metric):
+    """Extrait un indicateur pour les 6 années sous forme de matrice (écoles × années)"""
+    offset = YEAR_METRICS.index(metric)
+    positions = [len(BASE_COLUMNS) + year * len(YEAR_METRICS) + offset for year in range(N_YEARS)]
+
+    return df.iloc[:, positions].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+
+def to_long(df):
+    """Convertit la base BD (une ligne par école) en format long (une ligne par école et par année)"""
+    n_schools = len(df)
+
+    long_df = pd.DataFrame({'Ligne': np.tile(np.arange(n_schools), N_YEARS)})
+    for position, col in enumerate(BASE_COLUMNS):
+        long_df[col] = np.tile(df.iloc[:, position].to_numpy(), N_YEARS)
+    long_df['Année'] = np.repeat(np.arange(1, N_YEARS + 1), n_schools)
+
+    for metric in YEAR_METRICS:
+        # Transposée : toutes les écoles de l'année 1, puis de l'année 2...
+        long_df[metric] = metric_matrix(df, metric).T.ravel()
+
+    return long_df
+
+def from_long(long_df):
+    """Reconstruit la base BD à 21 colonnes à partir du format long"""
+    long_df = long_df.sort_values(['Année', 'Ligne'])
+    first_year = long_df[long_df['Année'] == 1]
+
+    wide_df = first_year[BASE_COLUMNS].reset_index(drop=True)
+
+    for year in range(1, N_YEARS + 1):
+        year_rows = long_df[long_df['Année'] == year].set_index('Ligne').reindex(first_year['Ligne'])
+        suffix = '' if year == 1 else f'.{year - 1}'
+
+        for metric in YEAR_METRICS:
+            values = year_rows[metric].to_numpy(dtype=float)
+            # Retrouver des entiers lorsque la colonne d'origine n'en contenait que
+            if not np.isnan(values).any() and (values == np.round(values)).all():
+                values = values.astype('int64')
+            wide_df[f'{metric}{suffix}'] = values
+
+    return wide_df
+
+def yoy_growth(matrix):
+    """Croissance d'une année sur l'autre (%) pour toutes les écoles à la fois (écoles × 5)"""
+    previous, current = matrix[:, :-1], matrix[:, 1:]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = np.where(previous > 0, (current - previous) / previous * 100, np.nan)
+
+    return growth
+
+def compound_growth(matrix):
+    """Taux de croissance annuel moyen (%) entre la première et la dernière année"""
+    first, last = matrix[:, 0], matrix[:, -1]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cagr = np.where(
+            (first > 0) & (last >= 0),
+            (np.power(last / first, 1 / (N_YEARS - 1)) - 1) * 100,
+            np.nan
+        )
+
+    return cagr
+
+def linear_fit(matrix, years=None):
+    """Droites des moindres carrés de toutes les écoles (pentes, ordonnées), années manquantes ignorées
+
+    Toutes les droites sont ajustées en une seule opération matricielle.
+    """
+    if years is None:
+        years = np.arange(1, matrix.shape[1] + 1, dtype=float)
+    valid = ~np.isnan(matrix)
+    n = valid.sum(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_year = (valid * years).sum(axis=1) / n
+        mean_value = np.where(valid, matrix, 0).sum(axis=1) / n
+
+        centered_years = np.where(valid, years - mean_year[:, None], 0)
+        centered_values = np.where(valid, matrix - mean_value[:, None], 0)
+
+        slopes = (centered_years * centered_values).sum(axis=1) / (centered_years ** 2).sum(axis=1)
+
+    # Au moins deux années observées pour définir une pente
+    slopes = np.where(n >= 2, slopes, np.nan)
+    return slopes, mean_value - slopes * mean_year
+
+def trend_slopes(matrix):
+    """Pente des moindres carrés (unités par an) de chaque école"""
+    return linear_fit(matrix)[0]
+
+@measured("Indicateurs pluriannuels")
+def growth_metrics(df):
+    """Indicateurs pluriannuels de chaque école : croissance annuelle, TCAM et tendance"""
+    result = df.iloc[:, :len(BASE_COLUMNS)].copy()
+    result.columns = BASE_COLUMNS
+
+    for metric in YEAR_METRICS:
+        matrix = metric_matrix(df, metric)
+
+        result[f'{metric} année 1'] = matrix[:, 0]
+        result[f'{metric} année {N_YEARS}'] = matrix[:, -1]
+        with warnings.catch_warnings():
+            # Écoles sans aucune croissance calculable : NaN attendu
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            result[f'Croissance moyenne {metric} (%)'] = np.nanmean(yoy_growth(matrix), axis=1).round(1)
+        result[f'TCAM {metric} (%)'] = compound_growth(matrix).round(1)
+        result[f'Tendance {metric} (/an)'] = trend_slopes(matrix).round(2)
+
+    return result
+
+@measured("Totaux nationaux")
+def national_totals(df):
+    """Totaux nationaux par année et croissance d'une année sur l'autre"""
+    totals = pd.DataFrame({'Année': np.arange(1, N_YEARS + 1)})
+
+    for metric in YEAR_METRICS:
+        totals[metric] = np.nansum(metric_matrix(df, metric), axis=0)
+        totals[f'Croissance {metric} (%)'] = np.concatenate(
+            [[np.nan], yoy_growth(totals[[metric]].to_numpy().T)[0]]
+        ).round(1)
+
+    return totals
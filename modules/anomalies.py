@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from modules.annees import YEAR_METRICS, metric_matrix
+from modules.correspondance import SCHOOL_COLUMNS
+from modules.formulaires import run_if_changed
+from modules.pagination import paginated_dataframe
+from modules.exportation import export_buttons
+
+# Seuil du z-score robuste (médiane / MAD) au-delà duquel une valeur est aberrante
+ROBUST_Z_THRESHOLD = 3.5
+
+# Variation d'une année sur l'autre considérée comme un saut anormal (×10 ou ÷10)
+JUMP_FACTOR = 10
+
+
+def _numeric(df, column):
+    """Colonne convertie en nombres (NaN si absente)"""
+    if column not in df.columns:
+        return np.full(len(df), np.nan)
+    return pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float)
+
+def _group_column(df):
+    """Colonne géographique la plus fine disponible pour les comparaisons robustes"""
+    return next((col for col in ['Moughataa', 'Région', 'Region'] if col in df.columns), None)
+
+def robust_z_scores(df, column):
+    """Z-scores robustes |x - médiane| / (1,4826 × MAD), calculés par Moughataa (ou région)"""
+    values = pd.Series(_numeric(df, column), index=df.index)
+    group_col = _group_column(df)
+    groups = df[group_col].fillna('(inconnu)') if group_col else pd.Series(0, index=df.index)
+
+    medians = values.groupby(groups).transform('median')
+    mad = (values - medians).abs().groupby(groups).transform('median') * 1.4826
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = ((values - medians).abs() / mad.replace(0, np.nan)).to_numpy()
+
+    return z
+
+def _year_jumps(df):
+    """Saut d'un facteur JUMP_FACTOR entre deux années consécutives, sur au moins un indicateur BD"""
+    jumps = np.zeros(len(df), dtype=bool)
+
+    for metric in YEAR_METRICS:
+        matrix = metric_matrix(df, metric)
+        previous, current = matrix[:, :-1], matrix[:, 1:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = current / previous
+        jumps |= ((previous > 0) & (current > 0) & ((ratio >= JUMP_FACTOR) | (ratio <= 1 / JUMP_FACTOR))).any(axis=1)
+
+    return jumps
+
+def _bd_dp_over_pupils(df):
+    """Plus de DP que d'élèves sur au moins une année"""
+    return (metric_matrix(df, 'Nbre DP') > metric_matrix(df, 'Nbre Eleves')).any(axis=1)
+
+# Règles par feuille : (nom, masque des lignes en anomalie, colonne affichée comme valeur)
+RULES = {
+    'Sheet4': [
+        ("DP > élèves", lambda df: _numeric(df, 'Nbre DP total') > _numeric(df, 'Nbre élèves total'), 'Nbre DP total'),
+        ("Enseignants > élèves",
+         lambda df: _numeric(df, 'Nbre enseignants total') > _numeric(df, 'Nbre élèves total'), 'Nbre enseignants total'),
+        ("Aucun DP pour des élèves",
+         lambda df: (_numeric(df, 'Nbre DP total') == 0) & (_numeric(df, 'Nbre élèves total') > 0), 'Nbre DP total'),
+        ("Élèves manquants ou invalides", lambda df: np.isnan(_numeric(df, 'Nbre élèves total')), 'Nbre élèves total'),
+        ("Ratio élèves/DP aberrant",
+         lambda df: robust_z_scores(df, 'Ratio élèves/DP total') > ROBUST_Z_THRESHOLD, 'Ratio élèves/DP total'),
+    ],
+    'Sheet3': [
+        ("Salles utilisées > total",
+         lambda df: _numeric(df, 'Salles utilisées') > _numeric(df, 'Total salles'), 'Salles utilisées'),
+        ("Somme des salles > total",
+         lambda df: (np.nan_to_num(_numeric(df, 'Salles utilisées')) + np.nan_to_num(_numeric(df, 'Salles non utilisées'))
+                     + np.nan_to_num(_numeric(df, 'Autres usages'))) > _numeric(df, 'Total salles'), 'Total salles'),
+        ("Ratio minimum > maximum",
+         lambda df: _numeric(df, 'Ratio minimum') > _numeric(df, 'Ratio maximum'), 'Ratio minimum'),
+        ("Ratio moyen aberrant",
+         lambda df: robust_z_scores(df, 'Ratio moyen') > ROBUST_Z_THRESHOLD, 'Ratio moyen'),
+    ],
+    'Sheet5': [
+        ("Superficie nulle ou manquante",
+         lambda df: ~(_numeric(df, 'Superficie (m²)') > 0), 'Superficie (m²)'),
+        ("Nombre négatif", lambda df: (_numeric(df, 'Nombre de prises') < 0) | (_numeric(df, 'Nombre de fenêtres') < 0),
+         'Nombre de prises'),
+        ("Superficie aberrante",
+         lambda df: robust_z_scores(df, 'Superficie (m²)') > ROBUST_Z_THRESHOLD, 'Superficie (m²)'),
+    ],
+    'BD': [
+        ("DP > élèves (une année au moins)", _bd_dp_over_pupils, 'Nbre DP'),
+        (f"Saut ×{JUMP_FACTOR} d'une année à l'autre", _year_jumps, 'Nbre Eleves'),
+    ],
+}
+
+
+def detect_anomalies(df, sheet):
+    """Évalue toutes les règles d'une feuille en une passe
+
+    Retourne le tableau des lignes signalées (une ligne par anomalie) et le nombre de lignes par règle.
+    """
+    rules = RULES.get(sheet, [])
+    if not rules or len(df) == 0:
+        return pd.DataFrame(columns=['Feuille', 'N° de ligne', 'École', 'Règle', 'Valeur']), pd.DataFrame(columns=['Règle', 'Lignes'])
+
+    # Matrice lignes × règles
+    flags = np.column_stack([np.asarray(mask(df), dtype=bool) for _, mask, _ in rules])
+    rows, rule_ids = np.nonzero(flags)
+
+    names = np.array([name for name, _, _ in rules], dtype=object)
+    value_columns = [column for _, _, column in rules]
+    values = np.column_stack([
+        df[column].to_numpy(dtype=object) if column in df.columns else np.full(len(df), None, dtype=object)
+        for column in value_columns
+    ])
+    school_column = SCHOOL_COLUMNS.get(sheet)
+    schools = df[school_column].to_numpy(dtype=object) if school_column in df.columns \
+        else np.full(len(df), None, dtype=object)
+
+    flagged = pd.DataFrame({
+        'Feuille': sheet,
+        # Position dans la table chargée (1 = première ligne de données) : les lignes vides
+        # ignorées à la lecture et les fichiers consolidés la décalent du numéro de ligne Excel
+        'N° de ligne': rows + 1,
+        'École': schools[rows],
+        'Règle': names[rule_ids],
+        'Valeur': values[rows, rule_ids]
+    })
+    counts = pd.DataFrame({'Règle': names, 'Lignes': flags.sum(axis=0)})
+
+    return flagged, counts
+
+def quality_section(df, sheet, key, digest):
+    """Section « Contrôle de qualité » : règles évaluées une fois par fichier"""
+    flagged, counts = run_if_changed(key, digest, lambda: detect_anomalies(df, sheet))
+
+    n_rows = flagged['N° de ligne'].nunique()
+    if n_rows == 0:
+        st.success("✅ Aucune anomalie détectée.")
+        return
+
+    st.warning(f"⚠️ {n_rows} ligne(s) signalée(s) sur {len(df)} ({len(flagged)} anomalie(s)).")
+    st.dataframe(counts, use_container_width=True, hide_index=True)
+    paginated_dataframe(flagged, f"{key}_lignes", digest, sort_column='N° de ligne', ascending=True)
+    export_buttons(flagged, f"{key}_export", (digest, sheet, 'anomalies'), f"anomalies_{sheet.lower()}")
@@ -0,0 +1,141 @@
+import errno
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from modules.metriques import count_cache
+
+# Répertoire des colonnes projetées en mémoire (modifiable via ANALYSE_SCOLAIRE_COLONNES)
+STORE_DIR = os.environ.get(
+    'ANALYSE_SCOLAIRE_COLONNES',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'colonnes')
+)
+
+# Nombre de tables conservées sur disque (les plus anciennes sont supprimées)
+MAX_TABLES = 16
+
+# Description des colonnes écrite à côté des fichiers .npy
+SIDECAR = 'colonnes.json'
+
+# Types de catégories représentables dans le fichier JSON
+_CATEGORY_TYPES = (str, int, float, bool)
+
+
+def _table_path(key):
+    """Répertoire de la table associée à une clé (empreinte du fichier, feuille, nettoyage...)"""
+    return os.path.join(STORE_DIR, hashlib.sha1(repr(key).encode('utf-8')).hexdigest())
+
+def _storable(df):
+    """Vrai si chaque colonne est numérique ou faite de valeurs simples encodables en codes"""
+    if not isinstance(df.index, pd.RangeIndex):
+        return False
+    if not all(isinstance(col, _CATEGORY_TYPES) for col in df.columns):
+        return False
+
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_extension_array_dtype(values):
+            continue
+        if values.dtype != object:
+            return False
+        if not all(isinstance(value, _CATEGORY_TYPES) for value in values.dropna().unique()):
+            return False
+
+    return True
+
+def write_columns(df, path):
+    """Écrit chaque colonne dans un fichier .npy (colonnes de texte : codes + catégories dans le JSON)
+
+    L'écriture se fait dans un répertoire temporaire voisin de `path`, renommé à la fin : un autre
+    processus ne voit jamais une table à moitié écrite.
+    """
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    workdir = tempfile.mkdtemp(dir=parent, prefix='.ecriture-')
+
+    columns = []
+    for position, col in enumerate(df.columns):
+        values = df[col]
+        entry = {'name': col, 'dtype': str(values.dtype)}
+
+        if values.dtype == object:
+            codes, categories = pd.factorize(values)
+            entry['categories'] = categories.tolist()
+            # Plus petit entier signé (le code -1 marque les valeurs manquantes)
+            values = codes.astype(np.min_scalar_type(-max(len(categories), 1)))
+
+        np.save(os.path.join(workdir, f'{position}.npy'), np.ascontiguousarray(values))
+        columns.append(entry)
+
+    index = df.index
+    with open(os.path.join(workdir, SIDECAR), 'w', encoding='utf-8') as sidecar:
+        json.dump({
+            'columns': columns,
+            'index': [index.start, index.stop, index.step]
+        }, sidecar, ensure_ascii=False)
+
+    try:
+        os.rename(workdir, path)
+    except OSError as error:
+        shutil.rmtree(workdir, ignore_errors=True)
+        # Table déjà écrite entre-temps par une autre session ; toute autre erreur est remontée
+        if error.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+            raise
+
+def open_columns(path):
+    """Ouvre une table en projetant ses colonnes numériques en mémoire (copie privée à l'écriture)
+
+    Les pages physiques des colonnes numériques sont partagées par toutes les sessions et
+    tous les processus qui ouvrent la même table ; les colonnes de texte sont reconstruites
+    à partir de leurs codes.
+    """
+    with open(os.path.join(path, SIDECAR), encoding='utf-8') as sidecar:
+        layout = json.load(sidecar)
+
+    data = {}
+    for position, entry in enumerate(layout['columns']):
+        values = np.load(os.path.join(path, f'{position}.npy'), mmap_mode='c')
+
+        if 'categories' in entry:
+            # Code -1 : valeur manquante (dernier élément)
+            lookup = np.array(entry['categories'] + [np.nan], dtype=object)
+            values = lookup[values]
+
+        data[entry['name']] = values
+
+    start, stop, step = layout['index']
+    return pd.DataFrame(data, index=pd.RangeIndex(start, stop, step), copy=False)
+
+def _evict(keep):
+    """Supprime les tables les plus anciennes au-delà de MAX_TABLES"""
+    tables = [
+        os.path.join(STORE_DIR, name) for name in os.listdir(STORE_DIR)
+        if not name.startswith('.')
+    ]
+    tables.sort(key=os.path.getmtime, reverse=True)
+
+    for path in tables[MAX_TABLES:]:
+        if path != keep:
+            shutil.rmtree(path, ignore_errors=True)
+
+def mapped_frame(key, build):
+    """Table projetée en mémoire pour `key`, construite par `build()` à la première demande
+
+    Si la table ne se prête pas au stockage par colonnes, le DataFrame construit est retourné tel quel.
+    """
+    path = _table_path(key)
+    stored = os.path.exists(os.path.join(path, SIDECAR))
+    count_cache('colonnes', stored)
+
+    if not stored:
+        df = build()
+        if not _storable(df):
+            return df
+
+        write_columns(df, path)
+        _evict(path)
+
+    return open_columns(path)
@@ -0,0 +1,225 @@
+import streamlit as st
+import plotly.express as px
+from modules.annees import BD_SCHEMA, from_long
+from modules.differences import STATUSES, compare_versions
+from modules.exportation import export_buttons
+from modules.formulaires import run_if_changed, show_rerun_counter
+from modules.lecture import SHEET_CLEANERS, UPLOAD_TYPES, load_sheet
+from modules.nettoyage import SHEET_SCHEMAS
+from modules.pagination import paginated_dataframe
+from modules.stockage import load_dataset, stored_dataset_picker
+from modules.validation import LAYOUT_PAGES, locate_sheet
+import warnings
+warnings.filterwarnings('ignore')
+
+# Configuration de la page
+st.set_page_config(
+    page_title="Comparaison de Versions",
+    page_icon="🔀",
+    layout="wide"
+)
+
+# Style CSS personnalisé
+st.markdown("""
+<style>
+    .main-header {
+        color: #FFFFFF;
+        text-align: center;
+        padding: 2rem;
+        background: linear-gradient(135deg, #1E3A8A 0%, #3B82F6 100%);
+        border-radius: 10px;
+        margin-bottom: 2rem;
+        box-shadow: 0 4px 6px rgba(0,0,0,0.1);
+    }
+    .stButton>button {
+        background: linear-gradient(135deg, #3B82F6 0%, #1E3A8A 100%);
+        color: white;
+        border: none;
+        padding: 0.75rem 2rem;
+        border-radius: 25px;
+        font-weight: bold;
+        transition: all 0.3s ease;
+        width: 100%;
+        font-size: 1.1rem;
+    }
+    .stButton>button:hover {
+        transform: translateY(-2px);
+        box-shadow: 0 5px 15px rgba(59, 130, 246, 0.4);
+    }
+    .upload-section {
+        background: #f0f9ff;
+        padding: 2rem;
+        border-radius: 10px;
+        margin-bottom: 2rem;
+        border: 2px dashed #3B82F6;
+    }
+    .success-message {
+        background: #dcfce7;
+        color: #166534;
+        padding: 1.5rem;
+        border-radius: 10px;
+        border-left: 5px solid #10b981;
+        margin: 1rem 0;
+        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+    }
+    .info-box {
+        background: #e0f2fe;
+        color: #075985;
+        padding: 1.5rem;
+        border-radius: 10px;
+        border-left: 5px solid #0ea5e9;
+        margin: 1rem 0;
+        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+    }
+    .warning-box {
+        background: #fef3c7;
+        color: #92400e;
+        padding: 1.5rem;
+        border-radius: 10px;
+        border-left: 5px solid #f59e0b;
+        margin: 1rem 0;
+    }
+    .stat-card {
+        background: white;
+        padding: 1.5rem;
+        border-radius: 10px;
+        box-shadow: 0 2px 8px rgba(0,0,0,0.1);
+        text-align: center;
+        border-top: 4px solid #3B82F6;
+    }
+    .graph-card {
+        background: white;
+        padding: 1.5rem;
+        border-radius: 10px;
+        box-shadow: 0 2px 8px rgba(0,0,0,0.1);
+        margin-bottom: 1.5rem;
+    }
+</style>
+""", unsafe_allow_html=True)
+
+# En-tête de l'application
+st.markdown("""
+<div class="main-header">
+    <h1 style="margin: 0; font-size: 2.5rem;">🔀 Comparaison de Versions</h1>
+    <p style="margin-top: 1rem; font-size: 1.2rem; opacity: 0.9;">Ce qui a changé entre deux envois d'une même feuille</p>
+</div>
+""", unsafe_allow_html=True)
+
+
+def load_version(uploaded_file, dataset_id, layout):
+    """Charge une version de la feuille (fichier téléversé ou jeu enregistré) et son empreinte"""
+    if uploaded_file is not None:
+        sheet_name = locate_sheet(uploaded_file, layout, 0 if layout == 'BD' else None)
+        if sheet_name is None:
+            raise ValueError(f"{uploaded_file.name} ne correspond pas à la structure attendue ({LAYOUT_PAGES[layout]})")
+        if layout == 'BD':
+            return load_sheet(uploaded_file, sheet_name, schema=BD_SCHEMA)
+        return load_sheet(uploaded_file, sheet_name, SHEET_CLEANERS[layout], SHEET_SCHEMAS[layout])
+
+    df, digest = load_dataset(dataset_id)
+    # La base BD est enregistrée au format long
+    return (from_long(df) if layout == 'BD' else df), digest
+
+def version_input(label, layout, key):
+    """Téléverseur d'une version, avec repli sur les jeux déjà enregistrés"""
+    uploaded_file = st.file_uploader(label, type=UPLOAD_TYPES, key=f"{key}_fichier")
+    dataset_id = None
+    if uploaded_file is None:
+        dataset_id = stored_dataset_picker(layout, key=f"{key}_jeu")
+
+    return uploaded_file, dataset_id
+
+def create_delta_chart(areas, metric):
+    """Écart d'un indicateur par zone entre les deux versions"""
+    data = areas[areas[metric] != 0].sort_values(metric)
+    fig = px.bar(
+        data,
+        x=metric,
+        y='Zone',
+        orientation='h',
+        color=data[metric] > 0,
+        color_discrete_map={True: '#10B981', False: '#EF4444'},
+        title=f"{metric} par zone"
+    )
+    fig.update_layout(template="plotly_white", height=max(300, 30 * len(data)), showlegend=False)
+    return fig
+
+def main():
+    # Section de téléversement
+    st.markdown('<div class="upload-section">', unsafe_allow_html=True)
+    layout = st.selectbox(
+        "📑 Feuille comparée :",
+        options=list(LAYOUT_PAGES),
+        format_func=lambda layout: f"{layout} ({LAYOUT_PAGES[layout]})",
+        key="comparaison_feuille"
+    )
+    col1, col2 = st.columns(2)
+    with col1:
+        old_file, old_id = version_input("📤 Ancienne version", layout, "comparaison_ancienne")
+    with col2:
+        new_file, new_id = version_input("📤 Nouvelle version", layout, "comparaison_nouvelle")
+    st.markdown('</div>', unsafe_allow_html=True)
+
+    if (old_file is None and old_id is None) or (new_file is None and new_id is None):
+        st.info("👆 Choisissez l'ancienne et la nouvelle version de la feuille à comparer.")
+        return
+
+    try:
+        old_df, old_digest = load_version(old_file, old_id, layout)
+        new_df, new_digest = load_version(new_file, new_id, layout)
+
+        if old_digest == new_digest:
+            st.info("ℹ️ Les deux versions sont identiques (même empreinte).")
+            return
+
+        # Comparaison recalculée uniquement si l'une des versions change
+        with st.spinner("🔄 Comparaison des versions..."):
+            result = run_if_changed(
+                'comparaison_resultat',
+                (layout, old_digest, new_digest),
+                lambda: compare_versions(old_df, new_df, layout)
+            )
+
+        counts = result['counts']
+        col1, col2, col3, col4, col5 = st.columns(5)
+        col1.metric("Écoles ajoutées", counts['Ajoutée'])
+        col2.metric("Écoles supprimées", counts['Supprimée'])
+        col3.metric("Écoles modifiées", counts['Modifiée'])
+        col4.metric("Écoles inchangées", counts['Inchangée'])
+        col5.metric("Cellules modifiées", counts['Cellules'])
+        show_rerun_counter('comparaison_resultat')
+
+        data_key = (layout, old_digest, new_digest)
+
+        with st.expander("📍 Écarts par zone", expanded=True):
+            areas = result['areas']
+            st.dataframe(areas, use_container_width=True, hide_index=True)
+
+            delta_columns = [col for col in areas.columns if col.startswith('Écart ')]
+            if delta_columns:
+                metric = st.selectbox("Indicateur :", options=delta_columns, key="comparaison_indicateur")
+                if (areas[metric] != 0).any():
+                    st.plotly_chart(create_delta_chart(areas, metric), use_container_width=True)
+                else:
+                    st.caption("Aucun écart pour cet indicateur.")
+
+        with st.expander("🏫 Écoles ajoutées, supprimées ou modifiées", expanded=False):
+            schools = result['schools']
+            statuses = st.multiselect("Statuts :", options=STATUSES, default=STATUSES, key="comparaison_statuts")
+            schools = schools[schools['Statut'].isin(statuses)]
+            paginated_dataframe(schools, 'comparaison_ecoles', data_key + (tuple(statuses),),
+                                sort_column='Cellules modifiées')
+
+        with st.expander("🔍 Cellules modifiées", expanded=False):
+            cells = result['cells']
+            if len(cells) > 0:
+                paginated_dataframe(cells, 'comparaison_cellules', data_key)
+                export_buttons(cells, 'comparaison_export', data_key, f"differences_{layout}")
+            else:
+                st.caption("Aucune cellule modifiée sur les écoles présentes dans les deux versions.")
+
+    except Exception as e:
+        st.error(f"❌ Erreur lors de la comparaison : {str(e)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+import difflib
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+import streamlit as st
+from modules.annees import BD_SCHEMA, from_long
+from modules.lecture import SHEET_CLEANERS, file_digest, file_format, load_sheet, load_workbook_sheets
+from modules.nettoyage import SHEET_SCHEMAS, normalize_school_names
+from modules.stockage import load_dataset, stored_dataset_picker
+from modules.validation import matching_layout
+
+# Colonne contenant le nom de l'école dans chaque feuille (après nettoyage)
+SCHOOL_COLUMNS = {
+    'Sheet4': 'Ecole',
+    'Sheet3': 'Ecole',
+    'Sheet5': 'Ecole',
+    'BD': "Nom de l'ecole"
+}
+
+# Mots trop fréquents pour servir de clé de blocage
+_STOP_WORDS = {'ecole', 'de', 'du', 'des', 'la', 'le', 'les', 'el', 'ould'}
+
+# Similarité minimale pour rapprocher deux noms restés sans correspondance exacte
+FUZZY_THRESHOLD = 0.85
+
+# Au-delà de cette taille, un mot est trop courant pour servir seul de bloc
+MAX_BLOCK_SIZE = 200
+
+
+def _blocking_tokens(key):
+    """Préfixes des mots significatifs d'une clé, utilisés pour limiter les comparaisons approchées
+
+    Le préfixe (3 caractères) tolère les fautes de frappe en fin de mot.
+    """
+    return {token[:3] for token in key.split() if len(token) > 2 and token not in _STOP_WORDS}
+
+def build_school_index(frames):
+    """Construit l'index de correspondance des écoles entre les feuilles
+
+    `frames` associe un nom de feuille ('Sheet3', 'Sheet4', 'Sheet5', 'BD') à son DataFrame.
+    Les noms sont d'abord rapprochés après normalisation ; les restants sont comparés par
+    similarité, uniquement avec les écoles partageant au moins un mot (blocage).
+
+    Retourne un dictionnaire :
+    - 'schools' : clé d'école -> {feuille: positions des lignes}
+    - 'row_keys' : feuille -> clé d'école de chaque ligne
+    - 'fuzzy_matches' : DataFrame des rapprochements approchés
+    """
+    schools = defaultdict(dict)
+    row_keys = {}
+    fuzzy_matches = []
+    block_index = defaultdict(set)
+
+    # Les feuilles sont traitées dans l'ordre de SCHOOL_COLUMNS : Sheet4 fournit les clés de référence
+    for sheet in [s for s in SCHOOL_COLUMNS if s in frames]:
+        df = frames[sheet]
+        keys = normalize_school_names(df[SCHOOL_COLUMNS[sheet]]) if SCHOOL_COLUMNS[sheet] in df.columns \
+            else np.full(len(df), '', dtype=object)
+
+        # Résoudre chaque nom distinct une seule fois
+        resolved = {}
+        new_keys = []
+        claimed = set()
+        for key in pd.unique(keys):
+            if not key:
+                resolved[key] = None
+            elif key in schools:
+                resolved[key] = key
+            else:
+                # Les mots les plus rares suffisent à retrouver les candidats plausibles
+                # (un nom composé uniquement de mots trop courants reste sans rapprochement)
+                candidates = set().union(*(
+                    block_index[token] for token in _blocking_tokens(key)
+                    if len(block_index.get(token, ())) <= MAX_BLOCK_SIZE
+                ))
+                matcher = difflib.SequenceMatcher(None, b=key, autojunk=False)
+                best_key, best_score = None, FUZZY_THRESHOLD
+                for candidate in candidates:
+                    # Ne pas rapprocher deux écoles distinctes de la même feuille
+                    if candidate in claimed or sheet in schools[candidate]:
+                        continue
+                    matcher.set_seq1(candidate)
+                    # Bornes supérieures peu coûteuses avant le calcul exact
+                    if matcher.real_quick_ratio() < best_score or matcher.quick_ratio() < best_score:
+                        continue
+                    score = matcher.ratio()
+                    if score >= best_score:
+                        best_key, best_score = candidate, score
+
+                if best_key is not None:
+                    fuzzy_matches.append((sheet, key, best_key, round(best_score, 3)))
+                    resolved[key] = best_key
+                    claimed.add(best_key)
+                else:
+                    resolved[key] = key
+                    new_keys.append(key)
+
+        # Les nouvelles écoles ne deviennent candidates que pour les feuilles suivantes
+        for key in new_keys:
+            for token in _blocking_tokens(key):
+                block_index[token].add(key)
+
+        sheet_keys = pd.Series(keys, dtype='object').map(resolved).to_numpy(dtype=object)
+        # Positions des lignes de chaque école (les lignes sans nom sont ignorées)
+        for key, rows in pd.Series(sheet_keys).groupby(sheet_keys, sort=False).indices.items():
+            schools[key][sheet] = rows
+
+        row_keys[sheet] = sheet_keys
+
+    return {
+        'schools': dict(schools),
+        'row_keys': row_keys,
+        'fuzzy_matches': pd.DataFrame(
+            fuzzy_matches, columns=['Feuille', 'Nom normalisé', 'Rapproché de', 'Similarité']
+        )
+    }
+
+def matching_rows(index, sheet, row):
+    """Lignes des autres feuilles correspondant à la ligne `row` de `sheet` (accès direct)"""
+    key = index['row_keys'][sheet][row]
+
+    if key is None:
+        return {}
+
+    return {other: rows for other, rows in index['schools'][key].items() if other != sheet}
+
+def coverage_table(index):
+    """Taux de correspondance des écoles de chaque feuille avec les autres feuilles"""
+    sheets = list(index['row_keys'])
+    rows = []
+
+    for sheet in sheets:
+        keys = {key for key in index['row_keys'][sheet] if key is not None}
+        row = {'Feuille': sheet, 'Lignes': len(index['row_keys'][sheet]), 'Écoles': len(keys)}
+
+        for other in sheets:
+            if other != sheet:
+                found = sum(1 for key in keys if other in index['schools'][key])
+                row[f'Trouvées dans {other} (%)'] = round(found / len(keys) * 100, 1) if keys else 0.0
+
+        rows.append(row)
+
+    return pd.DataFrame(rows)
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def cached_school_index(cache_key, _frames):
+    """Index de correspondance mis en cache (une construction par téléversement)"""
+    return build_school_index(_frames)
+
+def show_index_coverage(index):
+    """Affiche la couverture de l'index et les rapprochements approchés"""
+    st.dataframe(coverage_table(index), use_container_width=True, hide_index=True)
+
+    fuzzy = index['fuzzy_matches']
+    if len(fuzzy) > 0:
+        st.markdown(f"**{len(fuzzy)} nom(s) rapproché(s) par similarité :**")
+        st.dataframe(fuzzy, use_container_width=True, hide_index=True)
+    else:
+        st.caption("Toutes les correspondances sont exactes après normalisation.")
+
+def workbook_frames(uploaded_file, bd_file=None, bd_dataset_id=None):
+    """Feuilles à relier et clé de cache correspondante
+
+    La base BD vient de `bd_file` s'il est fourni, sinon du jeu BD enregistré `bd_dataset_id`
+    choisi par l'utilisateur (aucune base BD sinon).
+    Un fichier CSV, Parquet ou JSON Lines fournit la seule feuille dont il reprend les en-têtes.
+    """
+    frames, cache_key = {}, ()
+
+    if uploaded_file is not None:
+        if file_format(uploaded_file) == 'excel':
+            frames = load_workbook_sheets(uploaded_file)
+        else:
+            # Fichier à table unique : rattaché à la feuille dont il reprend les en-têtes
+            layout = matching_layout(uploaded_file, SHEET_CLEANERS)
+            if layout is not None:
+                frames[layout], _ = load_sheet(uploaded_file, 0, SHEET_CLEANERS[layout], SHEET_SCHEMAS[layout])
+        cache_key += (file_digest(uploaded_file),)
+
+    if bd_file is not None:
+        frames['BD'], bd_digest = load_sheet(bd_file, schema=BD_SCHEMA)
+        cache_key += (bd_digest,)
+    elif bd_dataset_id is not None:
+        bd_long, bd_digest = load_dataset(bd_dataset_id)
+        frames['BD'] = from_long(bd_long)
+        cache_key += (bd_digest,)
+
+    return frames, cache_key
+
+def build_school_profiles(index, frames):
+    """Table de consultation par école, construite une fois par téléversement
+
+    Retourne un dictionnaire clé normalisée -> {'nom': nom affiché, 'feuilles': {feuille: lignes}},
+    les lignes étant des dictionnaires prêts à afficher : consulter une école est un simple accès.
+    """
+    profiles = {}
+
+    for sheet, sheet_keys in index['row_keys'].items():
+        records = frames[sheet].to_dict('records')
+        names = frames[sheet][SCHOOL_COLUMNS[sheet]].astype(str).to_numpy() \
+            if SCHOOL_COLUMNS[sheet] in frames[sheet].columns else None
+
+        for key, rows in index['schools'].items():
+            if sheet not in rows:
+                continue
+            profile = profiles.setdefault(key, {'nom': None, 'feuilles': {}})
+            profile['feuilles'][sheet] = [records[row] for row in rows[sheet]]
+            if profile['nom'] is None and names is not None:
+                profile['nom'] = names[rows[sheet][0]].strip()
+
+    return profiles
+
+def search_school_keys(sorted_keys, prefix, limit=50):
+    """Clés commençant par `prefix` (après normalisation), par recherche dichotomique"""
+    prefix = normalize_school_names([prefix])[0]
+    start = np.searchsorted(sorted_keys, prefix, side='left')
+    end = np.searchsorted(sorted_keys, prefix + '\uffff', side='left')
+
+    return sorted_keys[start:min(end, start + limit)].tolist()
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def cached_school_profiles(cache_key, _index, _frames):
+    """Profils d'écoles et clés triées pour la recherche par préfixe, mis en cache"""
+    profiles = build_school_profiles(_index, _frames)
+    return profiles, np.array(sorted(profiles), dtype=str)
+
+def school_index_section(uploaded_file, key):
+    """Section « Correspondance entre feuilles » : index construit une fois par téléversement
+
+    Relie les feuilles Sheet3, Sheet4 et Sheet5 du classeur téléversé, ainsi que la base BD
+    enregistrée choisie par l'utilisateur. L'index est mis en cache sur l'empreinte du
+    classeur (et de la base BD) : il n'est reconstruit que si l'un des deux change.
+    """
+    if uploaded_file is None:
+        st.info("ℹ️ Téléversez le classeur complet pour relier les écoles des différentes feuilles.")
+        return None
+
+    bd_dataset_id = stored_dataset_picker('BD', f"{key}_bd", label="📂 Base BD enregistrée à relier (optionnel) :")
+    frames, cache_key = workbook_frames(uploaded_file, bd_dataset_id=bd_dataset_id)
+
+    with st.spinner("🔄 Construction de l'index..."):
+        index = cached_school_index(cache_key, frames)
+
+    show_index_coverage(index)
+    return index
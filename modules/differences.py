@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+from modules.annees import YEAR_METRICS, N_YEARS
+from modules.consolidation import school_keys
+from modules.correspondance import SCHOOL_COLUMNS
+
+# Indicateurs additifs dont l'écart est sommé par zone (BD : dernière année)
+DELTA_METRICS = {
+    'Sheet4': ['Nbre élèves total', 'Nbre enseignants total', 'Nbre DP total'],
+    'Sheet3': ['Total salles', 'Salles utilisées', 'Salles non utilisées', 'Autres usages'],
+    'Sheet5': ['Superficie (m²)', 'Nombre de prises', 'Nombre de fenêtres'],
+    'BD': [f'{metric}.{N_YEARS - 1}' for metric in YEAR_METRICS]
+}
+
+# Colonnes de regroupement des écarts, par ordre de préférence
+AREA_PREFERENCE = ['Moughataa', 'Région', 'Region']
+
+# Statuts d'une école entre les deux versions
+STATUSES = ['Ajoutée', 'Supprimée', 'Modifiée']
+
+
+def aligned_keys(df, layout):
+    """Clé d'alignement unique de chaque ligne nommée : école, puis rang de la ligne dans l'école
+
+    Les écoles décrites sur plusieurs lignes (salles de Sheet5) sont alignées ligne à ligne.
+    Retourne la clé d'école et la clé de ligne (index : positions des lignes nommées).
+    """
+    keys, schools = school_keys(df, layout)
+    keys = keys.set_axis(np.arange(len(df)))[schools != '']
+    rows = keys + '#' + keys.groupby(keys).cumcount().astype(str)
+
+    return keys, rows
+
+def changed_cells(old_values, new_values):
+    """Masque des cellules différentes entre deux colonnes alignées (valeurs manquantes égales entre elles)"""
+    old_numeric = pd.api.types.is_numeric_dtype(old_values) and not pd.api.types.is_bool_dtype(old_values)
+    new_numeric = pd.api.types.is_numeric_dtype(new_values) and not pd.api.types.is_bool_dtype(new_values)
+
+    if old_numeric and new_numeric:
+        a, b = old_values.to_numpy(dtype=float), new_values.to_numpy(dtype=float)
+        both_missing = np.isnan(a) & np.isnan(b)
+        with np.errstate(invalid='ignore'):
+            return ~(np.isclose(a, b, rtol=1e-9, atol=0) | both_missing)
+
+    a, b = old_values.to_numpy(dtype=object), new_values.to_numpy(dtype=object)
+    a_missing, b_missing = pd.isna(a), pd.isna(b)
+    return np.where(a_missing | b_missing, a_missing != b_missing, a != b).astype(bool)
+
+def compare_versions(old, new, layout):
+    """Compare deux versions d'une même feuille, alignées sur la clé normalisée des écoles
+
+    Retourne un dictionnaire :
+    - 'cells' : une ligne par cellule modifiée (école, colonne, ancienne et nouvelle valeur, écart)
+    - 'schools' : écoles ajoutées, supprimées ou modifiées, avec le nombre de cellules modifiées
+    - 'areas' : écoles concernées et écarts des indicateurs additifs par zone
+    - 'counts' : effectifs par statut
+    """
+    old_schools, old_rows = aligned_keys(old, layout)
+    new_schools, new_rows = aligned_keys(new, layout)
+
+    # Lignes présentes dans les deux versions : positions alignées
+    common = pd.Index(new_rows.to_numpy()).intersection(pd.Index(old_rows.to_numpy()), sort=False)
+    old_positions = old_rows.index.to_numpy()[pd.Index(old_rows.to_numpy()).get_indexer(common)]
+    new_positions = new_rows.index.to_numpy()[pd.Index(new_rows.to_numpy()).get_indexer(common)]
+    common_schools = new_schools.loc[new_positions].to_numpy()
+
+    school_column = SCHOOL_COLUMNS[layout]
+    columns = [col for col in new.columns if col in old.columns and col not in (school_column, 'Source')]
+
+    # Comparaison colonne par colonne sur toutes les lignes alignées à la fois
+    cells = []
+    for col in columns:
+        old_values = old[col].iloc[old_positions].reset_index(drop=True)
+        new_values = new[col].iloc[new_positions].reset_index(drop=True)
+        mask = changed_cells(old_values, new_values)
+        if not mask.any():
+            continue
+
+        delta = np.full(mask.sum(), np.nan)
+        if pd.api.types.is_numeric_dtype(old_values) and pd.api.types.is_numeric_dtype(new_values):
+            delta = new_values[mask].to_numpy(dtype=float) - old_values[mask].to_numpy(dtype=float)
+
+        cells.append(pd.DataFrame({
+            'Clé': common_schools[mask],
+            'Ligne': new_positions[mask],
+            'Colonne': col,
+            'Ancienne valeur': old_values[mask].astype(str).to_numpy(),
+            'Nouvelle valeur': new_values[mask].astype(str).to_numpy(),
+            'Écart': delta
+        }))
+
+    cells = pd.concat(cells, ignore_index=True) if cells else pd.DataFrame(
+        columns=['Clé', 'Ligne', 'Colonne', 'Ancienne valeur', 'Nouvelle valeur', 'Écart']
+    )
+
+    # Statut de chaque école : ajoutée, supprimée, ou modifiée (cellule ou nombre de lignes différent)
+    old_counts, new_counts = old_schools.value_counts(), new_schools.value_counts()
+    added = new_counts.index.difference(old_counts.index)
+    removed = old_counts.index.difference(new_counts.index)
+    both = new_counts.index.intersection(old_counts.index)
+    cell_counts = cells['Clé'].value_counts()
+    modified = both[(old_counts[both] != new_counts[both]).to_numpy() | both.isin(cell_counts.index)]
+
+    schools = pd.DataFrame({
+        'Clé': np.concatenate([added, removed, modified]).astype(object),
+        'Statut': np.repeat(STATUSES, [len(added), len(removed), len(modified)])
+    })
+    schools['Cellules modifiées'] = schools['Clé'].map(cell_counts).fillna(0).astype(int)
+
+    # Nom affiché et zone, pris dans la version qui contient l'école
+    labels = pd.concat([_school_labels(new, new_schools, layout), _school_labels(old, old_schools, layout)])
+    labels = labels[~labels.index.duplicated()]
+    schools = schools.join(labels, on='Clé')
+    cells = cells.join(labels, on='Clé')
+
+    return {
+        'cells': cells[['École', 'Zone', 'Colonne', 'Ancienne valeur', 'Nouvelle valeur', 'Écart']],
+        'schools': schools[['École', 'Zone', 'Statut', 'Cellules modifiées']],
+        'areas': area_deltas(old, new, layout, old_schools, new_schools, schools),
+        'counts': {
+            'Ajoutée': len(added), 'Supprimée': len(removed), 'Modifiée': len(modified),
+            'Inchangée': len(both) - len(modified), 'Cellules': len(cells)
+        }
+    }
+
+def _area_column(df):
+    """Colonne de zone utilisée pour regrouper les écarts (Moughataa si disponible)"""
+    return next((col for col in AREA_PREFERENCE if col in df.columns), None)
+
+def _school_labels(df, keys, layout):
+    """Nom d'école et zone de la première ligne de chaque clé"""
+    first = keys[~keys.duplicated()]
+    area_column = _area_column(df)
+    school_column = SCHOOL_COLUMNS[layout]
+
+    return pd.DataFrame({
+        'École': df[school_column].iloc[first.index].astype(str).str.strip().to_numpy(),
+        'Zone': df[area_column].iloc[first.index].astype(str).to_numpy() if area_column else '',
+    }, index=first.to_numpy())
+
+def area_deltas(old, new, layout, old_schools, new_schools, schools):
+    """Écoles ajoutées, supprimées, modifiées et écart des indicateurs additifs par zone (zones touchées seulement)"""
+    area_column = _area_column(new) or _area_column(old)
+    metrics = [col for col in DELTA_METRICS[layout] if col in old.columns and col in new.columns]
+
+    def totals(df, keys):
+        rows = df.iloc[keys.index]
+        zones = rows[area_column].astype(str) if area_column in rows.columns else pd.Series('', index=rows.index)
+        return rows[metrics].apply(pd.to_numeric, errors='coerce').groupby(zones.to_numpy()).sum()
+
+    deltas = totals(new, new_schools).sub(totals(old, old_schools), fill_value=0).add_prefix('Écart ')
+    status_counts = pd.crosstab(schools['Zone'], schools['Statut']).reindex(columns=STATUSES, fill_value=0)
+
+    areas = status_counts.join(deltas, how='outer').fillna(0)
+    areas[STATUSES] = areas[STATUSES].astype(int)
+    areas = areas[areas.ne(0).any(axis=1)]
+
+    return areas.rename_axis('Zone').reset_index()
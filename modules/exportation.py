@@ -0,0 +1,115 @@
+import gzip
+import hashlib
+import io
+import streamlit as st
+import pyarrow as pa
+import pyarrow.parquet as pq
+from modules.memoire import track
+from modules.mesures import stage
+
+# Nombre de lignes écrites à la fois dans le fichier exporté
+CHUNK_ROWS = 50_000
+
+# Formats proposés : (extension, type MIME)
+EXPORT_FORMATS = {
+    'CSV': ('.csv', 'text/csv'),
+    'CSV compressé (gzip)': ('.csv.gz', 'application/gzip'),
+    'Parquet': ('.parquet', 'application/vnd.apache.parquet'),
+}
+
+
+def _write_csv(df, binary_stream):
+    """Écrit le CSV par blocs de CHUNK_ROWS lignes dans un flux binaire"""
+    text_stream = io.TextIOWrapper(binary_stream, encoding='utf-8', newline='')
+
+    for start in range(0, max(len(df), 1), CHUNK_ROWS):
+        chunk = df.iloc[start:start + CHUNK_ROWS]
+        chunk.to_csv(text_stream, index=False, header=(start == 0))
+
+    text_stream.flush()
+    text_stream.detach()
+
+def _write_parquet(df, binary_stream):
+    """Écrit le Parquet groupe de lignes par groupe de lignes"""
+    # Les colonnes texte peuvent mélanger nombres et chaînes : on les type explicitement
+    object_columns = df.select_dtypes(include=['object']).columns
+    df = df.astype({col: 'string' for col in object_columns})
+    df.columns = [str(col) for col in df.columns]
+
+    schema = pa.Schema.from_pandas(df.iloc[:0], preserve_index=False)
+
+    with pq.ParquetWriter(binary_stream, schema) as writer:
+        for start in range(0, len(df), CHUNK_ROWS):
+            chunk = df.iloc[start:start + CHUNK_ROWS]
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _build_export(cache_id, export_format, _df):
+    """Construit le fichier exporté ; mis en cache par identifiant de données et format"""
+    output = io.BytesIO()
+
+    with stage(f"Encodage {export_format}"):
+        if export_format == 'CSV':
+            _write_csv(_df, output)
+        elif export_format == 'CSV compressé (gzip)':
+            with gzip.GzipFile(fileobj=output, mode='wb') as gz:
+                _write_csv(_df, gz)
+        elif export_format == 'Parquet':
+            _write_parquet(_df, output)
+
+    return output.getvalue()
+
+def export_cache_id(key, data_key):
+    """Identifiant stable d'un export : bouton d'export + empreinte du jeu de données et filtre actif
+
+    `_df` n'entre pas dans la clé de st.cache_data : deux tables différentes exportées avec la
+    même empreinte de fichier ne doivent pas partager un identifiant, d'où la clé du bouton.
+    """
+    return hashlib.sha1(repr((key, data_key)).encode('utf-8')).hexdigest()
+
+def export_buttons(df, key, data_key, file_stem):
+    """Propose le téléchargement de `df` sans construire le fichier à chaque rerun
+
+    Le fichier n'est généré qu'après un clic sur « Préparer le fichier », puis réutilisé
+    tant que `data_key` (empreinte du fichier, feuille, table + filtre actif) et le format
+    ne changent pas.
+    """
+    cache_id = export_cache_id(key, data_key)
+    requested = st.session_state.setdefault('_exports_demandes', {})
+
+    col1, col2 = st.columns([1, 2])
+
+    with col1:
+        export_format = st.selectbox(
+            "Format d'export:",
+            options=list(EXPORT_FORMATS),
+            key=f"{key}_format"
+        )
+
+    with col2:
+        slot = st.empty()
+
+        if requested.get(key) != (cache_id, export_format):
+            if slot.button("⚙️ Préparer le fichier", key=f"{key}_preparer", use_container_width=True):
+                requested[key] = (cache_id, export_format)
+
+        if requested.get(key) == (cache_id, export_format):
+            with st.spinner("🔄 Préparation du fichier..."):
+                data = _build_export(cache_id, export_format, df)
+
+            # Fichier retenu par le bouton : libéré (à préparer de nouveau) au-delà du budget
+            track(
+                ('_exports_demandes', key), data,
+                lambda: requested.pop(key, None),
+                label=f"Export {key}"
+            )
+
+            extension, mime = EXPORT_FORMATS[export_format]
+            slot.download_button(
+                label=f"📥 Télécharger ({export_format})",
+                data=data,
+                file_name=f"{file_stem}{extension}",
+                mime=mime,
+                key=f"{key}_telecharger",
+                use_container_width=True
+            )
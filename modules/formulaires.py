@@ -0,0 +1,70 @@
+import streamlit as st
+from modules.memoire import touch, track
+from modules.metriques import count_cache
+
+# Clé de session regroupant l'état de tous les formulaires d'analyse
+_STATE_KEY = '_formulaires'
+
+
+def _tab_state(tab_key):
+    """Retourne l'état mémorisé d'un onglet (paramètres soumis, résultat, compteurs)"""
+    store = st.session_state.setdefault(_STATE_KEY, {})
+
+    if tab_key not in store:
+        store[tab_key] = {
+            'submitted': None,  # (empreinte, paramètres) validés par le bouton
+            'params': None,     # paramètres ayant produit le résultat mémorisé
+            'result': None,
+            'computed': 0,
+            'avoided': 0
+        }
+
+    return store[tab_key]
+
+def submit_params(tab_key, digest, params):
+    """Enregistre les paramètres validés par le bouton du formulaire"""
+    _tab_state(tab_key)['submitted'] = (digest, params)
+
+def submitted_params(tab_key, digest):
+    """Retourne les derniers paramètres soumis pour ce fichier, ou None"""
+    submitted = _tab_state(tab_key)['submitted']
+
+    if submitted is None or submitted[0] != digest:
+        return None
+
+    return submitted[1]
+
+def run_if_changed(tab_key, params, compute):
+    """Exécute `compute()` seulement si les paramètres ont changé depuis le dernier calcul
+
+    Sinon, le résultat mémorisé est réutilisé et le rerun est compté comme évité.
+    Le résultat peut être libéré par le budget mémoire de la session (voir modules.memoire).
+    """
+    state = _tab_state(tab_key)
+    reused = bool(state['computed']) and state['params'] == params
+    count_cache(tab_key, reused)
+
+    if reused:
+        state['avoided'] += 1
+        touch((_STATE_KEY, tab_key))
+        return state['result']
+
+    result = compute()
+    state['params'] = params
+    state['result'] = result
+    state['computed'] += 1
+
+    # Résultat compté dans le budget mémoire de la session (recalculé s'il est libéré)
+    track((_STATE_KEY, tab_key), result, lambda: _release_result(state), label=tab_key)
+
+    return result
+
+def _release_result(state):
+    """Libère le résultat mémorisé d'un onglet ; le prochain appel le recalculera"""
+    state['params'] = None
+    state['result'] = None
+
+def show_rerun_counter(tab_key):
+    """Affiche le nombre de recalculs évités pour un onglet"""
+    state = _tab_state(tab_key)
+    st.caption(f"⚡ Recalculs évités : {state['avoided']} • Calculs effectués : {state['computed']}")
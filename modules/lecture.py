@@ -0,0 +1,277 @@
+import hashlib
+import itertools
+import json
+import zipfile
+import openpyxl
+import streamlit as st
+import pandas as pd
+import pyarrow.parquet as pq
+from modules.colonnes import mapped_frame
+from modules.mesures import stage
+from modules.metriques import timed
+from modules.registre import shared_dataset
+from modules.nettoyage import (
+    SHEET_SCHEMAS, clean_sheet3_data, clean_sheet4_data, clean_sheet5_data,
+    rollup_sheet5_by_school, add_density_metrics
+)
+
+# Formats à table unique acceptés en plus d'Excel (extension -> format)
+FLAT_FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.parquet': 'parquet'}
+
+# Extensions proposées par les téléverseurs
+UPLOAD_TYPES = ['xlsx', 'xls'] + [extension[1:] for extension in FLAT_FORMATS]
+
+# Nombre de lignes lues à la fois dans les fichiers CSV et JSON Lines
+CHUNK_ROWS = 50_000
+
+# Fonction de nettoyage de chaque feuille du classeur
+SHEET_CLEANERS = {'Sheet3': clean_sheet3_data, 'Sheet4': clean_sheet4_data, 'Sheet5': clean_sheet5_data}
+
+
+def file_digest(uploaded_file):
+    """Calcule l'empreinte SHA-1 du contenu d'un fichier téléversé (une seule fois par fichier)"""
+    digests = st.session_state.setdefault('_empreintes_fichiers', {})
+
+    if uploaded_file.file_id not in digests:
+        digests[uploaded_file.file_id] = hashlib.sha1(uploaded_file.getvalue()).hexdigest()
+
+    return digests[uploaded_file.file_id]
+
+def _schema_columns(headers, schema):
+    """Positions, noms (doublons suffixés .1, .2... comme pandas) et types des colonnes du schéma"""
+    columns, seen = [], {}
+
+    for position, header in enumerate(headers):
+        if header is None:
+            continue
+        dtype = next((dtype for fragment, dtype in schema.items() if fragment in str(header)), None)
+        if dtype is None:
+            continue
+
+        count = seen.get(header, 0)
+        seen[header] = count + 1
+        columns.append((position, f"{header}.{count}" if count else header, dtype))
+
+    return columns
+
+def _typed(values, dtype):
+    """Convertit une colonne lue dans le type déclaré (entiers incomplets conservés en float64)"""
+    if not isinstance(values, pd.Series):
+        values = pd.Series(values, dtype=object)
+    if dtype == 'object':
+        return values.astype(object)
+
+    series = pd.to_numeric(values, errors='coerce')
+    if dtype == 'int64' and not (series.notna().all() and (series % 1 == 0).all()):
+        dtype = 'float64'
+
+    return series.astype(dtype)
+
+def file_format(source):
+    """Format d'un fichier d'après son extension : 'excel' ou l'une des valeurs de FLAT_FORMATS"""
+    name = str(getattr(source, 'name', '')).lower()
+    return next((fmt for extension, fmt in FLAT_FORMATS.items() if name.endswith(extension)), 'excel')
+
+def read_headers(source):
+    """En-têtes d'un fichier à table unique, sans lire les données"""
+    fmt = file_format(source)
+    source.seek(0)
+
+    try:
+        if fmt == 'csv':
+            return list(pd.read_csv(source, nrows=0, encoding='utf-8-sig').columns)
+        if fmt == 'parquet':
+            return pq.read_schema(source).names
+        # JSON Lines : union des clés des enregistrements du premier bloc, dans l'ordre d'apparition
+        lines = itertools.islice((line for line in source if line.strip()), CHUNK_ROWS)
+        return list(dict.fromkeys(key for line in lines for key in json.loads(line)))
+    finally:
+        source.seek(0)
+
+def _typed_chunk(chunk, columns):
+    """Bloc lu converti dans les types du schéma, colonnes renommées"""
+    return pd.DataFrame({
+        name: _typed(chunk.iloc[:, rank], dtype) for rank, (_, name, dtype) in enumerate(columns)
+    })
+
+def _read_flat(source, fmt, schema):
+    """Lit un fichier CSV, Parquet ou JSON Lines en ne conservant que les colonnes du schéma
+
+    CSV : lecture par blocs des seules colonnes utiles, texte lu sans inférence.
+    Parquet : projection des colonnes (les autres ne sont pas décodées).
+    JSON Lines : lecture par blocs, colonnes retenues bloc par bloc.
+    Chaque bloc est converti dès sa lecture : seuls les blocs typés sont conservés.
+    """
+    headers = read_headers(source)
+    columns = _schema_columns(headers, schema) if schema is not None else \
+        [(position, header, None) for position, header in enumerate(headers)]
+    positions = [position for position, _, _ in columns]
+    typed = (lambda chunk: chunk) if schema is None else (lambda chunk: _typed_chunk(chunk, columns))
+    source.seek(0)
+
+    try:
+        if fmt == 'csv':
+            text = {position: object for position, _, dtype in columns if dtype == 'object'}
+            chunks = [
+                typed(chunk)
+                for chunk in pd.read_csv(
+                    source, usecols=positions, dtype=text, chunksize=CHUNK_ROWS, encoding='utf-8-sig'
+                )
+            ]
+        elif fmt == 'parquet':
+            chunks = [typed(pq.read_table(source, columns=[headers[position] for position in positions]).to_pandas())]
+        else:
+            keys = [headers[position] for position in positions]
+            chunks = [
+                typed(chunk.reindex(columns=keys))
+                for chunk in pd.read_json(
+                    source, lines=True, chunksize=CHUNK_ROWS, dtype=False, convert_dates=False
+                )
+            ]
+    finally:
+        source.seek(0)
+
+    if not chunks:
+        chunks = [typed(pd.DataFrame(columns=range(len(columns))))]
+    return pd.concat(chunks, ignore_index=True)
+
+def read_columns(source, sheet_name=0, schema=None):
+    """Lit une feuille en ne conservant que les colonnes du schéma, sans inférence de type
+
+    `schema` associe un fragment d'en-tête au type de la colonne ('object', 'int64', 'float64').
+    Les cellules des autres colonnes ne sont jamais converties. Sans schéma, lecture pandas complète.
+    Les fichiers CSV, Parquet et JSON Lines n'ont qu'une table : seule la feuille 0 existe.
+    """
+    fmt = file_format(source)
+    if fmt != 'excel':
+        if sheet_name != 0:
+            # Même exception qu'une feuille absente d'un classeur
+            raise ValueError(f"Worksheet named '{sheet_name}' not found")
+        return _read_flat(source, fmt, schema)
+
+    source.seek(0)
+    is_xlsx = zipfile.is_zipfile(source)
+    source.seek(0)
+
+    if schema is None or not is_xlsx:
+        # Ancien format .xls ou lecture complète : pandas (colonnes filtrées après coup)
+        df = pd.read_excel(source, sheet_name=sheet_name)
+        if schema is None:
+            return df
+        columns = _schema_columns(list(df.columns), schema)
+        return pd.DataFrame({
+            name: _typed(df.iloc[:, position].tolist(), dtype) for position, name, dtype in columns
+        })
+
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+
+    try:
+        if isinstance(sheet_name, int):
+            worksheet = workbook.worksheets[sheet_name]
+        elif sheet_name in workbook.sheetnames:
+            worksheet = workbook[sheet_name]
+        else:
+            # Même exception que pandas pour une feuille absente
+            raise ValueError(f"Worksheet named '{sheet_name}' not found")
+
+        rows = worksheet.iter_rows(values_only=True)
+        columns = _schema_columns(next(rows, ()), schema)
+        positions = [position for position, _, _ in columns]
+        width = max(positions, default=-1) + 1
+
+        kept = []
+        for row in rows:
+            # Lignes entièrement vides ignorées, comme le fait pandas
+            if row.count(None) == len(row):
+                continue
+            if len(row) < width:
+                row = row + (None,) * (width - len(row))
+            kept.append([row[position] for position in positions])
+    finally:
+        workbook.close()
+        source.seek(0)
+
+    # Transposition ligne -> colonne
+    values = list(zip(*kept)) if kept else [()] * len(columns)
+
+    return pd.DataFrame({name: _typed(column_values, dtype) for column_values, (_, name, dtype) in zip(values, columns)})
+
+def _read_sheet(uploaded_file, sheet_name, schema, cleaner):
+    """Lit et nettoie une feuille"""
+    with timed('analyse_scolaire_lecture_secondes', feuille=sheet_name):
+        with stage(f"Lecture {sheet_name}"):
+            df = read_columns(uploaded_file, sheet_name, schema)
+
+        if cleaner is not None:
+            with stage(cleaner.__name__):
+                df = cleaner(df)
+
+    return df
+
+def load_sheet(uploaded_file, sheet_name=0, cleaner=None, schema=None, mapped=False):
+    """Charge une feuille du fichier téléversé sans la relire à chaque rerun
+
+    Seules les colonnes de `schema` sont lues s'il est fourni (voir read_columns).
+    Le résultat est conservé une seule fois par processus, quel que soit le nombre de
+    sessions qui l'ouvrent (voir modules.registre). Avec `mapped`, ses colonnes numériques
+    sont en outre projetées en mémoire depuis le stockage par colonnes (une seule copie
+    physique pour tous les processus, voir modules.colonnes).
+    Retourne le DataFrame (nettoyé si `cleaner` est fourni) et l'empreinte du fichier.
+    """
+    digest = file_digest(uploaded_file)
+    cleaner_name = f"{cleaner.__module__}.{cleaner.__name__}" if cleaner else None
+    load_key = (digest, sheet_name, cleaner_name, tuple(schema.items()) if schema else None)
+
+    def build():
+        if mapped:
+            return mapped_frame(load_key, lambda: _read_sheet(uploaded_file, sheet_name, schema, cleaner))
+        return _read_sheet(uploaded_file, sheet_name, schema, cleaner)
+
+    df = shared_dataset(
+        load_key + (mapped,), build, slot=('feuille', sheet_name, cleaner_name),
+        label=f"{uploaded_file.name} — {sheet_name if sheet_name != 0 else 'feuille 1'}"
+    )
+
+    return df, digest
+
+def load_workbook_sheets(uploaded_file):
+    """Charge et nettoie les feuilles Sheet3, Sheet4 et Sheet5 présentes dans le classeur"""
+    frames = {}
+
+    for sheet_name, cleaner in SHEET_CLEANERS.items():
+        try:
+            frames[sheet_name], _ = load_sheet(uploaded_file, sheet_name, cleaner, SHEET_SCHEMAS[sheet_name])
+        except ValueError:
+            # Feuille absente du classeur
+            continue
+
+    return frames
+
+def _sheet4_with_density(uploaded_file, sheet_name):
+    """Sheet4 nettoyée, jointe à l'agrégat de Sheet5 lorsque la feuille existe"""
+    df, digest = load_sheet(uploaded_file, sheet_name, clean_sheet4_data, SHEET_SCHEMAS['Sheet4'])
+
+    try:
+        sheet5_df, _ = load_sheet(uploaded_file, 'Sheet5', clean_sheet5_data, SHEET_SCHEMAS['Sheet5'])
+    except ValueError:
+        # Pas de feuille Sheet5 : totaux seuls
+        return df
+
+    with stage("Agrégation Sheet5 par école"):
+        return add_density_metrics(df, rollup_sheet5_by_school(sheet5_df))
+
+def load_sheet4_with_density(uploaded_file, sheet_name='Sheet4'):
+    """Charge Sheet4 enrichie des superficies et densités de Sheet5 (si la feuille existe)
+
+    Le résultat est servi par le registre du processus et le stockage par colonnes projeté en mémoire.
+    """
+    digest = file_digest(uploaded_file)
+    load_key = (digest, sheet_name, 'densite')
+    df = shared_dataset(
+        load_key,
+        lambda: mapped_frame(load_key, lambda: _sheet4_with_density(uploaded_file, sheet_name)),
+        slot=('feuille', 'Sheet4', 'densite'),
+        label=f"{uploaded_file.name} — {sheet_name} + densités"
+    )
+
+    return df, digest
@@ -0,0 +1,95 @@
+import os
+import sys
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import streamlit as st
+from modules.registre import is_shared, session_bytes
+
+# Mémoire allouée aux résultats conservés par chaque session (modifiable via ANALYSE_SCOLAIRE_SESSION_MO)
+BUDGET_MB = float(os.environ.get('ANALYSE_SCOLAIRE_SESSION_MO', 256))
+
+# Clé de session des résultats suivis, du moins au plus récemment utilisé
+_STATE_KEY = '_memoire'
+
+# Profondeur maximale parcourue pour estimer la taille d'un objet
+_MAX_DEPTH = 6
+
+
+def object_size(obj, _depth=0):
+    """Estimation de la mémoire occupée par un résultat (tables, tableaux, figures, fichiers)
+
+    Les données partagées entre sessions (registre, colonnes projetées) ne sont pas comptées.
+    """
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return session_bytes(obj)
+    if isinstance(obj, pd.Index):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        return 0 if is_shared(obj) else int(obj.nbytes)
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return len(obj)
+    if hasattr(obj, 'to_plotly_json'):
+        # Figure plotly : données des traces et mise en page
+        return object_size(obj.to_plotly_json(), _depth)
+    if _depth >= _MAX_DEPTH:
+        return sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(object_size(value, _depth + 1) for value in obj.values())
+    if isinstance(obj, (list, tuple, set)):
+        return sys.getsizeof(obj) + sum(object_size(value, _depth + 1) for value in obj)
+
+    return sys.getsizeof(obj)
+
+def _artifacts():
+    return st.session_state.setdefault(_STATE_KEY, OrderedDict())
+
+def track(key, obj, evict, label=None):
+    """Enregistre (ou met à jour) la taille d'un résultat conservé par la session
+
+    `evict()` libère le résultat ; elle est appelée sur les résultats les moins récemment
+    utilisés lorsque la session dépasse son budget. Le résultat qui vient d'être
+    enregistré n'est jamais évincé.
+    """
+    artifacts = _artifacts()
+    artifacts[key] = {'size': object_size(obj), 'evict': evict, 'label': label or str(key)}
+    artifacts.move_to_end(key)
+
+    total = sum(artifact['size'] for artifact in artifacts.values())
+    for stale in list(artifacts)[:-1]:
+        if total <= BUDGET_MB * 2 ** 20:
+            break
+        artifact = artifacts.pop(stale)
+        artifact['evict']()
+        total -= artifact['size']
+
+def touch(key):
+    """Marque un résultat comme récemment utilisé"""
+    artifacts = _artifacts()
+    if key in artifacts:
+        artifacts.move_to_end(key)
+
+def forget(key):
+    """Cesse de suivre un résultat libéré par son propriétaire"""
+    _artifacts().pop(key, None)
+
+def session_usage():
+    """Résultats conservés par la session, du plus récemment utilisé au plus ancien"""
+    rows = [
+        {'Résultat': artifact['label'], 'Mémoire (Mo)': round(artifact['size'] / 2 ** 20, 2)}
+        for artifact in reversed(_artifacts().values())
+    ]
+    return pd.DataFrame(rows, columns=['Résultat', 'Mémoire (Mo)'])
+
+def memory_sidebar():
+    """Mémoire utilisée par la session, rapportée au budget, dans la barre latérale"""
+    usage = session_usage()
+    used = usage['Mémoire (Mo)'].sum()
+
+    with st.sidebar.expander(f"🧠 Mémoire de la session : {used:.1f} / {BUDGET_MB:.0f} Mo", expanded=False):
+        st.progress(min(used / BUDGET_MB, 1.0) if BUDGET_MB else 1.0)
+        if usage.empty:
+            st.caption("Aucun résultat conservé.")
+        else:
+            st.dataframe(usage, use_container_width=True, hide_index=True)
+            st.caption("Les résultats les moins récemment utilisés sont libérés au-delà du budget.")
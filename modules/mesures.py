@@ -0,0 +1,140 @@
+import functools
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# Nombre de reruns conservés par session pour le panneau « Performance »
+MAX_RUNS = 20
+
+# Étapes conservées au plus pour le rerun en cours (pages lancées sans le panneau)
+MAX_STAGES = 500
+
+# Clé de session des mesures (rerun en cours et derniers reruns)
+_STATE_KEY = '_mesures'
+
+# Pile des étapes imbriquées du thread courant (un thread par session)
+_local = threading.local()
+
+
+def _state():
+    return st.session_state.setdefault(_STATE_KEY, {
+        'current': deque(maxlen=MAX_STAGES),
+        'runs': deque(maxlen=MAX_RUNS),
+        'run': 0
+    })
+
+@contextmanager
+def stage(name):
+    """Mesure une étape : temps écoulé, temps CPU du thread et octets alloués (pic)
+
+    Les allocations ne sont mesurées que si tracemalloc est actif (case du panneau
+    « Performance ») ; elles concernent tout le processus. Hors d'une session Streamlit
+    (threads de lecture, scripts), l'étape s'exécute sans être enregistrée.
+    """
+    if get_script_run_ctx() is None:
+        yield
+        return
+
+    stack = _local.__dict__.setdefault('stack', [])
+    tracing = tracemalloc.is_tracing()
+    frame = {'max_peak': 0}
+
+    if tracing:
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            # Le pic de l'étape englobante est conservé avant la remise à zéro
+            stack[-1]['max_peak'] = max(stack[-1]['max_peak'], peak)
+        tracemalloc.reset_peak()
+        frame['start'] = current
+
+    stack.append(frame)
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        wall, cpu = time.perf_counter() - wall, time.thread_time() - cpu
+        stack.pop()
+
+        allocated = None
+        if tracing and tracemalloc.is_tracing():
+            peak = max(tracemalloc.get_traced_memory()[1], frame['max_peak'])
+            allocated = max(peak - frame['start'], 0)
+            if stack:
+                stack[-1]['max_peak'] = max(stack[-1]['max_peak'], peak)
+
+        _state()['current'].append({
+            'Étape': name,
+            'Niveau': len(stack),
+            'Temps (ms)': wall * 1000,
+            'CPU (ms)': cpu * 1000,
+            'Alloué (Ko)': allocated / 1024 if allocated is not None else None
+        })
+
+def measured(name):
+    """Décorateur : chaque appel de la fonction est mesuré comme une étape"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def close_run():
+    """Clôt le rerun en cours : ses étapes rejoignent l'historique (reruns sans étape ignorés)"""
+    state = _state()
+    state['run'] += 1
+
+    if state['current']:
+        state['runs'].append({'run': state['run'], 'stages': list(state['current'])})
+        state['current'].clear()
+
+def run_table(run):
+    """Étapes d'un rerun regroupées par nom : appels, temps, CPU et allocations cumulés"""
+    stages = pd.DataFrame(run['stages'])
+    table = stages.groupby('Étape', sort=False).agg(**{
+        'Appels': ('Étape', 'size'),
+        'Niveau': ('Niveau', 'min'),
+        'Temps (ms)': ('Temps (ms)', 'sum'),
+        'CPU (ms)': ('CPU (ms)', 'sum'),
+        'Alloué (Ko)': ('Alloué (Ko)', lambda values: values.max() if values.notna().any() else None)
+    }).reset_index()
+
+    return table.sort_values('Temps (ms)', ascending=False).round(1)
+
+def performance_sidebar():
+    """Panneau « Performance » facultatif : étapes mesurées des derniers reruns"""
+    close_run()
+
+    if not st.sidebar.checkbox("⏱️ Performance", key='_performance_visible'):
+        return
+
+    runs = list(_state()['runs'])
+    with st.sidebar.expander("⏱️ Performance", expanded=True):
+        allocations = st.checkbox(
+            "Mesurer les allocations (ralentit l'application)",
+            value=tracemalloc.is_tracing(),
+            key='_performance_allocations'
+        )
+        if allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not allocations and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+        if not runs:
+            st.caption("Aucune étape mesurée pour l'instant.")
+            return
+
+        n_runs = st.slider("Derniers reruns :", min_value=1, max_value=len(runs), value=min(5, len(runs)),
+                           key='_performance_reruns') if len(runs) > 1 else 1
+
+        for run in reversed(runs[-n_runs:]):
+            table = run_table(run)
+            total = table.loc[table['Niveau'] == 0, 'Temps (ms)'].sum()
+            st.markdown(f"**Rerun {run['run']}** — {total:.0f} ms mesurées")
+            st.dataframe(table.drop(columns='Niveau'), use_container_width=True, hide_index=True)
@@ -0,0 +1,199 @@
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# Dossier des fichiers exportés (modifiable via ANALYSE_SCOLAIRE_METRIQUES)
+METRICS_DIR = os.environ.get(
+    'ANALYSE_SCOLAIRE_METRIQUES',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'metriques')
+)
+
+# Fichier au format texte de Prometheus (collecteur « textfile » de node_exporter) et journal JSON Lines
+PROMETHEUS_FILE = 'analyse_scolaire.prom'
+JSONL_FILE = 'metriques.jsonl'
+
+# Intervalle d'écriture en secondes (modifiable via ANALYSE_SCOLAIRE_METRIQUES_S)
+INTERVAL_S = float(os.environ.get('ANALYSE_SCOLAIRE_METRIQUES_S', 15))
+
+# Taille au-delà de laquelle le journal est renommé en .1 et recommencé
+MAX_LOG_MB = 50
+
+# Bornes des histogrammes de durée, en secondes
+DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Métriques exportées : type et description
+METRICS = {
+    'analyse_scolaire_rerun_secondes': ('histogram', "Durée d'un rerun complet, par page"),
+    'analyse_scolaire_lecture_secondes': ('histogram', "Durée de lecture et de nettoyage d'une feuille téléversée"),
+    'analyse_scolaire_cache_requetes_total': ('counter', "Requêtes aux caches de l'application, par cache et résultat (hit, miss)"),
+    'analyse_scolaire_sessions_actives': ('gauge', "Sessions ouvertes ayant exécuté au moins un rerun"),
+    'analyse_scolaire_registre_octets': ('gauge', "Mémoire des jeux de données partagés par les sessions"),
+    'analyse_scolaire_registre_projete_octets': ('gauge', "Colonnes des jeux partagés projetées depuis le stockage par colonnes (pages de fichier partagées)"),
+    'analyse_scolaire_registre_jeux': ('gauge', "Nombre de jeux de données partagés par les sessions"),
+}
+
+# État du processus : valeurs par (métrique, étiquettes), sessions vues, écrivain
+_lock = threading.Lock()
+_values = {}
+_sessions = set()
+_writer = None
+
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def increment(name, value=1, **labels):
+    """Ajoute `value` à un compteur"""
+    key = (name, _labels(labels))
+    with _lock:
+        _values[key] = _values.get(key, 0) + value
+
+def set_gauge(name, value, **labels):
+    """Fixe la valeur d'une jauge"""
+    with _lock:
+        _values[(name, _labels(labels))] = value
+
+def observe(name, value, **labels):
+    """Ajoute une observation à un histogramme de durée"""
+    key = (name, _labels(labels))
+    with _lock:
+        histogram = _values.get(key)
+        if histogram is None:
+            histogram = _values[key] = {'buckets': [0] * (len(DURATION_BUCKETS) + 1), 'sum': 0.0, 'count': 0}
+        histogram['buckets'][bisect_left(DURATION_BUCKETS, value)] += 1
+        histogram['sum'] += value
+        histogram['count'] += 1
+
+@contextmanager
+def timed(name, **labels):
+    """Observe la durée du bloc dans un histogramme"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+def count_cache(cache, hit):
+    """Compte une requête à un cache de l'application"""
+    increment('analyse_scolaire_cache_requetes_total', cache=cache, resultat='hit' if hit else 'miss')
+
+def record_rerun(page, seconds):
+    """Enregistre la durée d'un rerun et démarre l'écriture périodique au premier appel"""
+    observe('analyse_scolaire_rerun_secondes', seconds, page=page)
+
+    ctx = get_script_run_ctx()
+    if ctx is not None and ctx.session_id not in _sessions:
+        with _lock:
+            _sessions.add(ctx.session_id)
+
+    if _writer is None:
+        _start_writer()
+
+def _active_sessions():
+    """Sessions vues encore ouvertes (les sessions fermées sont oubliées)"""
+    if not Runtime.exists():
+        return len(_sessions)
+
+    runtime = Runtime.instance()
+    with _lock:
+        _sessions.difference_update([session for session in _sessions if not runtime.is_active_session(session)])
+        return len(_sessions)
+
+def _snapshot():
+    """Copie cohérente des métriques, triée par nom puis étiquettes"""
+    set_gauge('analyse_scolaire_sessions_actives', _active_sessions())
+    with _lock:
+        return sorted(
+            (name, labels, dict(value, buckets=list(value['buckets'])) if isinstance(value, dict) else value)
+            for (name, labels), value in _values.items()
+        )
+
+def _format_labels(labels, extra=()):
+    """Étiquettes au format Prometheus (barres obliques, guillemets et sauts de ligne échappés)"""
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        f'{key}="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for key, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+def prometheus_text(samples):
+    """Métriques au format texte d'exposition de Prometheus"""
+    lines, described = [], set()
+
+    for name, labels, value in samples:
+        if name not in described:
+            kind, description = METRICS.get(name, ('untyped', name))
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+            described.add(name)
+
+        if isinstance(value, dict):
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS + ('+Inf',), value['buckets']):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', str(bound))])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {value['sum']:.6f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {value['count']}")
+        else:
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    return '\n'.join(lines) + '\n'
+
+def json_record(samples):
+    """Ligne du journal JSON Lines : horodatage et valeur de chaque métrique"""
+    metrics = []
+    for name, labels, value in samples:
+        sample = {'nom': name, 'etiquettes': dict(labels)}
+        if isinstance(value, dict):
+            sample.update(bornes=list(DURATION_BUCKETS), seaux=value['buckets'],
+                          somme=round(value['sum'], 6), nombre=value['count'])
+        else:
+            sample['valeur'] = value
+        metrics.append(sample)
+
+    return json.dumps({'horodatage': datetime.now().isoformat(timespec='seconds'), 'pid': os.getpid(),
+                       'metriques': metrics}, ensure_ascii=False)
+
+def write_metrics():
+    """Écrit le fichier Prometheus (remplacé atomiquement) et ajoute une ligne au journal"""
+    samples = _snapshot()
+    os.makedirs(METRICS_DIR, exist_ok=True)
+
+    prometheus_path = os.path.join(METRICS_DIR, PROMETHEUS_FILE)
+    with open(prometheus_path + '.tmp', 'w', encoding='utf-8') as target:
+        target.write(prometheus_text(samples))
+    os.replace(prometheus_path + '.tmp', prometheus_path)
+
+    log_path = os.path.join(METRICS_DIR, JSONL_FILE)
+    if os.path.exists(log_path) and os.path.getsize(log_path) > MAX_LOG_MB * 2 ** 20:
+        os.replace(log_path, log_path + '.1')
+    with open(log_path, 'a', encoding='utf-8') as log:
+        log.write(json_record(samples) + '\n')
+
+def _write_periodically():
+    while True:
+        time.sleep(INTERVAL_S)
+        try:
+            write_metrics()
+        except OSError:
+            # Dossier indisponible : nouvel essai à l'intervalle suivant
+            pass
+
+def _start_writer():
+    """Démarre le fil d'écriture du processus (une seule fois) et l'écriture finale à l'arrêt"""
+    global _writer
+    with _lock:
+        if _writer is not None:
+            return
+        _writer = threading.Thread(target=_write_periodically, name='metriques', daemon=True)
+        _writer.start()
+    atexit.register(write_metrics)
@@ -0,0 +1,289 @@
+import numpy as np
+import pandas as pd
+
+# Catégories de ratio élèves/DP, de la plus chargée à la moins chargée
+RATIO_CATEGORIES = ['Très élevé (≥60)', 'Élevé (40-60)', 'Normal (20-40)', 'Faible (<20)']
+
+# Colonnes lues dans chaque feuille : fragment d'en-tête (comme dans les fonctions de nettoyage) -> type
+# Les colonnes absentes du schéma (colonnes vides, détails du questionnaire) ne sont pas lues.
+SHEET_SCHEMAS = {
+    'Sheet3': {
+        'Région': 'object', 'Ecole': 'object',
+        'Ratio maximum approximatif': 'float64', 'Ratio minimum approximatif': 'float64',
+        'Ratio moyen': 'float64', 'Écart-type du ratio moyen/max': 'float64',
+        'Écart-type du ratio min/max': 'float64',
+        "Nombre total de salles de classe dans l'école": 'int64',
+        'Salle de classe utilisée': 'int64', 'Salle de classe non utilisée': 'int64',
+        'Autre usage': 'int64', 'Motif autre usage': 'object',
+        'Taille de la salle': 'object', 'mètres carrés': 'object'
+    },
+    'Sheet4': {
+        'Région': 'object', 'Ecole': 'object',
+        'Nbre DP': 'int64', 'Nbre enseign': 'int64', 'Nbre Eleves': 'int64'
+    },
+    'Sheet5': {
+        'Moughataa': 'object', 'Ecole': 'object',
+        'Etat général de la salle': 'object',
+        'Longueur de la salle': 'float64', 'Largeur de la salle': 'float64',
+        'La superficie de la salle': 'float64',
+        'Etat de la porte de la salle est-elle': 'object', 'La fenêtre est-elle': 'object',
+        'aération': 'object', 'Fenêtres': 'int64', 'Nombre de prises de la salle': 'int64',
+        'Espace de projection prévu': 'object',
+        'Nombre de Tables-bancs partagés': 'int64',
+        'La salle nécessite-t-elle une réhabilitation': 'object', 'Besoins en mobilier': 'object'
+    }
+}
+
+
+def normalize_school_names(names):
+    """Normalise des noms d'école : accents, casse, ponctuation et espaces"""
+    return (
+        pd.Series(names, dtype='object')
+        .fillna('')
+        .astype(str)
+        .str.normalize('NFKD')
+        .str.encode('ascii', errors='ignore')
+        .str.decode('ascii')
+        .str.lower()
+        .str.replace(r'[^a-z0-9]+', ' ', regex=True)
+        .str.strip()
+        .to_numpy()
+    )
+
+def clean_sheet3_data(df):
+    """Nettoie et prépare les données de la feuille Sheet3"""
+    
+    # Renommer les colonnes pour uniformité
+    rename_dict = {}
+    for col in df.columns:
+        col_str = str(col)
+        
+        if 'Région' in col_str:
+            rename_dict[col] = 'Région'
+        elif 'Ecole' in col_str or 'Ecole' in col_str:
+            rename_dict[col] = 'Ecole'
+        elif 'Ratio maximum approximatif' in col_str:
+            rename_dict[col] = 'Ratio maximum'
+        elif 'Ratio minimum approximatif' in col_str:
+            rename_dict[col] = 'Ratio minimum'
+        elif 'Ratio moyen' in col_str:
+            rename_dict[col] = 'Ratio moyen'
+        elif 'Écart-type du ratio moyen/max' in col_str:
+            rename_dict[col] = 'Écart-type moyen/max'
+        elif 'Écart-type du ratio min/max' in col_str:
+            rename_dict[col] = 'Écart-type min/max'
+        elif 'Nombre total de salles de classe dans l\'école' in col_str:
+            rename_dict[col] = 'Total salles'
+        elif 'Salle de classe utilisée' in col_str:
+            rename_dict[col] = 'Salles utilisées'
+        elif 'Salle de classe non utilisée' in col_str:
+            rename_dict[col] = 'Salles non utilisées'
+        elif 'Autre usage' in col_str:
+            rename_dict[col] = 'Autres usages'
+        elif 'Motif autre usage' in col_str:
+            rename_dict[col] = 'Motif autre usage'
+        elif 'Taille de la salle' in col_str or 'mètres carrés' in col_str:
+            rename_dict[col] = 'Taille salle'
+    
+    df = df.rename(columns=rename_dict)
+    
+    # Nettoyer les données numériques
+    numeric_columns = [
+        'Ratio maximum', 'Ratio minimum', 'Ratio moyen',
+        'Écart-type moyen/max', 'Écart-type min/max',
+        'Total salles', 'Salles utilisées', 'Salles non utilisées', 'Autres usages'
+    ]
+    
+    for col in numeric_columns:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    
+    # Calculer des métriques supplémentaires
+    if 'Salles utilisées' in df.columns and 'Total salles' in df.columns:
+        df['Taux utilisation (%)'] = (df['Salles utilisées'] / df['Total salles'] * 100).round(1)
+    
+    if 'Salles non utilisées' in df.columns and 'Total salles' in df.columns:
+        df['Taux non utilisation (%)'] = (df['Salles non utilisées'] / df['Total salles'] * 100).round(1)
+    
+    if 'Autres usages' in df.columns and 'Total salles' in df.columns:
+        df['Taux autres usages (%)'] = (df['Autres usages'] / df['Total salles'] * 100).round(1)
+    
+    # Calculer l'écart ratio (max-min)
+    if 'Ratio maximum' in df.columns and 'Ratio minimum' in df.columns:
+        df['Écart ratio'] = (df['Ratio maximum'] - df['Ratio minimum']).round(1)
+    
+    # Catégoriser les écoles par taux d'utilisation
+    if 'Taux utilisation (%)' in df.columns:
+        conditions = [
+            df['Taux utilisation (%)'] >= 90,
+            df['Taux utilisation (%)'] >= 70,
+            df['Taux utilisation (%)'] >= 50,
+            df['Taux utilisation (%)'] < 50
+        ]
+        choices = ['Très élevé (≥90%)', 'Élevé (70-90%)', 'Moyen (50-70%)', 'Faible (<50%)']
+        df['Catégorie utilisation'] = np.select(conditions, choices, default='Non défini')
+    
+    return df
+
+def ratio_category(ratio):
+    """Catégorie de chaque valeur de ratio élèves/DP"""
+    conditions = [ratio >= 60, ratio >= 40, ratio >= 20, ratio < 20]
+    return np.select(conditions, RATIO_CATEGORIES, default='Non définie')
+
+def clean_sheet4_data(df):
+    """Nettoie et prépare les données de la feuille Sheet4"""
+    
+    # Renommer les colonnes pour uniformité
+    rename_dict = {}
+    for col in df.columns:
+        col_str = str(col)
+        
+        if 'Région' in col_str:
+            rename_dict[col] = 'Région'
+        elif 'Ecole' in col_str or 'Ecole' in col_str:
+            rename_dict[col] = 'Ecole'
+        elif 'Nbre DP' in col_str:
+            rename_dict[col] = 'Nbre DP total'
+        elif 'Nbre enseign' in col_str:
+            rename_dict[col] = 'Nbre enseignants total'
+        elif 'Nbre Eleves' in col_str:
+            rename_dict[col] = 'Nbre élèves total'
+    
+    df = df.rename(columns=rename_dict)
+    
+    # Nettoyer les données numériques
+    numeric_columns = ['Nbre DP total', 'Nbre enseignants total', 'Nbre élèves total']
+    
+    for col in numeric_columns:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    
+    # Calculer des métriques supplémentaires
+    # Ratio élèves/DP
+    if 'Nbre élèves total' in df.columns and 'Nbre DP total' in df.columns:
+        df['Ratio élèves/DP total'] = (df['Nbre élèves total'] / df['Nbre DP total']).round(1)
+    
+    # Ratio élèves/enseignants
+    if 'Nbre élèves total' in df.columns and 'Nbre enseignants total' in df.columns:
+        df['Ratio élèves/enseignants total'] = (df['Nbre élèves total'] / df['Nbre enseignants total']).round(1)
+    
+    # Ratio enseignants/DP
+    if 'Nbre enseignants total' in df.columns and 'Nbre DP total' in df.columns:
+        df['Ratio enseignants/DP total'] = (df['Nbre enseignants total'] / df['Nbre DP total']).round(1)
+    
+    # Calculer la charge par enseignant
+    if 'Nbre élèves total' in df.columns and 'Nbre enseignants total' in df.columns:
+        df['Charge par enseignant'] = df['Nbre élèves total'] / df['Nbre enseignants total']
+    
+    # Calculer l'efficacité DP (élèves par DP)
+    if 'Nbre élèves total' in df.columns and 'Nbre DP total' in df.columns:
+        df['Efficacité DP'] = df['Nbre élèves total'] / df['Nbre DP total']
+    
+    # Catégoriser les écoles par taille
+    if 'Nbre élèves total' in df.columns:
+        conditions = [
+            df['Nbre élèves total'] >= 500,
+            df['Nbre élèves total'] >= 300,
+            df['Nbre élèves total'] >= 100,
+            df['Nbre élèves total'] < 100
+        ]
+        choices = ['Très grande (≥500)', 'Grande (300-500)', 'Moyenne (100-300)', 'Petite (<100)']
+        df['Catégorie taille'] = np.select(conditions, choices, default='Non définie')
+    
+    # Catégoriser par ratio élèves/DP
+    if 'Ratio élèves/DP total' in df.columns:
+        df['Catégorie ratio'] = ratio_category(df['Ratio élèves/DP total'])
+    
+    # La densité (élèves/m², élèves/salle) nécessite la feuille Sheet5 : voir add_density_metrics
+    
+    return df
+
+def clean_sheet5_data(df):
+    """Nettoie et prépare les données de la feuille Sheet5"""
+    
+    # Vérifier si nous avons les bonnes colonnes
+    required_columns = ['Moughataa', 'Ecole']
+    
+    # Renommer les colonnes pour uniformité
+    rename_dict = {}
+    for col in df.columns:
+        if 'Moughataa' in str(col):
+            rename_dict[col] = 'Moughataa'
+        elif 'Ecole' in str(col) or 'Ecole' in str(col):
+            rename_dict[col] = 'Ecole'
+        elif 'Etat général de la salle' in str(col):
+            rename_dict[col] = 'Etat général'
+        elif 'Longueur de la salle' in str(col):
+            rename_dict[col] = 'Longueur (m)'
+        elif 'Largeur de la salle' in str(col):
+            rename_dict[col] = 'Largeur (m)'
+        elif 'La superficie de la salle' in str(col):
+            rename_dict[col] = 'Superficie (m²)'
+        elif 'Etat de la porte de la salle est-elle' in str(col):
+            rename_dict[col] = 'Etat de la porte'
+        elif 'La fenêtre est-elle' in str(col):
+            rename_dict[col] = 'Etat des fenêtres'
+        elif 'Type d\'aération' in str(col):
+            rename_dict[col] = 'Type d\'aération'
+        elif 'Fenêtres' in str(col) and df[col].dtype in [np.int64, np.float64]:
+            rename_dict[col] = 'Nombre de fenêtres'
+        elif 'Nombre de prises de la salle' in str(col):
+            rename_dict[col] = 'Nombre de prises'
+        elif 'Espace de projection prévu' in str(col):
+            rename_dict[col] = 'Espace projection'
+        elif 'La salle nécessite-t-elle une réhabilitation' in str(col):
+            rename_dict[col] = 'Réhabilitation nécessaire'
+        elif 'Besoins en mobilier' in str(col):
+            rename_dict[col] = 'Besoins mobilier'
+    
+    df = df.rename(columns=rename_dict)
+    
+    # Nettoyer les données numériques
+    numeric_columns = ['Longueur (m)', 'Largeur (m)', 'Superficie (m²)', 
+                      'Nombre de fenêtres', 'Nombre de prises']
+    
+    for col in numeric_columns:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    
+    # Calculer la superficie si nécessaire
+    if 'Superficie (m²)' not in df.columns and 'Longueur (m)' in df.columns and 'Largeur (m)' in df.columns:
+        df['Superficie (m²)'] = df['Longueur (m)'] * df['Largeur (m)']
+    
+    return df
+
+def rollup_sheet5_by_school(df):
+    """Agrège les salles de la feuille Sheet5 par école (superficie, réhabilitation, équipements)"""
+    rooms = pd.DataFrame({
+        'Clé école': normalize_school_names(df['Ecole']),
+        'Superficie (m²)': pd.to_numeric(df.get('Superficie (m²)'), errors='coerce'),
+        'À réhabiliter': (df['Réhabilitation nécessaire'] == 'Oui') if 'Réhabilitation nécessaire' in df.columns else False,
+        'Nombre de prises': pd.to_numeric(df.get('Nombre de prises'), errors='coerce'),
+        'Nombre de fenêtres': pd.to_numeric(df.get('Nombre de fenêtres'), errors='coerce')
+    })
+    rooms = rooms[rooms['Clé école'] != '']
+
+    rollup = rooms.groupby('Clé école', sort=False).agg(**{
+        'Salles décrites': ('Superficie (m²)', 'size'),
+        'Superficie totale (m²)': ('Superficie (m²)', 'sum'),
+        'Superficie moyenne (m²)': ('Superficie (m²)', 'mean'),
+        'Salles à réhabiliter': ('À réhabiliter', 'sum'),
+        'Total prises': ('Nombre de prises', 'sum'),
+        'Total fenêtres': ('Nombre de fenêtres', 'sum')
+    })
+    rollup['Superficie moyenne (m²)'] = rollup['Superficie moyenne (m²)'].round(1)
+
+    return rollup
+
+def add_density_metrics(df, rollup):
+    """Joint l'agrégat Sheet5 aux totaux Sheet4 et calcule les densités élèves/m² et élèves/salle"""
+    df = df.drop(columns=[col for col in rollup.columns if col in df.columns])
+    df = df.join(rollup, on=pd.Series(normalize_school_names(df['Ecole']), index=df.index))
+
+    if 'Nbre élèves total' in df.columns:
+        df['Densité élèves/m²'] = (
+            df['Nbre élèves total'] / df['Superficie totale (m²)'].replace(0, np.nan)
+        ).round(2)
+        df['Élèves par salle'] = (df['Nbre élèves total'] / df['Salles décrites']).round(1)
+
+    return df
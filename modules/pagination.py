@@ -0,0 +1,134 @@
+import math
+import numpy as np
+import streamlit as st
+from modules.memoire import track
+
+# Nombre maximal de lignes envoyées au navigateur par message
+MAX_ROWS_PER_PAGE = 200
+
+# Clé de session regroupant les index de tri et de recherche de chaque tableau
+_STATE_KEY = '_pagination'
+
+
+def _table_state(table_key, data_key):
+    """Retourne le cache d'un tableau, réinitialisé si les données ont changé"""
+    store = st.session_state.setdefault(_STATE_KEY, {})
+    state = store.get(table_key)
+
+    if state is None or state['data_key'] != data_key:
+        state = {'data_key': data_key, 'orders': {}, 'search_text': None, 'masks': {}}
+        store[table_key] = state
+
+    return state
+
+def _sorted_order(df, state, sort_column, ascending):
+    """Index positionnel trié, calculé une seule fois par colonne et par sens"""
+    cache_key = (sort_column, ascending)
+
+    if cache_key not in state['orders']:
+        if sort_column is None:
+            order = np.arange(len(df))
+        else:
+            order = (
+                df[sort_column]
+                .reset_index(drop=True)
+                .sort_values(ascending=ascending, kind='mergesort', na_position='last')
+                .index
+                .to_numpy()
+            )
+        state['orders'][cache_key] = order
+
+    return state['orders'][cache_key]
+
+def _search_mask(df, state, query):
+    """Masque des lignes contenant le texte recherché (colonnes textuelles, insensible à la casse)"""
+    if query not in state['masks']:
+        if state['search_text'] is None:
+            # Colonnes texte mises en minuscules une seule fois par jeu de données
+            text_columns = df.select_dtypes(include=['object', 'category']).columns
+            state['search_text'] = [
+                df[col].astype(str).str.lower().to_numpy().astype(str) for col in text_columns
+            ]
+
+        mask = np.zeros(len(df), dtype=bool)
+        for values in state['search_text']:
+            mask |= np.char.find(values, query) >= 0
+
+        # Ne conserver que la dernière recherche pour limiter la mémoire
+        state['masks'] = {query: mask}
+
+    return state['masks'][query]
+
+def paginated_dataframe(df, table_key, data_key, sort_column=None, ascending=False,
+                        page_size=50, **dataframe_kwargs):
+    """Affiche un DataFrame page par page avec tri et recherche côté serveur
+
+    Seule la page courante (au plus MAX_ROWS_PER_PAGE lignes) est envoyée au navigateur.
+    `data_key` identifie le contenu de `df` (empreinte du fichier, paramètres...) : les index
+    de tri et de recherche sont recalculés uniquement lorsqu'il change.
+    """
+    state = _table_state(table_key, data_key)
+    page_size = min(page_size, MAX_ROWS_PER_PAGE)
+    columns = list(df.columns)
+
+    col1, col2, col3 = st.columns([2, 2, 1])
+
+    with col1:
+        query = st.text_input(
+            "🔎 Rechercher:",
+            key=f"{table_key}_recherche",
+            placeholder="Nom d'école, région..."
+        ).strip().lower()
+
+    with col2:
+        sort_options = ["Ordre d'origine"] + columns
+        default_sort = sort_options.index(sort_column) if sort_column in columns else 0
+        selected_sort = st.selectbox(
+            "Trier par:",
+            options=sort_options,
+            index=default_sort,
+            key=f"{table_key}_tri"
+        )
+        selected_sort = None if selected_sort == "Ordre d'origine" else selected_sort
+
+    with col3:
+        descending = st.checkbox(
+            "Décroissant",
+            value=not ascending,
+            key=f"{table_key}_ordre"
+        )
+
+    order = _sorted_order(df, state, selected_sort, not descending)
+
+    if query:
+        mask = _search_mask(df, state, query)
+        order = order[mask[order]]
+
+    # Index de tri et de recherche comptés dans le budget mémoire de la session
+    track(
+        (_STATE_KEY, table_key), state,
+        lambda: st.session_state[_STATE_KEY].pop(table_key, None),
+        label=f"Tableau {table_key}"
+    )
+
+    n_rows = len(order)
+    n_pages = max(1, math.ceil(n_rows / page_size))
+
+    page = st.number_input(
+        f"Page (sur {n_pages}):",
+        min_value=1,
+        max_value=n_pages,
+        value=1,
+        step=1,
+        key=f"{table_key}_page"
+    )
+    page = min(int(page), n_pages)
+
+    start = (page - 1) * page_size
+    page_positions = order[start:start + page_size]
+
+    st.dataframe(df.iloc[page_positions], use_container_width=True, **dataframe_kwargs)
+    st.caption(
+        f"Lignes {start + 1 if n_rows else 0}–{start + len(page_positions)} sur {n_rows}"
+        + (f" (filtrées sur {len(df)})" if query else "")
+    )
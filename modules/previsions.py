@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+from modules.annees import BASE_COLUMNS, N_YEARS, metric_matrix, linear_fit
+
+# Paramètres des lissages (fixes : six années ne suffisent pas à les estimer école par école)
+ALPHA = 0.5   # poids de la dernière observation dans le niveau
+BETA = 0.3    # poids de la dernière variation dans la tendance
+PHI = 0.8     # amortissement de la tendance
+
+MODELS = ['Tendance linéaire', 'Tendance amortie', 'Lissage exponentiel']
+
+# Indicateurs projetés : colonne BD -> libellé
+FORECAST_METRICS = {'Nbre Eleves': 'Élèves', 'Nbre DP': 'DP'}
+
+
+def forecast_linear(matrix, horizon):
+    """Prolonge la droite des moindres carrés de chaque école"""
+    slopes, intercepts = linear_fit(matrix)
+    return intercepts + slopes * (matrix.shape[1] + horizon)
+
+def forecast_damped(matrix, horizon):
+    """Tendance amortie (Holt) appliquée à toutes les écoles à la fois, année par année"""
+    level = pd.DataFrame(matrix).bfill(axis=1).to_numpy()[:, 0]
+    trend = np.zeros(len(matrix))
+
+    for year in range(1, matrix.shape[1]):
+        observed = matrix[:, year]
+        new_level = ALPHA * observed + (1 - ALPHA) * (level + PHI * trend)
+        new_trend = BETA * (new_level - level) + (1 - BETA) * PHI * trend
+        # Année manquante : on garde le niveau et la tendance précédents
+        missing = np.isnan(observed)
+        level = np.where(missing, level, new_level)
+        trend = np.where(missing, trend, new_trend)
+
+    damping = sum(PHI ** step for step in range(1, horizon + 1))
+    return level + damping * trend
+
+def forecast_smoothing(matrix, horizon):
+    """Lissage exponentiel simple : la prévision est le dernier niveau lissé"""
+    level = pd.DataFrame(matrix).bfill(axis=1).to_numpy()[:, 0]
+
+    for year in range(1, matrix.shape[1]):
+        observed = matrix[:, year]
+        level = np.where(np.isnan(observed), level, ALPHA * observed + (1 - ALPHA) * level)
+
+    return level
+
+_FORECASTERS = [forecast_linear, forecast_damped, forecast_smoothing]
+
+def forecast_matrix(matrix, horizon=1):
+    """Choisit le meilleur modèle de chaque école sur la dernière année puis projette
+
+    Les modèles sont ajustés sur les 5 premières années et comparés sur la 6e (erreur absolue) ;
+    le modèle retenu est ensuite réajusté sur les 6 années.
+    Retourne les prévisions, l'indice du modèle retenu et son erreur de test.
+    """
+    train, actual = matrix[:, :-1], matrix[:, -1]
+
+    errors = np.column_stack([np.abs(forecaster(train, 1) - actual) for forecaster in _FORECASTERS])
+    best = np.argmin(np.where(np.isnan(errors), np.inf, errors), axis=1)
+
+    forecasts = np.column_stack([forecaster(matrix, horizon) for forecaster in _FORECASTERS])
+    rows = np.arange(len(matrix))
+
+    return np.clip(forecasts[rows, best], 0, None), best, errors[rows, best]
+
+def forecast_schools(df, horizon=1):
+    """Prévisions d'élèves et de DP de toutes les écoles, avec le ratio élèves/DP projeté"""
+    result = df.iloc[:, :len(BASE_COLUMNS)].copy()
+    result.columns = BASE_COLUMNS
+    target_year = N_YEARS + horizon
+
+    for metric, label in FORECAST_METRICS.items():
+        matrix = metric_matrix(df, metric)
+        forecast, best, error = forecast_matrix(matrix, horizon)
+
+        result[f'{label} année {N_YEARS}'] = matrix[:, -1]
+        result[f'{label} prévus année {target_year}'] = forecast.round(0)
+        result[f'Modèle {label}'] = np.array(MODELS, dtype=object)[best]
+        result[f'Erreur test {label}'] = error.round(1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result[f'Ratio élèves/DP année {N_YEARS}'] = (
+            result[f'Élèves année {N_YEARS}'] / result[f'DP année {N_YEARS}']
+        ).replace([np.inf, -np.inf], np.nan).round(1)
+        result[f'Ratio élèves/DP prévu année {target_year}'] = (
+            result[f'Élèves prévus année {target_year}'] / result[f'DP prévus année {target_year}']
+        ).replace([np.inf, -np.inf], np.nan).round(1)
+
+    return result
@@ -0,0 +1,296 @@
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+from modules.annees import YEAR_METRICS, N_YEARS, metric_matrix
+from modules.correspondance import (
+    workbook_frames, cached_school_index, cached_school_profiles, search_school_keys
+)
+from modules.anomalies import detect_anomalies
+from modules.lecture import UPLOAD_TYPES
+from modules.formulaires import run_if_changed
+from modules.voisins import cached_neighbor_index, show_similar_schools
+from modules.stockage import stored_dataset_picker
+import warnings
+warnings.filterwarnings('ignore')
+
+# Configuration de la page
+st.set_page_config(
+    page_title="Profil d'École",
+    page_icon="🏫",
+    layout="wide"
+)
+
+# Style CSS personnalisé
+st.markdown("""
+<style>
+    .main-header {
+        color: #FFFFFF;
+        text-align: center;
+        padding: 2rem;
+        background: linear-gradient(135deg, #1E3A8A 0%, #3B82F6 100%);
+        border-radius: 10px;
+        margin-bottom: 2rem;
+        box-shadow: 0 4px 6px rgba(0,0,0,0.1);
+    }
+    .stButton>button {
+        background: linear-gradient(135deg, #3B82F6 0%, #1E3A8A 100%);
+        color: white;
+        border: none;
+        padding: 0.75rem 2rem;
+        border-radius: 25px;
+        font-weight: bold;
+        transition: all 0.3s ease;
+        width: 100%;
+        font-size: 1.1rem;
+    }
+    .stButton>button:hover {
+        transform: translateY(-2px);
+        box-shadow: 0 5px 15px rgba(59, 130, 246, 0.4);
+    }
+    .upload-section {
+        background: #f0f9ff;
+        padding: 2rem;
+        border-radius: 10px;
+        margin-bottom: 2rem;
+        border: 2px dashed #3B82F6;
+    }
+    .success-message {
+        background: #dcfce7;
+        color: #166534;
+        padding: 1.5rem;
+        border-radius: 10px;
+        border-left: 5px solid #10b981;
+        margin: 1rem 0;
+        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+    }
+    .info-box {
+        background: #e0f2fe;
+        color: #075985;
+        padding: 1.5rem;
+        border-radius: 10px;
+        border-left: 5px solid #0ea5e9;
+        margin: 1rem 0;
+        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+    }
+    .warning-box {
+        background: #fef3c7;
+        color: #92400e;
+        padding: 1.5rem;
+        border-radius: 10px;
+        border-left: 5px solid #f59e0b;
+        margin: 1rem 0;
+    }
+    .stat-card {
+        background: white;
+        padding: 1.5rem;
+        border-radius: 10px;
+        box-shadow: 0 2px 8px rgba(0,0,0,0.1);
+        text-align: center;
+        border-top: 4px solid #3B82F6;
+    }
+    .graph-card {
+        background: white;
+        padding: 1.5rem;
+        border-radius: 10px;
+        box-shadow: 0 2px 8px rgba(0,0,0,0.1);
+        margin-bottom: 1.5rem;
+    }
+</style>
+""", unsafe_allow_html=True)
+
+# En-tête de l'application
+st.markdown("""
+<div class="main-header">
+    <h1 style="margin: 0; font-size: 2.5rem;">🔎 Profil d'École</h1>
+    <p style="margin-top: 1rem; font-size: 1.2rem; opacity: 0.9;">Toutes les données d'une école : historique BD, totaux, ratios et salles</p>
+</div>
+""", unsafe_allow_html=True)
+
+# Indicateurs affichés en tête de chaque section
+SHEET4_METRICS = ['Nbre élèves total', 'Nbre enseignants total', 'Nbre DP total', 'Ratio élèves/DP total']
+SHEET3_METRICS = ['Ratio moyen', 'Total salles', 'Salles utilisées', 'Taux utilisation (%)']
+SHEET5_COLUMNS = ['Etat général', 'Superficie (m²)', 'Nombre de fenêtres', 'Nombre de prises',
+                  'Nombre de Tables-bancs partagés', 'Réhabilitation nécessaire', 'Besoins mobilier']
+
+
+def create_history_table(records):
+    """Historique sur six ans d'une école (une ligne par année) à partir de ses lignes BD"""
+    bd_rows = pd.DataFrame(records)
+    history = pd.DataFrame({'Année': range(1, N_YEARS + 1)})
+
+    for metric in YEAR_METRICS:
+        # Plusieurs lignes BD pour une même école : on additionne
+        history[metric] = metric_matrix(bd_rows, metric).sum(axis=0)
+
+    return history
+
+def show_metrics(record, metrics):
+    """Affiche quelques indicateurs d'une ligne sous forme de cartes"""
+    columns = st.columns(len(metrics))
+
+    for col, metric in zip(columns, metrics):
+        value = record.get(metric)
+        with col:
+            if isinstance(value, (int, float)) and pd.notna(value):
+                st.metric(metric, f"{value:,.0f}" if float(value).is_integer() else f"{value:,.1f}")
+            else:
+                st.metric(metric, "—")
+
+def show_school_profile(profile, key=None, peers=None):
+    """Affiche le profil complet d'une école
+
+    `peers` (indicateurs, index des voisins) permet d'afficher les écoles similaires.
+    """
+    sheets = profile['feuilles']
+    first_record = next(iter(sheets.values()))[0]
+    region = first_record.get('Région', first_record.get('Region', '—'))
+    moughataa = next(
+        (records[0]['Moughataa'] for records in sheets.values() if 'Moughataa' in records[0]), '—'
+    )
+
+    st.markdown(f"## 🏫 {profile['nom']}")
+    st.markdown(f"**Région :** {region} • **Moughataa :** {moughataa} • "
+                f"**Présente dans :** {', '.join(sheets)}")
+
+    # Historique BD
+    with st.expander("📅 Historique sur six ans (BD)", expanded=True):
+        if 'BD' in sheets:
+            history = create_history_table(sheets['BD'])
+            st.dataframe(history, use_container_width=True, hide_index=True)
+
+            fig = px.line(
+                history.melt(id_vars='Année', var_name='Indicateur', value_name='Valeur'),
+                x='Année', y='Valeur', color='Indicateur', markers=True,
+                title="Évolution sur six ans"
+            )
+            fig.update_layout(template="plotly_white", height=350)
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.info("ℹ️ École absente de la base BD (téléversez BD.xlsx ou choisissez une base enregistrée).")
+
+    # Totaux Sheet4
+    with st.expander("👥 Totaux et catégories (Sheet4)", expanded=True):
+        if 'Sheet4' in sheets:
+            record = sheets['Sheet4'][0]
+            show_metrics(record, SHEET4_METRICS)
+            st.markdown(f"**Catégorie taille :** {record.get('Catégorie taille', '—')} • "
+                        f"**Catégorie ratio :** {record.get('Catégorie ratio', '—')}")
+        else:
+            st.info("ℹ️ École absente de la feuille Sheet4.")
+
+    # Ratios Sheet3
+    with st.expander("📈 Ratios et utilisation des salles (Sheet3)", expanded=True):
+        if 'Sheet3' in sheets:
+            record = sheets['Sheet3'][0]
+            show_metrics(record, SHEET3_METRICS)
+            st.markdown(f"**Catégorie utilisation :** {record.get('Catégorie utilisation', '—')}")
+        else:
+            st.info("ℹ️ École absente de la feuille Sheet3.")
+
+    # Salles Sheet5
+    with st.expander("🚪 Salles de classe (Sheet5)", expanded=True):
+        if 'Sheet5' in sheets:
+            rooms = pd.DataFrame(sheets['Sheet5'])
+            st.markdown(f"**{len(rooms)} salle(s) décrite(s)**")
+            st.dataframe(
+                rooms[[col for col in SHEET5_COLUMNS if col in rooms.columns]],
+                use_container_width=True
+            )
+        else:
+            st.info("ℹ️ Aucune salle décrite pour cette école dans la feuille Sheet5.")
+
+    # Écoles de profil semblable
+    if peers is not None:
+        with st.expander("👥 Écoles similaires", expanded=False):
+            peers_df, neighbor_index = peers
+            show_similar_schools(peers_df, neighbor_index, key)
+
+def main():
+    # Section de téléversement
+    st.markdown('<div class="upload-section">', unsafe_allow_html=True)
+    col1, col2 = st.columns(2)
+    with col1:
+        uploaded_file = st.file_uploader(
+            "📤 Téléversez votre fichier (FIFA project.xlsx, ou export CSV, Parquet, JSON Lines)",
+            type=UPLOAD_TYPES,
+            help="Les feuilles Sheet3, Sheet4 et Sheet5 sont utilisées si elles sont présentes "
+                 "(un export CSV, Parquet ou JSON Lines fournit une seule de ces feuilles)",
+            key="profil_classeur"
+        )
+    with col2:
+        bd_file = st.file_uploader(
+            "📤 Base BD (optionnel)",
+            type=UPLOAD_TYPES,
+            help="À défaut, une base BD enregistrée peut être choisie ci-dessous",
+            key="profil_bd"
+        )
+        bd_dataset_id = None if bd_file is not None else stored_dataset_picker(
+            'BD', "profil_bd_enregistree", label="📂 Ou base BD enregistrée :"
+        )
+    st.markdown('</div>', unsafe_allow_html=True)
+
+    if uploaded_file is None and bd_file is None and bd_dataset_id is None:
+        st.info("👆 Téléversez le classeur pour consulter le profil d'une école.")
+        return
+
+    try:
+        frames, cache_key = workbook_frames(uploaded_file, bd_file, bd_dataset_id)
+
+        if not frames:
+            st.warning("⚠️ Aucune feuille exploitable (Sheet3, Sheet4, Sheet5 ou BD) n'a été trouvée.")
+            return
+
+        # Table de consultation construite une seule fois par téléversement
+        with st.spinner("🔄 Préparation des profils..."):
+            index = cached_school_index(cache_key, frames)
+            profiles, sorted_keys = cached_school_profiles(cache_key, index, frames)
+
+        st.success(f"✅ {len(profiles)} écoles disponibles ({', '.join(frames)})")
+
+        # Contrôle de qualité de toutes les feuilles du classeur
+        with st.expander("🚨 Contrôle de qualité du classeur", expanded=False):
+            flagged, counts = run_if_changed(
+                'profil_qualite',
+                cache_key,
+                lambda: tuple(zip(*(detect_anomalies(sheet_df, sheet) for sheet, sheet_df in frames.items())))
+            )
+            st.dataframe(
+                pd.concat([c.assign(Feuille=sheet) for sheet, c in zip(frames, counts)], ignore_index=True)
+                [['Feuille', 'Règle', 'Lignes']],
+                use_container_width=True,
+                hide_index=True
+            )
+            flagged_df = pd.concat(flagged, ignore_index=True)
+            if len(flagged_df) > 0:
+                st.dataframe(flagged_df, use_container_width=True, hide_index=True)
+
+        prefix = st.text_input(
+            "🔎 Nom de l'école (début du nom) :",
+            key="profil_recherche",
+            placeholder="Ex : Saleh"
+        )
+        matches = search_school_keys(sorted_keys, prefix)
+
+        if not matches:
+            st.warning("⚠️ Aucune école ne commence par ce nom.")
+            return
+
+        selected_key = st.selectbox(
+            f"École ({len(matches)} résultat(s) affiché(s)) :",
+            options=matches,
+            format_func=lambda key: profiles[key]['nom'] or key,
+            key="profil_ecole"
+        )
+
+        # Index des voisins sur les indicateurs Sheet4 (et Sheet3), construit une fois par téléversement
+        peers = None
+        if 'Sheet4' in frames:
+            peers = cached_neighbor_index(cache_key, frames['Sheet4'], frames.get('Sheet3'))
+
+        show_school_profile(profiles[selected_key], selected_key, peers)
+
+    except Exception as e:
+        st.error(f"❌ Erreur lors de la préparation des profils : {str(e)}")
+
+if __name__ == "__main__":
+    main()
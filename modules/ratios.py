@@ -7,6 +7,19 @@ from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+from modules.lecture import UPLOAD_TYPES, load_sheet
+from modules.validation import route_sheet
+from modules.nettoyage import SHEET_SCHEMAS, clean_sheet3_data, clean_sheet5_data
+from modules.simulation import DEFAULT_M2_PER_PUPIL, simulate_reassignment
+from modules.formulaires import submit_params, submitted_params, run_if_changed, show_rerun_counter
+from modules.pagination import paginated_dataframe
+from modules.exportation import export_buttons
+from modules.correspondance import school_index_section
+from modules.consolidation import consolidation_uploader
+from modules.anomalies import quality_section
+from modules.regroupement import clustering_section
+from modules.stockage import save_dataset, load_dataset, stored_dataset_picker, aggregate_dataset
+from modules.mesures import stage, measured
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -111,81 +124,7 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-def clean_sheet3_data(df):
-    """Nettoie et prépare les données de la feuille Sheet3"""
-    
-    # Renommer les colonnes pour uniformité
-    rename_dict = {}
-    for col in df.columns:
-        col_str = str(col)
-        
-        if 'Région' in col_str:
-            rename_dict[col] = 'Région'
-        elif 'Ecole' in col_str or 'Ecole' in col_str:
-            rename_dict[col] = 'Ecole'
-        elif 'Ratio maximum approximatif' in col_str:
-            rename_dict[col] = 'Ratio maximum'
-        elif 'Ratio minimum approximatif' in col_str:
-            rename_dict[col] = 'Ratio minimum'
-        elif 'Ratio moyen' in col_str:
-            rename_dict[col] = 'Ratio moyen'
-        elif 'Écart-type du ratio moyen/max' in col_str:
-            rename_dict[col] = 'Écart-type moyen/max'
-        elif 'Écart-type du ratio min/max' in col_str:
-            rename_dict[col] = 'Écart-type min/max'
-        elif 'Nombre total de salles de classe dans l\'école' in col_str:
-            rename_dict[col] = 'Total salles'
-        elif 'Salle de classe utilisée' in col_str:
-            rename_dict[col] = 'Salles utilisées'
-        elif 'Salle de classe non utilisée' in col_str:
-            rename_dict[col] = 'Salles non utilisées'
-        elif 'Autre usage' in col_str:
-            rename_dict[col] = 'Autres usages'
-        elif 'Motif autre usage' in col_str:
-            rename_dict[col] = 'Motif autre usage'
-        elif 'Taille de la salle' in col_str or 'mètres carrés' in col_str:
-            rename_dict[col] = 'Taille salle'
-    
-    df = df.rename(columns=rename_dict)
-    
-    # Nettoyer les données numériques
-    numeric_columns = [
-        'Ratio maximum', 'Ratio minimum', 'Ratio moyen',
-        'Écart-type moyen/max', 'Écart-type min/max',
-        'Total salles', 'Salles utilisées', 'Salles non utilisées', 'Autres usages'
-    ]
-    
-    for col in numeric_columns:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-    
-    # Calculer des métriques supplémentaires
-    if 'Salles utilisées' in df.columns and 'Total salles' in df.columns:
-        df['Taux utilisation (%)'] = (df['Salles utilisées'] / df['Total salles'] * 100).round(1)
-    
-    if 'Salles non utilisées' in df.columns and 'Total salles' in df.columns:
-        df['Taux non utilisation (%)'] = (df['Salles non utilisées'] / df['Total salles'] * 100).round(1)
-    
-    if 'Autres usages' in df.columns and 'Total salles' in df.columns:
-        df['Taux autres usages (%)'] = (df['Autres usages'] / df['Total salles'] * 100).round(1)
-    
-    # Calculer l'écart ratio (max-min)
-    if 'Ratio maximum' in df.columns and 'Ratio minimum' in df.columns:
-        df['Écart ratio'] = (df['Ratio maximum'] - df['Ratio minimum']).round(1)
-    
-    # Catégoriser les écoles par taux d'utilisation
-    if 'Taux utilisation (%)' in df.columns:
-        conditions = [
-            df['Taux utilisation (%)'] >= 90,
-            df['Taux utilisation (%)'] >= 70,
-            df['Taux utilisation (%)'] >= 50,
-            df['Taux utilisation (%)'] < 50
-        ]
-        choices = ['Très élevé (≥90%)', 'Élevé (70-90%)', 'Moyen (50-70%)', 'Faible (<50%)']
-        df['Catégorie utilisation'] = np.select(conditions, choices, default='Non défini')
-    
-    return df
-
+@measured("Statistiques récapitulatives")
 def create_summary_statistics(df):
     """Crée des statistiques récapitulatives pour Sheet3"""
     
@@ -228,11 +167,12 @@ def create_summary_statistics(df):
     
     return pd.Series(stats)
 
+@measured("Construction du graphique")
 def create_binary_statistical_graphs(df, x_variable, y_variable, graph_type, color_variable=None):
     """Crée des graphiques statistiques binaires"""
     
-    # Préparer les données
-    analysis_df = df.copy()
+    # Données lues sans copie : le résultat mémorisé ne duplique pas la table filtrée
+    analysis_df = df
     
     # Vérifier que les variables existent
     if x_variable not in analysis_df.columns:
@@ -433,20 +373,52 @@ def create_binary_statistical_graphs(df, x_variable, y_variable, graph_type, col
 def main():
     # Section de téléversement
     st.markdown('<div class="upload-section">', unsafe_allow_html=True)
-    uploaded_file = st.file_uploader(
-        "📤 Téléversez votre fichier Excel (FIFA project.xlsx)",
-        type=['xlsx', 'xls'],
-        help="Le fichier doit contenir une feuille 'Sheet3' avec les données des ratios et salles"
+    consolidation = st.checkbox(
+        "📚 Consolider plusieurs fichiers (un par région)", key="ratios_consolidation"
     )
+    uploaded_file, consolidated_df, consolidated_digest = None, None, None
+    if consolidation:
+        consolidated_df, consolidated_digest = consolidation_uploader(
+            'Sheet3', 'ratios_consolidation', cleaner=clean_sheet3_data, schema=SHEET_SCHEMAS['Sheet3']
+        )
+    else:
+        uploaded_file = st.file_uploader(
+            "📤 Téléversez votre fichier (FIFA project.xlsx, ou export CSV, Parquet, JSON Lines)",
+            type=UPLOAD_TYPES,
+            help="Le fichier doit contenir une feuille 'Sheet3' avec les données des ratios et salles (ou en être un export CSV, Parquet, JSON Lines)"
+        )
+    stored_dataset_id = None
+    if uploaded_file is None and not consolidation:
+        stored_dataset_id = stored_dataset_picker('Sheet3', key="ratios_jeu_enregistre")
     st.markdown('</div>', unsafe_allow_html=True)
     
-    if uploaded_file is not None:
+    if uploaded_file is not None or consolidated_df is not None or stored_dataset_id is not None:
         try:
-            # Lire uniquement la feuille Sheet3
-            df = pd.read_excel(uploaded_file, sheet_name='Sheet3', engine='openpyxl')
-            
-            # Nettoyer les données
-            df = clean_sheet3_data(df)
+            if uploaded_file is not None:
+                # Vérifier la structure sur les seuls en-têtes avant toute lecture complète
+                sheet_name = route_sheet(uploaded_file, 'Sheet3')
+                if sheet_name is None:
+                    return
+                
+                # Lire et nettoyer uniquement la feuille Sheet3 (mis en cache tant que le fichier ne change pas)
+                df, digest = load_sheet(uploaded_file, sheet_name, clean_sheet3_data, SHEET_SCHEMAS['Sheet3'])
+                
+                # Conserver la feuille nettoyée pour pouvoir la rouvrir sans le classeur
+                dataset_id = run_if_changed(
+                    'ratios_stockage', digest,
+                    lambda: save_dataset(df, 'Sheet3', uploaded_file.name, digest)
+                )
+            elif consolidated_df is not None:
+                df, digest = consolidated_df, consolidated_digest
+                
+                # Conserver la table consolidée (colonne Source comprise)
+                dataset_id = run_if_changed(
+                    'ratios_stockage', digest,
+                    lambda: save_dataset(df, 'Sheet3', f"Consolidation de {df['Source'].nunique()} fichier(s)", digest)
+                )
+            else:
+                df, digest = load_dataset(stored_dataset_id)
+                dataset_id = stored_dataset_id
             
             # Afficher les informations sur la structure
             st.markdown('<div class="info-box">', unsafe_allow_html=True)
@@ -496,17 +468,19 @@ def main():
             st.markdown('</div>', unsafe_allow_html=True)
             
             # Créer des onglets pour différentes fonctionnalités
-            tab1, tab2, tab3 = st.tabs(["📋 Vue d'ensemble", "📈 Analyse Statistique", "🏆 Classements"])
+            tab1, tab2, tab3, tab4, tab5 = st.tabs([
+                "📋 Vue d'ensemble", "📈 Analyse Statistique", "🏆 Classements", "🔄 Simulation des salles", "🧩 Regroupement"
+            ])
             
             with tab1:
                 # Aperçu des données
                 with st.expander("🔍 Aperçu des données brutes", expanded=True):
-                    st.dataframe(df.head(20), use_container_width=True)
+                    paginated_dataframe(df, 'ratios_apercu', digest)
                     st.caption(f"Dimensions : {df.shape[0]} lignes × {df.shape[1]} colonnes")
                 
                 # Statistiques récapitulatives
                 with st.expander("📊 Statistiques descriptives", expanded=True):
-                    stats = create_summary_statistics(df)
+                    stats = run_if_changed('ratios_statistiques', digest, lambda: create_summary_statistics(df))
                     
                     # Afficher les métriques clés
                     st.subheader("📊 Métriques Clés")
@@ -548,12 +522,18 @@ def main():
                                 color_discrete_sequence=['#3B82F6']
                             )
                             fig1.update_layout(template="plotly_white", height=300)
-                            st.plotly_chart(fig1, use_container_width=True)
+                            with stage("Sérialisation du graphique"):
+                                st.plotly_chart(fig1, use_container_width=True)
                     
                     with col2:
                         # Diagramme en barres par région
                         if 'Région' in df.columns and 'Ratio moyen' in df.columns:
-                            region_avg = df.groupby('Région')['Ratio moyen'].mean().sort_values(ascending=False)
+                            # Agrégation exécutée par la base (colonne Région indexée)
+                            region_avg = (
+                                aggregate_dataset(dataset_id, 'Région', {'Ratio moyen': 'mean'})
+                                .set_index('Région')['Ratio moyen']
+                                .sort_values(ascending=False)
+                            )
                             fig2 = px.bar(
                                 x=region_avg.index,
                                 y=region_avg.values,
@@ -563,35 +543,51 @@ def main():
                             )
                             fig2.update_layout(template="plotly_white", height=300, 
                                              xaxis_title="Région", yaxis_title="Ratio moyen")
-                            st.plotly_chart(fig2, use_container_width=True)
+                            with stage("Sérialisation du graphique"):
+                                st.plotly_chart(fig2, use_container_width=True)
                 
                 # Téléchargement des données nettoyées
                 with st.expander("💾 Télécharger les données", expanded=False):
-                    csv_data = df.to_csv(index=False).encode('utf-8')
-                    st.download_button(
-                        label="📥 Télécharger les données nettoyées (CSV)",
-                        data=csv_data,
-                        file_name="donnees_ratios_salles_nettoyees.csv",
-                        mime="text/csv",
-                        use_container_width=True
+                    # Fichier construit à la demande, par blocs
+                    export_buttons(
+                        df,
+                        'ratios_export_nettoyees',
+                        (digest, 'Sheet3', 'nettoyees'),
+                        "donnees_ratios_salles_nettoyees"
                     )
+                
+                # Correspondance des écoles avec les autres feuilles du classeur
+                with st.expander("🔗 Correspondance entre feuilles", expanded=False):
+                    school_index_section(uploaded_file, 'ratios_correspondance')
+                
+                # Règles de cohérence et valeurs aberrantes
+                with st.expander("🚨 Contrôle de qualité des données", expanded=False):
+                    quality_section(df, 'Sheet3', 'ratios_qualite', digest)
             
             with tab2:
                 st.markdown("## 📈 Analyse Statistique Binaire")
                 st.markdown("Générez des graphiques pour analyser les relations entre différentes variables.")
                 
-                # Section de sélection des paramètres
-                with st.container():
+                # Variables disponibles pour l'analyse
+                available_variables = list(df.columns)
+                numeric_vars = df.select_dtypes(include=[np.number]).columns.tolist()
+                categorical_vars = df.select_dtypes(include=['object']).columns.tolist()
+                
+                # Le choix de la variable de filtre détermine les valeurs proposées dans le formulaire
+                filter_variable = st.selectbox(
+                    "Filtrer par (optionnel):",
+                    options=["Aucun filtre"] + categorical_vars,
+                    index=0,
+                    key="ratios_filtre"
+                )
+                
+                # Section de sélection des paramètres (aucun rerun avant validation)
+                with st.form("ratios_analyse"):
                     st.markdown("### ⚙️ Paramètres de l'analyse")
                     
                     col1, col2, col3 = st.columns(3)
                     
                     with col1:
-                        # Sélection des variables
-                        available_variables = list(df.columns)
-                        numeric_vars = df.select_dtypes(include=[np.number]).columns.tolist()
-                        categorical_vars = df.select_dtypes(include=['object']).columns.tolist()
-                        
                         x_variable = st.selectbox(
                             "Variable X:",
                             options=available_variables,
@@ -637,12 +633,7 @@ def main():
                                 color_variable = None
                         
                         with col2:
-                            filter_variable = st.selectbox(
-                                "Filtrer par (optionnel):",
-                                options=["Aucun filtre"] + categorical_vars,
-                                index=0
-                            )
-                            
+                            selected_filter = None
                             if filter_variable != "Aucun filtre" and filter_variable in df.columns:
                                 filter_values = df[filter_variable].unique()
                                 selected_filter = st.multiselect(
@@ -652,31 +643,42 @@ def main():
                                 )
                     
                     # Bouton pour générer le graphique
-                    generate_graph_button = st.button(
+                    generate_graph_button = st.form_submit_button(
                         "📊 Générer le graphique",
                         type="primary",
                         use_container_width=True
                     )
                 
-                # Section d'affichage des résultats
                 if generate_graph_button:
+                    submit_params('ratios_analyse', digest, (
+                        x_variable, y_variable, graph_type, color_variable, filter_variable, selected_filter
+                    ))
+                
+                # Section d'affichage des résultats (paramètres de la dernière validation)
+                params = submitted_params('ratios_analyse', digest)
+                if params is not None:
+                    x_variable, y_variable, graph_type, color_variable, filter_variable, selected_filter = params
+                    
+                    def compute_graph():
+                        # Appliquer les filtres
+                        filtered_df = df
+                        if selected_filter is not None:
+                            filtered_df = df[df[filter_variable].isin(selected_filter)]
+                        
+                        return create_binary_statistical_graphs(
+                            filtered_df, x_variable, y_variable, graph_type, color_variable
+                        )
+                    
                     with st.spinner("🔄 Génération du graphique en cours..."):
                         try:
-                            # Appliquer les filtres
-                            filtered_df = df.copy()
-                            
-                            if filter_variable != "Aucun filtre" and filter_variable in df.columns and 'selected_filter' in locals():
-                                filtered_df = filtered_df[filtered_df[filter_variable].isin(selected_filter)]
-                            
-                            # Créer le graphique
-                            fig, analysis_df = create_binary_statistical_graphs(
-                                filtered_df, x_variable, y_variable, graph_type, color_variable
-                            )
+                            # Créer le graphique (réutilisé si les paramètres n'ont pas changé)
+                            fig, analysis_df = run_if_changed('ratios_analyse', (digest,) + params, compute_graph)
                             
                             if fig:
                                 # Afficher le graphique
                                 st.markdown('<div class="graph-card">', unsafe_allow_html=True)
-                                st.plotly_chart(fig, use_container_width=True)
+                                with stage("Sérialisation du graphique"):
+                                    st.plotly_chart(fig, use_container_width=True)
                                 st.markdown('</div>', unsafe_allow_html=True)
                                 
                                 # Afficher les statistiques
@@ -730,22 +732,24 @@ def main():
                                     # Supprimer les doublons
                                     existing_cols = list(dict.fromkeys(existing_cols))
                                     
-                                    st.dataframe(
-                                        analysis_df[existing_cols].head(20),
-                                        use_container_width=True
+                                    paginated_dataframe(
+                                        analysis_df[existing_cols],
+                                        'ratios_donnees_analyse',
+                                        (digest,) + params
                                     )
                                     
                                     # Option pour télécharger les données d'analyse
-                                    csv_data = analysis_df.to_csv(index=False).encode('utf-8')
-                                    st.download_button(
-                                        label="📥 Télécharger les données d'analyse (CSV)",
-                                        data=csv_data,
-                                        file_name=f"donnees_analyse_{x_variable}_vs_{y_variable}.csv",
-                                        mime="text/csv",
-                                        use_container_width=True
+                                    # Fichier construit à la demande (seulement les lignes du filtre actif)
+                                    export_buttons(
+                                        analysis_df,
+                                        'ratios_export_analyse',
+                                        (digest,) + params,
+                                        f"donnees_analyse_{x_variable}_vs_{y_variable}"
                                     )
                         except Exception as e:
                                     st.error(f"❌ Erreur lors de la génération du graphique : {str(e)}")
+                    
+                    show_rerun_counter('ratios_analyse')
                                     
 
 
@@ -788,9 +792,13 @@ def main():
                         ranked_df = ranked_df[['Ecole', 'Région', 'Ratio moyen', 'Ratio maximum', 'Ratio minimum']]
                         ranked_df['Rang'] = range(1, len(ranked_df) + 1)
                         
-                        st.dataframe(
-                            ranked_df.head(10),
-                            use_container_width=True,
+                        paginated_dataframe(
+                            ranked_df,
+                            'ratios_classement_ratio',
+                            digest,
+                            sort_column='Rang',
+                            ascending=True,
+                            page_size=10,
                             column_config={
                                 "Rang": st.column_config.NumberColumn(format="%d"),
                                 "Ratio moyen": st.column_config.NumberColumn(format="%.1f"),
@@ -818,9 +826,13 @@ def main():
                         usage_ranked = usage_ranked[['Ecole', 'Région', 'Taux utilisation (%)', 'Salles utilisées', 'Total salles']]
                         usage_ranked['Rang'] = range(1, len(usage_ranked) + 1)
                         
-                        st.dataframe(
-                            usage_ranked.head(10),
-                            use_container_width=True,
+                        paginated_dataframe(
+                            usage_ranked,
+                            'ratios_classement_utilisation',
+                            digest,
+                            sort_column='Rang',
+                            ascending=True,
+                            page_size=10,
                             column_config={
                                 "Rang": st.column_config.NumberColumn(format="%d"),
                                 "Taux utilisation (%)": st.column_config.NumberColumn(format="%.1f%%"),
@@ -836,11 +848,11 @@ def main():
                         
                         with col1:
                             # Moyenne par région
-                            region_stats = df.groupby('Région').agg({
+                            region_stats = aggregate_dataset(dataset_id, 'Région', {
                                 'Ratio moyen': 'mean',
                                 'Taux utilisation (%)': 'mean',
                                 'Ecole': 'count'
-                            }).round(1)
+                            }).set_index('Région').round(1)
                             region_stats = region_stats.rename(columns={'Ecole': 'Nombre d\'écoles'})
                             
                             st.dataframe(region_stats, use_container_width=True)
@@ -857,6 +869,115 @@ def main():
                                 )
                                 fig.update_traces(fill='toself')
                                 st.plotly_chart(fig, use_container_width=True)
+            
+            with tab4:
+                st.markdown("## 🔄 Simulation de réaffectation des salles")
+                st.markdown(
+                    "Estimez combien d'élèves les salles non utilisées pourraient accueillir, d'abord dans "
+                    "leur propre école puis dans les écoles voisines de la même zone."
+                )
+                
+                # Surfaces des salles : feuille Sheet5 du classeur si elle existe
+                sheet5_df = None
+                if uploaded_file is not None:
+                    try:
+                        sheet5_df, _ = load_sheet(uploaded_file, 'Sheet5', clean_sheet5_data, SHEET_SCHEMAS['Sheet5'])
+                    except ValueError:
+                        sheet5_df = None
+                if sheet5_df is None:
+                    st.caption("ℹ️ Feuille Sheet5 indisponible : surfaces estimées à partir de la colonne « Taille salle ».")
+                
+                with st.form("ratios_simulation"):
+                    col1, col2 = st.columns(2)
+                    
+                    with col1:
+                        m2_per_pupil = st.number_input(
+                            "Surface par élève (m²):",
+                            min_value=0.5, max_value=5.0, value=DEFAULT_M2_PER_PUPIL, step=0.1
+                        )
+                    with col2:
+                        include_other_uses = st.checkbox(
+                            "Inclure les salles affectées à d'autres usages",
+                            value=False
+                        )
+                    
+                    simulate_button = st.form_submit_button(
+                        "🔄 Lancer la simulation",
+                        type="primary",
+                        use_container_width=True
+                    )
+                
+                if simulate_button:
+                    submit_params('ratios_simulation', digest, (round(float(m2_per_pupil), 2), include_other_uses))
+                
+                params = submitted_params('ratios_simulation', digest)
+                if params is not None:
+                    m2_per_pupil, include_other_uses = params
+                    
+                    capacities, transfers, summary = run_if_changed(
+                        'ratios_simulation',
+                        (digest, sheet5_df is not None) + params,
+                        lambda: simulate_reassignment(df, sheet5_df, m2_per_pupil, include_other_uses)
+                    )
+                    
+                    col1, col2, col3, col4 = st.columns(4)
+                    with col1:
+                        st.metric("Élèves en excédent", f"{summary['Excédent'].sum():,.0f}")
+                    with col2:
+                        st.metric("Absorbés sur place", f"{summary['Absorbés sur place'].sum():,.0f}")
+                    with col3:
+                        st.metric("Transférés dans la zone", f"{summary['Transférés'].sum():,.0f}")
+                    with col4:
+                        st.metric("Excédent non résorbé", f"{summary['Excédent non résorbé'].sum():,.0f}")
+                    
+                    # Bilan par région
+                    fig = px.bar(
+                        summary.melt(
+                            id_vars='Région',
+                            value_vars=['Absorbés sur place', 'Transférés', 'Excédent non résorbé'],
+                            var_name='Situation', value_name='Élèves'
+                        ),
+                        x='Région', y='Élèves', color='Situation',
+                        title="Devenir de l'excédent d'élèves par région"
+                    )
+                    fig.update_layout(template="plotly_white", height=400)
+                    st.plotly_chart(fig, use_container_width=True)
+                    
+                    st.dataframe(summary, use_container_width=True, hide_index=True)
+                    
+                    with st.expander(f"🔀 Transferts proposés ({len(transfers)})", expanded=False):
+                        paginated_dataframe(
+                            transfers,
+                            'ratios_simulation_transferts',
+                            (digest,) + params,
+                            sort_column='Élèves transférés'
+                        )
+                        export_buttons(
+                            transfers,
+                            'ratios_export_transferts',
+                            (digest,) + params,
+                            "transferts_salles"
+                        )
+                    
+                    with st.expander("🏫 Capacités par école", expanded=False):
+                        paginated_dataframe(
+                            capacities,
+                            'ratios_simulation_capacites',
+                            (digest,) + params,
+                            sort_column='Excédent restant'
+                        )
+                    
+                    show_rerun_counter('ratios_simulation')
+            
+            with tab5:
+                st.markdown("## 🧩 Regroupement des écoles")
+                st.markdown("Groupes d'écoles aux profils semblables (k-means sur variables centrées-réduites).")
+                clustering_section(
+                    df,
+                    'ratios_regroupement',
+                    digest,
+                    ['Total salles', 'Ratio moyen', 'Taux utilisation (%)', 'Écart ratio']
+                )
         
         except Exception as e:
             st.error(f"❌ Erreur lors de la lecture du fichier : {str(e)}")
@@ -0,0 +1,213 @@
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+import streamlit as st
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from modules.stockage import content_hash
+from modules.metriques import count_cache, set_gauge
+
+# Mémoire visée pour les jeux non référencés conservés par le processus (modifiable via
+# ANALYSE_SCOLAIRE_REGISTRE_MO) ; les jeux utilisés par une session ne sont jamais évincés
+BUDGET_MB = float(os.environ.get('ANALYSE_SCOLAIRE_REGISTRE_MO', 1024))
+
+# Clé de session des références détenues (emplacement -> empreinte du contenu)
+_SESSION_KEY = '_registre'
+
+# Copie à l'écriture : une écriture en place (.loc[...] = ..., fillna(inplace=True)...) sur la
+# vue d'une session copie d'abord les colonnes touchées, les données partagées restent intactes
+pd.set_option('mode.copy_on_write', True)
+
+
+@st.cache_resource(show_spinner=False)
+def _registry():
+    """Registre unique du processus, partagé par toutes les sessions"""
+    return {
+        'lock': threading.RLock(),
+        'datasets': {},  # empreinte du contenu -> jeu de données et références
+        'aliases': {}    # clé de chargement -> empreinte du contenu
+    }
+
+def _session_id():
+    """Identifiant de la session courante ('local' hors exécution Streamlit)"""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else 'local'
+
+def _root(values):
+    """Tableau qui porte les données d'une vue (les vues d'une même colonne ont la même racine)"""
+    while isinstance(values.base, np.ndarray):
+        values = values.base
+    return values
+
+def _is_mapped(values):
+    """Vrai si le tableau est une vue d'un fichier projeté en mémoire (voir modules.colonnes)"""
+    return isinstance(_root(values), np.memmap)
+
+def _numpy_column(column):
+    return isinstance(column.dtype, np.dtype) and column.dtype != object
+
+def _column_roots(df):
+    """Racines des colonnes de type NumPy d'une table"""
+    return {
+        id(_root(df.iloc[:, position].to_numpy())) for position in range(df.shape[1])
+        if isinstance(df.iloc[:, position].dtype, np.dtype)
+    }
+
+def _dataset_bytes(df):
+    """Mémoire propre au processus et mémoire projetée depuis le stockage par colonnes
+
+    Les colonnes projetées occupent des pages de fichier partagées par toutes les sessions et
+    tous les processus : elles ne comptent pas dans le budget du registre.
+    """
+    own, mapped = int(df.index.memory_usage(deep=True)), 0
+    for position in range(df.shape[1]):
+        column = df.iloc[:, position]
+        size = int(column.memory_usage(deep=True, index=False))
+        if _numpy_column(column) and _is_mapped(column.to_numpy()):
+            mapped += size
+        else:
+            own += size
+
+    return own, mapped
+
+def _release(registry, session_id, slot, content):
+    """Retire la référence d'une session à un jeu de données"""
+    entry = registry['datasets'].get(content)
+    if entry is not None:
+        entry['sessions'].discard((session_id, slot))
+
+def _prune(registry):
+    """Oublie les références des sessions fermées, puis évince les jeux non référencés
+    les moins récemment utilisés tant que la mémoire dépasse le budget"""
+    if Runtime.exists():
+        runtime = Runtime.instance()
+        for entry in registry['datasets'].values():
+            entry['sessions'] = {
+                (session_id, slot) for session_id, slot in entry['sessions']
+                if session_id == 'local' or runtime.is_active_session(session_id)
+            }
+
+    datasets = registry['datasets']
+    total = sum(entry['bytes'] for entry in datasets.values())
+    idle = sorted((entry['last_used'], content) for content, entry in datasets.items() if not entry['sessions'])
+
+    for _, content in idle:
+        if total <= BUDGET_MB * 2 ** 20:
+            break
+        total -= datasets.pop(content)['bytes']
+        registry['aliases'] = {key: value for key, value in registry['aliases'].items() if value != content}
+
+    set_gauge('analyse_scolaire_registre_octets', total)
+    set_gauge('analyse_scolaire_registre_projete_octets', sum(entry['mapped_bytes'] for entry in datasets.values()))
+    set_gauge('analyse_scolaire_registre_jeux', len(datasets))
+
+def _acquire(registry, content, slot):
+    """Référence le jeu pour la session (à appeler sous le verrou) et retourne sa vue"""
+    session_id = _session_id()
+    references = st.session_state.setdefault(_SESSION_KEY, {})
+
+    previous = references.get(slot)
+    if previous is not None and previous != content:
+        _release(registry, session_id, slot, previous)
+
+    entry = registry['datasets'][content]
+    entry['sessions'].add((session_id, slot))
+    entry['last_used'] = time.monotonic()
+    references[slot] = content
+
+    _prune(registry)
+    return entry['df'].copy(deep=False)
+
+def shared_dataset(load_key, build, slot, label):
+    """Jeu de données partagé par toutes les sessions du processus
+
+    `load_key` identifie le chargement (empreinte du fichier, feuille, nettoyage...) ; `build()`
+    n'est appelé que s'il est inconnu. Deux chargements au contenu identique (même empreinte
+    de contenu) partagent une seule copie. La session garde une référence par `slot` :
+    charger un autre jeu au même emplacement libère le précédent.
+    Retourne une vue propre à la session (copie superficielle) : avec la copie à l'écriture,
+    les colonnes ajoutées, remplacées, retirées ou modifiées en place ne concernent qu'elle.
+    """
+    registry = _registry()
+
+    with registry['lock']:
+        content = registry['aliases'].get(load_key)
+        count_cache('registre', content in registry['datasets'])
+        if content in registry['datasets']:
+            return _acquire(registry, content, slot)
+
+    # Lecture hors du verrou : les autres sessions ne sont pas bloquées
+    df = build()
+    content = content_hash(df)
+
+    with registry['lock']:
+        if content not in registry['datasets']:
+            own, mapped = _dataset_bytes(df)
+            registry['datasets'][content] = {
+                'df': df,
+                'bytes': own,
+                'mapped_bytes': mapped,
+                'roots': _column_roots(df),
+                'label': label,
+                'sessions': set(),
+                'last_used': time.monotonic()
+            }
+        registry['aliases'][load_key] = content
+
+        return _acquire(registry, content, slot)
+
+def is_shared(values):
+    """Vrai si le tableau est une vue d'un jeu du registre ou d'un fichier projeté en mémoire"""
+    if _is_mapped(values):
+        return True
+
+    registry = _registry()
+    root = id(_root(values))
+    with registry['lock']:
+        return any(root in entry['roots'] for entry in registry['datasets'].values())
+
+def session_bytes(obj):
+    """Mémoire d'une table (ou d'une série) propre à la session
+
+    Les colonnes partagées (vues d'un jeu du registre ou colonnes projetées) ne sont pas
+    comptées : elles restent en mémoire pour toutes les sessions, que la session conserve
+    ou non le résultat.
+    """
+    df = obj.to_frame() if isinstance(obj, pd.Series) else obj
+    total = int(df.index.memory_usage(deep=True))
+    for position in range(df.shape[1]):
+        column = df.iloc[:, position]
+        if not (isinstance(column.dtype, np.dtype) and is_shared(column.to_numpy())):
+            total += int(column.memory_usage(deep=True, index=False))
+
+    return total
+
+def registry_usage():
+    """Jeux conservés par le processus : lignes, mémoire et sessions qui les utilisent"""
+    registry = _registry()
+
+    with registry['lock']:
+        rows = [
+            {
+                'Jeu': entry['label'],
+                'Lignes': len(entry['df']),
+                'Mémoire (Mo)': round(entry['bytes'] / 2 ** 20, 1),
+                'Projetée (Mo)': round(entry['mapped_bytes'] / 2 ** 20, 1),
+                'Sessions': len({session_id for session_id, _ in entry['sessions']})
+            }
+            for entry in registry['datasets'].values()
+        ]
+
+    return pd.DataFrame(rows, columns=['Jeu', 'Lignes', 'Mémoire (Mo)', 'Projetée (Mo)', 'Sessions'])
+
+def registry_sidebar():
+    """Résumé de la mémoire partagée dans la barre latérale"""
+    usage = registry_usage()
+    if usage.empty:
+        return
+
+    with st.sidebar.expander(f"🗄️ Données partagées : {usage['Mémoire (Mo)'].sum():.1f} Mo", expanded=False):
+        st.dataframe(usage, use_container_width=True, hide_index=True)
+        st.caption(f"Budget des jeux non utilisés : {BUDGET_MB:.0f} Mo (colonnes projetées depuis le disque non comprises)")
@@ -0,0 +1,209 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+import plotly.express as px
+import plotly.graph_objects as go
+from modules.formulaires import submit_params, submitted_params
+from modules.pagination import paginated_dataframe
+from modules.exportation import export_buttons
+
+# Au-delà de ce nombre d'écoles, k-means travaille par mini-lots
+MINI_BATCH_THRESHOLD = 10_000
+BATCH_SIZE = 2_048
+MAX_ITER = 100
+
+
+def standardize(values):
+    """Centre-réduit chaque colonne ; les valeurs manquantes prennent la médiane de la colonne
+
+    Une colonne sans aucune valeur vaut 0 partout : elle ne pèse pas dans les distances.
+    """
+    values = np.array(values, dtype=float)
+    empty = np.isnan(values).all(axis=0)
+    medians = np.zeros(values.shape[1])
+    medians[~empty] = np.nanmedian(values[:, ~empty], axis=0)
+    values = np.where(np.isnan(values), medians, values)
+
+    means = values.mean(axis=0)
+    stds = values.std(axis=0)
+    stds[stds == 0] = 1
+
+    return (values - means) / stds
+
+def _squared_distances(points, centers):
+    """Distances euclidiennes au carré (points × centres) sans boucle"""
+    distances = (
+        (points ** 2).sum(axis=1)[:, None]
+        - 2 * points @ centers.T
+        + (centers ** 2).sum(axis=1)[None, :]
+    )
+    return np.maximum(distances, 0)
+
+def kmeans_plus_plus(points, k, rng):
+    """Initialisation k-means++ gloutonne : centres éloignés les uns des autres
+
+    À chaque étape, plusieurs candidats sont tirés et celui qui réduit le plus l'inertie est gardé.
+    """
+    n_trials = 2 + int(np.log(k))
+    centers = [points[rng.integers(len(points))]]
+    closest = _squared_distances(points, np.array(centers))[:, 0]
+
+    for _ in range(1, k):
+        total = closest.sum()
+        if not np.isfinite(total) or total == 0:
+            candidates = rng.integers(len(points), size=n_trials)
+        else:
+            candidates = rng.choice(len(points), size=n_trials, p=closest / total)
+
+        # Inertie obtenue avec chaque candidat (un candidat par colonne)
+        candidate_closest = np.minimum(closest[:, None], _squared_distances(points, points[candidates]))
+        best = candidate_closest.sum(axis=0).argmin()
+
+        centers.append(points[candidates[best]])
+        closest = candidate_closest[:, best]
+
+    return np.array(centers)
+
+def kmeans(points, k, seed=0):
+    """K-means vectorisé ; par mini-lots au-delà de MINI_BATCH_THRESHOLD points
+
+    Retourne les étiquettes et les centres.
+    """
+    rng = np.random.default_rng(seed)
+    k = min(k, len(points))
+    centers = kmeans_plus_plus(points, k, rng)
+
+    if len(points) <= MINI_BATCH_THRESHOLD:
+        labels = None
+        for _ in range(MAX_ITER):
+            new_labels = _squared_distances(points, centers).argmin(axis=1)
+            if labels is not None and (new_labels == labels).all():
+                break
+            labels = new_labels
+
+            # Nouveaux centres : moyennes par groupe (un centre vide reste en place)
+            counts = np.bincount(labels, minlength=k)
+            sums = np.zeros_like(centers)
+            np.add.at(sums, labels, points)
+            centers = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centers)
+    else:
+        counts = np.zeros(k)
+        for _ in range(MAX_ITER):
+            batch = points[rng.integers(len(points), size=BATCH_SIZE)]
+            batch_labels = _squared_distances(batch, centers).argmin(axis=1)
+
+            # Taux d'apprentissage décroissant par centre (Sculley, 2010)
+            batch_counts = np.bincount(batch_labels, minlength=k)
+            batch_sums = np.zeros_like(centers)
+            np.add.at(batch_sums, batch_labels, batch)
+            counts += batch_counts
+            moved = batch_counts > 0
+            centers[moved] += (
+                batch_sums[moved] - batch_counts[moved, None] * centers[moved]
+            ) / counts[moved, None]
+
+        labels = _squared_distances(points, centers).argmin(axis=1)
+
+    return labels, centers
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def cached_clusters(data_key, features, k, _df):
+    """Groupes d'écoles mis en cache par données, variables et nombre de groupes"""
+    points = standardize(_df[list(features)].apply(pd.to_numeric, errors='coerce').to_numpy())
+    labels, centers = kmeans(points, k)
+
+    profiles = pd.DataFrame(centers, columns=list(features))
+    profiles.insert(0, 'Groupe', [f"Groupe {i + 1}" for i in range(len(centers))])
+    profiles.insert(1, 'Écoles', np.bincount(labels, minlength=len(centers)))
+
+    return labels, profiles
+
+def create_cluster_radar(profiles, features):
+    """Radar des profils de groupes (écarts à la moyenne en écarts-types)"""
+    fig = go.Figure()
+
+    for _, profile in profiles.iterrows():
+        fig.add_trace(go.Scatterpolar(
+            r=list(profile[features]) + [profile[features[0]]],
+            theta=list(features) + [features[0]],
+            fill='toself',
+            name=f"{profile['Groupe']} ({profile['Écoles']} écoles)"
+        ))
+
+    fig.update_layout(
+        polar=dict(radialaxis=dict(visible=True)),
+        title="Profils des groupes (Radar, variables centrées-réduites)",
+        template="plotly_white",
+        height=500
+    )
+    return fig
+
+def clustering_section(df, key, digest, default_features):
+    """Onglet de regroupement : paramètres validés par formulaire, résultats mis en cache"""
+    # Colonnes sans aucune valeur (densités sans correspondance Sheet5, par exemple) écartées
+    numeric_vars = [col for col in df.select_dtypes(include=[np.number]).columns if df[col].notna().any()]
+
+    with st.form(key):
+        col1, col2 = st.columns([3, 1])
+
+        with col1:
+            features = st.multiselect(
+                "Variables de regroupement:",
+                options=numeric_vars,
+                default=[col for col in default_features if col in numeric_vars]
+            )
+        with col2:
+            k = st.slider("Nombre de groupes:", min_value=2, max_value=8, value=4)
+
+        cluster_button = st.form_submit_button(
+            "🧩 Regrouper les écoles",
+            type="primary",
+            use_container_width=True
+        )
+
+    if cluster_button:
+        if len(features) < 2:
+            st.warning("⚠️ Choisissez au moins deux variables.")
+        else:
+            submit_params(key, digest, (tuple(features), int(k)))
+
+    params = submitted_params(key, digest)
+    if params is None:
+        return
+
+    features, k = params
+    with st.spinner("🔄 Regroupement en cours..."):
+        labels, profiles = cached_clusters(digest, features, k, df)
+
+    # Changer de vue ne relance pas le calcul
+    view = st.radio(
+        "Vue:",
+        options=["Radar des profils", "Nuage de points", "Tableau des profils"],
+        horizontal=True,
+        key=f"{key}_vue"
+    )
+
+    clustered_df = df.assign(Groupe=[f"Groupe {label + 1}" for label in labels])
+
+    if view == "Radar des profils":
+        st.plotly_chart(create_cluster_radar(profiles, list(features)), use_container_width=True)
+    elif view == "Nuage de points":
+        col1, col2 = st.columns(2)
+        with col1:
+            x_variable = st.selectbox("Axe X:", options=list(features), index=0, key=f"{key}_x")
+        with col2:
+            y_variable = st.selectbox("Axe Y:", options=list(features), index=1, key=f"{key}_y")
+        fig = px.scatter(
+            clustered_df, x=x_variable, y=y_variable, color='Groupe',
+            hover_data=['Ecole'] if 'Ecole' in clustered_df.columns else None,
+            title=f"{x_variable} vs {y_variable} par groupe"
+        )
+        fig.update_layout(template="plotly_white", height=500)
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.dataframe(profiles.round(2), use_container_width=True, hide_index=True)
+
+    with st.expander("🔍 Écoles par groupe", expanded=False):
+        display_cols = [col for col in ['Région', 'Ecole'] if col in clustered_df.columns] + ['Groupe'] + list(features)
+        paginated_dataframe(clustered_df[display_cols], f"{key}_ecoles", (digest,) + params, sort_column='Groupe', ascending=True)
+        export_buttons(clustered_df[display_cols], f"{key}_export", (digest,) + params, "regroupement_ecoles")
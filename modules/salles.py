@@ -7,6 +7,17 @@ from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+from modules.lecture import UPLOAD_TYPES, load_sheet
+from modules.validation import route_sheet
+from modules.nettoyage import SHEET_SCHEMAS, clean_sheet5_data
+from modules.formulaires import submit_params, submitted_params, run_if_changed, show_rerun_counter
+from modules.pagination import paginated_dataframe
+from modules.exportation import export_buttons
+from modules.correspondance import school_index_section
+from modules.consolidation import consolidation_uploader
+from modules.anomalies import quality_section
+from modules.stockage import save_dataset, load_dataset, stored_dataset_picker
+from modules.mesures import stage, measured
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -103,60 +114,7 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-def clean_sheet5_data(df):
-    """Nettoie et prépare les données de la feuille Sheet5"""
-    
-    # Vérifier si nous avons les bonnes colonnes
-    required_columns = ['Moughataa', 'Ecole']
-    
-    # Renommer les colonnes pour uniformité
-    rename_dict = {}
-    for col in df.columns:
-        if 'Moughataa' in str(col):
-            rename_dict[col] = 'Moughataa'
-        elif 'Ecole' in str(col) or 'Ecole' in str(col):
-            rename_dict[col] = 'Ecole'
-        elif 'Etat général de la salle' in str(col):
-            rename_dict[col] = 'Etat général'
-        elif 'Longueur de la salle' in str(col):
-            rename_dict[col] = 'Longueur (m)'
-        elif 'Largeur de la salle' in str(col):
-            rename_dict[col] = 'Largeur (m)'
-        elif 'La superficie de la salle' in str(col):
-            rename_dict[col] = 'Superficie (m²)'
-        elif 'Etat de la porte de la salle est-elle' in str(col):
-            rename_dict[col] = 'Etat de la porte'
-        elif 'La fenêtre est-elle' in str(col):
-            rename_dict[col] = 'Etat des fenêtres'
-        elif 'Type d\'aération' in str(col):
-            rename_dict[col] = 'Type d\'aération'
-        elif 'Fenêtres' in str(col) and df[col].dtype in [np.int64, np.float64]:
-            rename_dict[col] = 'Nombre de fenêtres'
-        elif 'Nombre de prises de la salle' in str(col):
-            rename_dict[col] = 'Nombre de prises'
-        elif 'Espace de projection prévu' in str(col):
-            rename_dict[col] = 'Espace projection'
-        elif 'La salle nécessite-t-elle une réhabilitation' in str(col):
-            rename_dict[col] = 'Réhabilitation nécessaire'
-        elif 'Besoins en mobilier' in str(col):
-            rename_dict[col] = 'Besoins mobilier'
-    
-    df = df.rename(columns=rename_dict)
-    
-    # Nettoyer les données numériques
-    numeric_columns = ['Longueur (m)', 'Largeur (m)', 'Superficie (m²)', 
-                      'Nombre de fenêtres', 'Nombre de prises']
-    
-    for col in numeric_columns:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-    
-    # Calculer la superficie si nécessaire
-    if 'Superficie (m²)' not in df.columns and 'Longueur (m)' in df.columns and 'Largeur (m)' in df.columns:
-        df['Superficie (m²)'] = df['Longueur (m)'] * df['Largeur (m)']
-    
-    return df
-
+@measured("Statistiques récapitulatives")
 def create_summary_statistics(df):
     """Crée des statistiques récapitulatives"""
     
@@ -192,11 +150,12 @@ def create_summary_statistics(df):
     
     return pd.Series(stats)
 
+@measured("Construction du graphique")
 def create_binary_statistical_graphs(df, x_variable, y_variable, graph_type, color_variable=None):
     """Crée des graphiques statistiques binaires"""
     
-    # Préparer les données
-    analysis_df = df.copy()
+    # Données lues sans copie : le résultat mémorisé ne duplique pas la table filtrée
+    analysis_df = df
     
     # Vérifier que les variables existent
     if x_variable not in analysis_df.columns:
@@ -375,20 +334,52 @@ def create_binary_statistical_graphs(df, x_variable, y_variable, graph_type, col
 def main():
     # Section de téléversement
     st.markdown('<div class="upload-section">', unsafe_allow_html=True)
-    uploaded_file = st.file_uploader(
-        "📤 Téléversez votre fichier Excel (FIFA project.xlsx)",
-        type=['xlsx', 'xls'],
-        help="Le fichier doit contenir une feuille 'Sheet5' avec les données des salles de classe"
+    consolidation = st.checkbox(
+        "📚 Consolider plusieurs fichiers (un par région)", key="salles_consolidation"
     )
+    uploaded_file, consolidated_df, consolidated_digest = None, None, None
+    if consolidation:
+        consolidated_df, consolidated_digest = consolidation_uploader(
+            'Sheet5', 'salles_consolidation', cleaner=clean_sheet5_data, schema=SHEET_SCHEMAS['Sheet5']
+        )
+    else:
+        uploaded_file = st.file_uploader(
+            "📤 Téléversez votre fichier (FIFA project.xlsx, ou export CSV, Parquet, JSON Lines)",
+            type=UPLOAD_TYPES,
+            help="Le fichier doit contenir une feuille 'Sheet5' avec les données des salles de classe (ou en être un export CSV, Parquet, JSON Lines)"
+        )
+    stored_dataset_id = None
+    if uploaded_file is None and not consolidation:
+        stored_dataset_id = stored_dataset_picker('Sheet5', key="salles_jeu_enregistre")
     st.markdown('</div>', unsafe_allow_html=True)
     
-    if uploaded_file is not None:
+    if uploaded_file is not None or consolidated_df is not None or stored_dataset_id is not None:
         try:
-            # Lire uniquement la feuille Sheet5
-            df = pd.read_excel(uploaded_file, sheet_name='Sheet5', engine='openpyxl')
-            
-            # Nettoyer les données
-            df = clean_sheet5_data(df)
+            if uploaded_file is not None:
+                # Vérifier la structure sur les seuls en-têtes avant toute lecture complète
+                sheet_name = route_sheet(uploaded_file, 'Sheet5')
+                if sheet_name is None:
+                    return
+                
+                # Lire et nettoyer les seules colonnes utiles de Sheet5 (mis en cache tant que le fichier ne change pas)
+                df, digest = load_sheet(uploaded_file, sheet_name, clean_sheet5_data, SHEET_SCHEMAS['Sheet5'])
+                
+                # Conserver la feuille nettoyée pour pouvoir la rouvrir sans le classeur
+                dataset_id = run_if_changed(
+                    'salles_stockage', digest,
+                    lambda: save_dataset(df, 'Sheet5', uploaded_file.name, digest)
+                )
+            elif consolidated_df is not None:
+                df, digest = consolidated_df, consolidated_digest
+                
+                # Conserver la table consolidée (colonne Source comprise)
+                dataset_id = run_if_changed(
+                    'salles_stockage', digest,
+                    lambda: save_dataset(df, 'Sheet5', f"Consolidation de {df['Source'].nunique()} fichier(s)", digest)
+                )
+            else:
+                df, digest = load_dataset(stored_dataset_id)
+                dataset_id = stored_dataset_id
             
             # Afficher les informations sur la structure
             st.markdown('<div class="info-box">', unsafe_allow_html=True)
@@ -441,12 +432,12 @@ def main():
             with tab1:
                 # Aperçu des données
                 with st.expander("🔍 Aperçu des données brutes", expanded=True):
-                    st.dataframe(df.head(20), use_container_width=True)
+                    paginated_dataframe(df, 'salles_apercu', digest)
                     st.caption(f"Dimensions : {df.shape[0]} lignes × {df.shape[1]} colonnes")
                 
                 # Statistiques récapitulatives
                 with st.expander("📊 Statistiques descriptives", expanded=True):
-                    stats = create_summary_statistics(df)
+                    stats = run_if_changed('salles_statistiques', digest, lambda: create_summary_statistics(df))
                     
                     # Afficher les statistiques principales
                     col1, col2, col3, col4 = st.columns(4)
@@ -488,35 +479,51 @@ def main():
                                 labels={'x': selected_cat, 'y': 'Nombre de salles'}
                             )
                             fig.update_layout(template="plotly_white")
-                            st.plotly_chart(fig, use_container_width=True)
+                            with stage("Sérialisation du graphique"):
+                                st.plotly_chart(fig, use_container_width=True)
                     
                 # Téléchargement des données nettoyées
                 with st.expander("💾 Télécharger les données", expanded=False):
-                    csv_data = df.to_csv(index=False).encode('utf-8')
-                    st.download_button(
-                        label="📥 Télécharger les données nettoyées (CSV)",
-                        data=csv_data,
-                        file_name="donnees_salles_classe_nettoyees.csv",
-                        mime="text/csv",
-                        use_container_width=True
+                    # Fichier construit à la demande, par blocs
+                    export_buttons(
+                        df,
+                        'salles_export_nettoyees',
+                        (digest, 'Sheet5', 'nettoyees'),
+                        "donnees_salles_classe_nettoyees"
                     )
+                
+                # Correspondance des écoles avec les autres feuilles du classeur
+                with st.expander("🔗 Correspondance entre feuilles", expanded=False):
+                    school_index_section(uploaded_file, 'salles_correspondance')
+                
+                # Règles de cohérence et valeurs aberrantes
+                with st.expander("🚨 Contrôle de qualité des données", expanded=False):
+                    quality_section(df, 'Sheet5', 'salles_qualite', digest)
             
             with tab2:
                 st.markdown("## 📈 Analyse Statistique Binaire")
                 st.markdown("Générez des graphiques pour analyser les relations entre différentes variables.")
                 
-                # Section de sélection des paramètres
-                with st.container():
+                # Variables disponibles pour l'analyse
+                available_variables = list(df.columns)
+                numeric_vars = df.select_dtypes(include=[np.number]).columns.tolist()
+                categorical_vars = df.select_dtypes(include=['object']).columns.tolist()
+                
+                # Le choix de la variable de filtre détermine les valeurs proposées dans le formulaire
+                filter_variable = st.selectbox(
+                    "Filtrer par (optionnel):",
+                    options=["Aucun filtre"] + categorical_vars,
+                    index=0,
+                    key="salles_filtre"
+                )
+                
+                # Section de sélection des paramètres (aucun rerun avant validation)
+                with st.form("salles_analyse"):
                     st.markdown("### ⚙️ Paramètres de l'analyse")
                     
                     col1, col2, col3 = st.columns(3)
                     
                     with col1:
-                        # Sélection des variables
-                        available_variables = list(df.columns)
-                        numeric_vars = df.select_dtypes(include=[np.number]).columns.tolist()
-                        categorical_vars = df.select_dtypes(include=['object']).columns.tolist()
-                        
                         x_variable = st.selectbox(
                             "Variable X:",
                             options=available_variables,
@@ -560,12 +567,7 @@ def main():
                                 color_variable = None
                         
                         with col2:
-                            filter_variable = st.selectbox(
-                                "Filtrer par (optionnel):",
-                                options=["Aucun filtre"] + categorical_vars,
-                                index=0
-                            )
-                            
+                            selected_filter = None
                             if filter_variable != "Aucun filtre" and filter_variable in df.columns:
                                 filter_values = df[filter_variable].unique()
                                 selected_filter = st.multiselect(
@@ -575,31 +577,42 @@ def main():
                                 )
                     
                     # Bouton pour générer le graphique
-                    generate_graph_button = st.button(
+                    generate_graph_button = st.form_submit_button(
                         "📊 Générer le graphique",
                         type="primary",
                         use_container_width=True
                     )
                 
-                # Section d'affichage des résultats
                 if generate_graph_button:
+                    submit_params('salles_analyse', digest, (
+                        x_variable, y_variable, graph_type, color_variable, filter_variable, selected_filter
+                    ))
+                
+                # Section d'affichage des résultats (paramètres de la dernière validation)
+                params = submitted_params('salles_analyse', digest)
+                if params is not None:
+                    x_variable, y_variable, graph_type, color_variable, filter_variable, selected_filter = params
+                    
+                    def compute_graph():
+                        # Appliquer les filtres
+                        filtered_df = df
+                        if selected_filter is not None:
+                            filtered_df = df[df[filter_variable].isin(selected_filter)]
+                        
+                        return create_binary_statistical_graphs(
+                            filtered_df, x_variable, y_variable, graph_type, color_variable
+                        )
+                    
                     with st.spinner("🔄 Génération du graphique en cours..."):
                         try:
-                            # Appliquer les filtres
-                            filtered_df = df.copy()
-                            
-                            if filter_variable != "Aucun filtre" and filter_variable in df.columns and 'selected_filter' in locals():
-                                filtered_df = filtered_df[filtered_df[filter_variable].isin(selected_filter)]
-                            
-                            # Créer le graphique
-                            fig, analysis_df = create_binary_statistical_graphs(
-                                filtered_df, x_variable, y_variable, graph_type, color_variable
-                            )
+                            # Créer le graphique (réutilisé si les paramètres n'ont pas changé)
+                            fig, analysis_df = run_if_changed('salles_analyse', (digest,) + params, compute_graph)
                             
                             if fig:
                                 # Afficher le graphique
                                 st.markdown('<div class="graph-card">', unsafe_allow_html=True)
-                                st.plotly_chart(fig, use_container_width=True)
+                                with stage("Sérialisation du graphique"):
+                                    st.plotly_chart(fig, use_container_width=True)
                                 st.markdown('</div>', unsafe_allow_html=True)
                                 
                                 # Afficher les statistiques
@@ -635,25 +648,31 @@ def main():
                                 
                                 # Afficher un aperçu des données d'analyse
                                 with st.expander("🔍 Voir les données d'analyse", expanded=False):
-                                    st.dataframe(
-                                        analysis_df[[x_variable, y_variable] + 
-                                                   ([color_variable] if color_variable else []) +
-                                                   ['Ecole', 'Moughataa']].head(20),
-                                        use_container_width=True
+                                    display_cols = list(dict.fromkeys(
+                                        [x_variable, y_variable] +
+                                        ([color_variable] if color_variable else []) +
+                                        ['Ecole', 'Moughataa']
+                                    ))
+                                    
+                                    paginated_dataframe(
+                                        analysis_df[display_cols],
+                                        'salles_donnees_analyse',
+                                        (digest,) + params
                                     )
                                     
                                     # Option pour télécharger les données d'analyse
-                                    csv_data = analysis_df.to_csv(index=False).encode('utf-8')
-                                    st.download_button(
-                                        label="📥 Télécharger les données d'analyse (CSV)",
-                                        data=csv_data,
-                                        file_name=f"donnees_analyse_{x_variable}_vs_{y_variable}.csv",
-                                        mime="text/csv",
-                                        use_container_width=True
+                                    # Fichier construit à la demande (seulement les lignes du filtre actif)
+                                    export_buttons(
+                                        analysis_df,
+                                        'salles_export_analyse',
+                                        (digest,) + params,
+                                        f"donnees_analyse_{x_variable}_vs_{y_variable}"
                                     )
                             
                         except Exception as e:
                             st.error(f"❌ Erreur lors de la génération du graphique : {str(e)}")
+                    
+                    show_rerun_counter('salles_analyse')
                 
                 # Section d'exemples d'analyses
                 with st.expander("💡 Exemples d'analyses possibles", expanded=True):
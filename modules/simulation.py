@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+from modules.nettoyage import normalize_school_names, rollup_sheet5_by_school
+
+# Surface par élève proposée par défaut (m²)
+DEFAULT_M2_PER_PUPIL = 1.5
+
+
+def parse_room_size(sizes):
+    """Surface (m²) à partir des dimensions « longueur*largeur » de la feuille Sheet3"""
+    dimensions = pd.Series(sizes, dtype='object').astype(str).str.extract(
+        r'(\d+(?:[.,]\d+)?)\s*[*xX×]\s*(\d+(?:[.,]\d+)?)'
+    )
+    dimensions = dimensions.apply(lambda col: pd.to_numeric(col.str.replace(',', '.'), errors='coerce'))
+    return (dimensions[0] * dimensions[1]).to_numpy()
+
+def school_capacities(sheet3_df, sheet5_df=None, m2_per_pupil=DEFAULT_M2_PER_PUPIL, include_other_uses=False):
+    """Capacité d'accueil libre et excédent d'élèves de chaque école (calcul vectorisé)
+
+    La surface d'une salle vient de Sheet5 (moyenne des salles décrites) lorsqu'elle est connue,
+    sinon de la colonne « Taille salle » de Sheet3. Chaque école absorbe d'abord son propre
+    excédent dans ses salles libres.
+    """
+    result = sheet3_df[['Région', 'Ecole']].copy()
+    keys = normalize_school_names(sheet3_df['Ecole'])
+
+    room_area = parse_room_size(sheet3_df['Taille salle']) if 'Taille salle' in sheet3_df.columns \
+        else np.full(len(sheet3_df), np.nan)
+    result['Zone'] = result['Région']
+
+    if sheet5_df is not None and len(sheet5_df) > 0:
+        rollup = rollup_sheet5_by_school(sheet5_df)
+        surveyed_area = pd.Series(keys, index=result.index).map(rollup['Superficie moyenne (m²)']).to_numpy(dtype=float)
+        room_area = np.where(np.isnan(surveyed_area), room_area, surveyed_area)
+
+        # Moughataa connue par Sheet5 : appariement plus fin que la région
+        moughataa = sheet5_df.assign(_key=normalize_school_names(sheet5_df['Ecole'])) \
+            .drop_duplicates('_key').set_index('_key')['Moughataa']
+        # Index de la table d'entrée (filtrée, triée ou consolidée) : fillna s'aligne sur lui
+        result['Zone'] = pd.Series(keys, index=result.index).map(moughataa).fillna(result['Région']).to_numpy()
+
+    # Salles sans surface connue : surface médiane des autres écoles
+    room_area = np.where(np.isnan(room_area), np.nanmedian(room_area), room_area)
+
+    used_rooms = sheet3_df['Salles utilisées'].fillna(0).to_numpy(dtype=float)
+    spare_rooms = sheet3_df['Salles non utilisées'].fillna(0).to_numpy(dtype=float)
+    if include_other_uses:
+        spare_rooms = spare_rooms + sheet3_df['Autres usages'].fillna(0).to_numpy(dtype=float)
+
+    pupils = np.round(sheet3_df['Ratio moyen'].fillna(0).to_numpy(dtype=float) * used_rooms)
+    seats_per_room = np.floor(room_area / m2_per_pupil)
+
+    excess = np.clip(pupils - used_rooms * seats_per_room, 0, None)
+    free_seats = spare_rooms * seats_per_room
+    absorbed = np.minimum(excess, free_seats)
+
+    result['Surface par salle (m²)'] = np.round(room_area, 1)
+    result['Élèves estimés'] = pupils
+    result['Places par salle'] = seats_per_room
+    result['Salles libres'] = spare_rooms
+    result['Excédent'] = excess
+    result['Absorbés sur place'] = absorbed
+    result['Excédent restant'] = excess - absorbed
+    result['Places libres restantes'] = free_seats - absorbed
+
+    return result
+
+def match_within_zones(capacities):
+    """Apparie les écoles en excédent aux écoles ayant des places libres, zone par zone
+
+    Les plus gros excédents sont servis par les plus grandes capacités : les cumuls des deux
+    listes triées sont fusionnés et chaque segment commun devient un transfert (sans boucle par élève).
+    """
+    transfers = []
+
+    for zone, group in capacities.groupby('Zone', sort=False):
+        senders = group[group['Excédent restant'] > 0].sort_values('Excédent restant', ascending=False)
+        receivers = group[group['Places libres restantes'] > 0].sort_values('Places libres restantes', ascending=False)
+
+        if senders.empty or receivers.empty:
+            continue
+
+        send_cum = senders['Excédent restant'].cumsum().to_numpy()
+        receive_cum = receivers['Places libres restantes'].cumsum().to_numpy()
+        total = min(send_cum[-1], receive_cum[-1])
+
+        breakpoints = np.unique(np.concatenate([[0], send_cum, receive_cum]))
+        breakpoints = breakpoints[breakpoints <= total]
+        if len(breakpoints) < 2:
+            continue
+
+        starts, ends = breakpoints[:-1], breakpoints[1:]
+        sender_pos = np.searchsorted(send_cum, starts, side='right')
+        receiver_pos = np.searchsorted(receive_cum, starts, side='right')
+
+        transfers.append(pd.DataFrame({
+            'Zone': zone,
+            'Région': senders['Région'].to_numpy()[sender_pos],
+            'École en excédent': senders['Ecole'].to_numpy()[sender_pos],
+            'École d\'accueil': receivers['Ecole'].to_numpy()[receiver_pos],
+            'Élèves transférés': ends - starts
+        }))
+
+    if not transfers:
+        return pd.DataFrame(columns=['Zone', 'Région', 'École en excédent', 'École d\'accueil', 'Élèves transférés'])
+
+    return pd.concat(transfers, ignore_index=True)
+
+def region_summary(capacities, transfers):
+    """Bilan de la simulation par région"""
+    summary = capacities.groupby('Région').agg(**{
+        'Écoles': ('Ecole', 'size'),
+        'Salles libres': ('Salles libres', 'sum'),
+        'Excédent': ('Excédent', 'sum'),
+        'Absorbés sur place': ('Absorbés sur place', 'sum'),
+        'Places libres': ('Places libres restantes', 'sum')
+    })
+    summary['Transférés'] = transfers.groupby('Région')['Élèves transférés'].sum()
+    summary['Transférés'] = summary['Transférés'].fillna(0)
+    summary['Excédent non résorbé'] = summary['Excédent'] - summary['Absorbés sur place'] - summary['Transférés']
+
+    return summary.reset_index()
+
+def simulate_reassignment(sheet3_df, sheet5_df=None, m2_per_pupil=DEFAULT_M2_PER_PUPIL, include_other_uses=False):
+    """Simulation complète : capacités par école, transferts par zone et bilan par région"""
+    capacities = school_capacities(sheet3_df, sheet5_df, m2_per_pupil, include_other_uses)
+    transfers = match_within_zones(capacities)
+
+    return capacities, transfers, region_summary(capacities, transfers)
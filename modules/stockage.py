@@ -0,0 +1,202 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+import streamlit as st
+import pandas as pd
+from modules.mesures import measured
+
+# Base SQLite locale (modifiable via la variable d'environnement ANALYSE_SCOLAIRE_DB)
+DB_PATH = os.environ.get(
+    'ANALYSE_SCOLAIRE_DB',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'stockage.sqlite')
+)
+
+# Colonnes géographiques et nom d'école indexées lorsqu'elles existent
+INDEXED_COLUMNS = ['Région', 'Region', 'Moughataa', 'Ecole', "Nom de l'ecole", 'École']
+
+# Fonctions d'agrégation autorisées dans les requêtes
+AGGREGATIONS = {'sum': 'SUM', 'mean': 'AVG', 'count': 'COUNT', 'min': 'MIN', 'max': 'MAX'}
+
+
+def _quote(name):
+    """Protège un nom de colonne ou de table pour SQLite"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+def _connect():
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS datasets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sheet TEXT NOT NULL,
+            file_name TEXT,
+            file_digest TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            n_rows INTEGER,
+            created_at TEXT,
+            UNIQUE (sheet, content_hash)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_datasets_digest ON datasets (sheet, file_digest)")
+    # États agrégés : une version par feuille et par lignée (les anciennes tables indexées par
+    # feuille seule sont recréées, les états se reconstruisent au téléversement suivant)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(snapshots)")]
+    if columns and 'lineage' not in columns:
+        conn.execute("DROP TABLE snapshots")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS snapshots (
+            sheet TEXT NOT NULL,
+            lineage TEXT NOT NULL,
+            file_digest TEXT NOT NULL,
+            state BLOB NOT NULL,
+            created_at TEXT,
+            PRIMARY KEY (sheet, lineage)
+        )
+    """)
+    return conn
+
+def content_hash(df):
+    """Empreinte du contenu nettoyé (indépendante du nom et du format du fichier)"""
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    digest = hashlib.sha1(row_hashes.tobytes())
+    digest.update(repr(list(df.columns)).encode('utf-8'))
+    return digest.hexdigest()
+
+def save_dataset(df, sheet, file_name, file_digest):
+    """Enregistre une feuille nettoyée et retourne son identifiant
+
+    Un fichier déjà enregistré (même empreinte) ou un contenu identique n'est pas dupliqué.
+    """
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+
+    with closing(_connect()) as conn:
+        row = conn.execute(
+            "SELECT id FROM datasets WHERE sheet = ? AND file_digest = ?", (sheet, file_digest)
+        ).fetchone()
+        if row:
+            return row[0]
+
+        data_hash = content_hash(df)
+        row = conn.execute(
+            "SELECT id FROM datasets WHERE sheet = ? AND content_hash = ?", (sheet, data_hash)
+        ).fetchone()
+        if row:
+            return row[0]
+
+        cursor = conn.execute(
+            "INSERT INTO datasets (sheet, file_name, file_digest, content_hash, n_rows, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (sheet, file_name, file_digest, data_hash, len(df), datetime.now().isoformat(timespec='seconds'))
+        )
+        dataset_id = cursor.lastrowid
+        table = f'ds_{dataset_id}'
+
+        try:
+            df.to_sql(table, conn, index=False, chunksize=10_000)
+
+            for position, col in enumerate(c for c in INDEXED_COLUMNS if c in df.columns):
+                conn.execute(
+                    f"CREATE INDEX {_quote(f'idx_{table}_{position}')} ON {_quote(table)} ({_quote(col)})"
+                )
+            conn.commit()
+        except Exception:
+            # Ne pas laisser de jeu de données à moitié enregistré
+            conn.rollback()
+            conn.execute("DELETE FROM datasets WHERE id = ?", (dataset_id,))
+            conn.execute(f"DROP TABLE IF EXISTS {_quote(table)}")
+            conn.commit()
+            raise
+
+        return dataset_id
+
+def list_datasets(sheet):
+    """Liste les jeux de données enregistrés pour une feuille, du plus récent au plus ancien"""
+    if not os.path.exists(DB_PATH):
+        return pd.DataFrame(columns=['id', 'file_name', 'file_digest', 'n_rows', 'created_at'])
+
+    with closing(_connect()) as conn:
+        return pd.read_sql_query(
+            "SELECT id, file_name, file_digest, n_rows, created_at FROM datasets "
+            "WHERE sheet = ? ORDER BY id DESC",
+            conn,
+            params=(sheet,)
+        )
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def load_dataset(dataset_id):
+    """Recharge un jeu de données enregistré ; retourne le DataFrame et l'empreinte du fichier d'origine"""
+    with closing(_connect()) as conn:
+        file_digest = conn.execute(
+            "SELECT file_digest FROM datasets WHERE id = ?", (dataset_id,)
+        ).fetchone()[0]
+        df = pd.read_sql_query(f"SELECT * FROM {_quote(f'ds_{dataset_id}')}", conn)
+
+    return df, file_digest
+
+@measured("Agrégation SQLite")
+def aggregate_dataset(dataset_id, group_by, metrics, filters=None):
+    """Agrégation filtrée exécutée par SQLite (les filtres profitent des index)
+
+    `metrics` associe une colonne à une agrégation ('sum', 'mean', 'count', 'min', 'max'),
+    `filters` associe une colonne à la liste des valeurs retenues.
+    """
+    select = [_quote(group_by)] + [
+        f"{AGGREGATIONS[agg]}({_quote(col)}) AS {_quote(col)}" for col, agg in metrics.items()
+    ]
+    # Comme pandas, les lignes sans valeur de regroupement sont ignorées
+    where, params = [f"{_quote(group_by)} IS NOT NULL"], []
+    for col, values in (filters or {}).items():
+        where.append(f"{_quote(col)} IN ({', '.join('?' * len(values))})")
+        params.extend(values)
+
+    query = (
+        f"SELECT {', '.join(select)} FROM {_quote(f'ds_{dataset_id}')} "
+        f"WHERE {' AND '.join(where)} GROUP BY {_quote(group_by)}"
+    )
+
+    with closing(_connect()) as conn:
+        return pd.read_sql_query(query, conn, params=params)
+
+def save_snapshot(sheet, lineage, file_digest, snapshot):
+    """Remplace l'état agrégé conservé pour une feuille et une lignée (seule la dernière version est gardée)"""
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+
+    with closing(_connect()) as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO snapshots (sheet, lineage, file_digest, state, created_at) VALUES (?, ?, ?, ?, ?)",
+            (sheet, lineage, file_digest, pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL),
+             datetime.now().isoformat(timespec='seconds'))
+        )
+        conn.commit()
+
+def latest_snapshot(sheet, lineage):
+    """Dernier état agrégé enregistré pour une feuille et une lignée, ou None"""
+    if not os.path.exists(DB_PATH):
+        return None
+
+    with closing(_connect()) as conn:
+        row = conn.execute(
+            "SELECT state FROM snapshots WHERE sheet = ? AND lineage = ?", (sheet, lineage)
+        ).fetchone()
+
+    return pickle.loads(row[0]) if row else None
+
+def stored_dataset_picker(sheet, key, label="📂 Ou rouvrir un jeu de données déjà téléversé :"):
+    """Liste déroulante des jeux enregistrés ; retourne l'identifiant choisi ou None"""
+    datasets = list_datasets(sheet)
+
+    if datasets.empty:
+        return None
+
+    labels = {
+        int(row.id): f"{row.file_name} — {row.created_at} ({row.n_rows} lignes)"
+        for row in datasets.itertuples()
+    }
+    return st.selectbox(
+        label,
+        options=[None] + list(labels),
+        format_func=lambda dataset_id: "—" if dataset_id is None else labels[dataset_id],
+        key=key
+    )
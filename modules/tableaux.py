@@ -8,6 +8,17 @@ from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+from modules.lecture import UPLOAD_TYPES, load_sheet
+from modules.validation import route_sheet
+from modules.consolidation import consolidation_uploader
+from modules.formulaires import submit_params, submitted_params, run_if_changed, show_rerun_counter
+from modules.pagination import paginated_dataframe
+from modules.exportation import export_buttons
+from modules.anomalies import quality_section
+from modules.stockage import save_dataset, load_dataset, stored_dataset_picker
+from modules.annees import BD_SCHEMA, YEAR_METRICS, N_YEARS, to_long, from_long, growth_metrics, national_totals
+from modules.previsions import MODELS, FORECAST_METRICS, forecast_schools
+from modules.mesures import stage, measured
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -154,6 +165,7 @@ def apply_excel_formatting(writer, sheet_name, df):
     for col_letter, width in column_widths.items():
         worksheet.column_dimensions[col_letter].width = width
 
+@measured("Export Excel")
 def create_annual_tables(df):
     """Crée les tableaux pour chaque année à partir du format spécifique"""
     
@@ -260,6 +272,7 @@ def create_annual_tables(df):
     
     return output
 
+@measured("Construction du graphique")
 def create_statistical_graphs(df, selected_year, x_variable, y_variable, graph_type):
     """Crée des graphiques statistiques binaires"""
     
@@ -392,17 +405,54 @@ def create_statistical_graphs(df, selected_year, x_variable, y_variable, graph_t
 def main():
     # Section de téléversement
     st.markdown('<div class="upload-section">', unsafe_allow_html=True)
-    uploaded_file = st.file_uploader(
-        "Téléversez votre fichier Excel (BD.xlsx)",
-        type=['xlsx', 'xls'],
-        help="Le fichier doit avoir exactement 21 colonnes"
+    consolidation = st.checkbox(
+        "📚 Consolider plusieurs fichiers (un par région)", key="tableaux_consolidation"
     )
+    uploaded_file, consolidated_df, consolidated_digest = None, None, None
+    if consolidation:
+        consolidated_df, consolidated_digest = consolidation_uploader(
+            'BD', 'tableaux_consolidation', 0, schema=BD_SCHEMA
+        )
+    else:
+        uploaded_file = st.file_uploader(
+            "Téléversez votre fichier (BD.xlsx, ou export CSV, Parquet, JSON Lines)",
+            type=UPLOAD_TYPES,
+            help="Le fichier doit avoir exactement 21 colonnes"
+        )
+    stored_dataset_id = None
+    if uploaded_file is None and not consolidation:
+        stored_dataset_id = stored_dataset_picker('BD', key="tableaux_jeu_enregistre")
     st.markdown('</div>', unsafe_allow_html=True)
     
-    if uploaded_file is not None:
+    if uploaded_file is not None or consolidated_df is not None or stored_dataset_id is not None:
         try:
-            # Lire le fichier Excel
-            df = pd.read_excel(uploaded_file, engine='openpyxl')
+            if uploaded_file is not None:
+                # Vérifier la structure sur les seuls en-têtes avant toute lecture complète
+                sheet_name = route_sheet(uploaded_file, 'BD', 0)
+                if sheet_name is None:
+                    return
+                
+                # Lire les 21 colonnes de la base (mis en cache tant que le fichier ne change pas)
+                df, digest = load_sheet(uploaded_file, sheet_name, schema=BD_SCHEMA, mapped=True)
+                
+                # Conserver les années au format long (une ligne par école et par année)
+                if len(df.columns) == 21:
+                    run_if_changed(
+                        'tableaux_stockage', digest,
+                        lambda: save_dataset(to_long(df), 'BD', uploaded_file.name, digest)
+                    )
+            elif consolidated_df is not None:
+                # La colonne Source est détachée pour conserver la disposition à 21 colonnes
+                df, digest = consolidated_df, consolidated_digest
+                sources = df.pop('Source')
+                
+                run_if_changed(
+                    'tableaux_stockage', digest,
+                    lambda: save_dataset(to_long(df), 'BD', f"Consolidation de {sources.nunique()} fichier(s)", digest)
+                )
+            else:
+                long_df, digest = load_dataset(stored_dataset_id)
+                df = from_long(long_df)
             
             # Afficher les informations sur la structure
             st.markdown('<div class="info-box">', unsafe_allow_html=True)
@@ -449,7 +499,9 @@ def main():
             st.markdown('</div>', unsafe_allow_html=True)
             
             # Créer des onglets pour différentes fonctionnalités
-            tab1, tab2 = st.tabs(["📋 Génération des Tableaux", "📈 Analyse Statistique"])
+            tab1, tab2, tab3, tab4 = st.tabs([
+                "📋 Génération des Tableaux", "📈 Analyse Statistique", "📉 Tendances pluriannuelles", "🔮 Prévisions"
+            ])
             
             with tab1:
                 # Bouton pour générer les tableaux
@@ -515,13 +567,18 @@ def main():
                             
                         except Exception as e:
                             st.error(f"❌ Erreur lors de la génération : {str(e)}")
+                
+                # Règles de cohérence (DP > élèves, sauts d'une année à l'autre)
+                if len(df.columns) == 21:
+                    with st.expander("🚨 Contrôle de qualité des données", expanded=False):
+                        quality_section(df, 'BD', 'tableaux_qualite', digest)
             
             with tab2:
                 st.markdown("## 📈 Analyse Statistique Binaire")
                 st.markdown("Générez des graphiques pour analyser les relations entre différentes variables.")
                 
-                # Section de sélection des paramètres
-                with st.container():
+                # Section de sélection des paramètres (aucun rerun avant validation)
+                with st.form("tableaux_analyse"):
                     st.markdown("### ⚙️ Paramètres de l'analyse")
                     
                     col1, col2, col3 = st.columns(3)
@@ -548,47 +605,52 @@ def main():
                             "Nbre DP", "Nbre enseign", "Nbre Eleves", "Ratio élèves/DP"
                         ]
                         
-                        if graph_type in ["Nuage de points", "Diagramme en barres"]:
-                            # Pour ces graphiques, besoin de deux variables
-                            x_variable = st.selectbox(
-                                "Variable X:",
-                                options=available_variables,
-                                index=0
-                            )
-                            y_variable = st.selectbox(
-                                "Variable Y:",
-                                options=available_variables,
-                                index=1
-                            )
-                        else:
-                            # Pour les autres graphiques, une seule variable suffit
-                            x_variable = st.selectbox(
-                                "Variable à analyser:",
-                                options=available_variables,
-                                index=0
-                            )
-                            y_variable = x_variable  # Même variable pour Y
+                        x_variable = st.selectbox(
+                            "Variable X:",
+                            options=available_variables,
+                            index=0
+                        )
+                        y_variable = st.selectbox(
+                            "Variable Y:",
+                            options=available_variables,
+                            index=1,
+                            help="Utilisée uniquement pour le nuage de points et le diagramme en barres"
+                        )
                     
                     # Bouton pour générer le graphique
-                    generate_graph_button = st.button(
+                    generate_graph_button = st.form_submit_button(
                         "📊 Générer le graphique",
                         type="primary",
                         use_container_width=True
                     )
                 
-                # Section d'affichage des résultats
                 if generate_graph_button:
+                    submit_params('tableaux_analyse', digest, (selected_year, graph_type, x_variable, y_variable))
+                
+                # Section d'affichage des résultats (paramètres de la dernière validation)
+                params = submitted_params('tableaux_analyse', digest)
+                if params is not None:
+                    selected_year, graph_type, x_variable, y_variable = params
+                    if graph_type not in ["Nuage de points", "Diagramme en barres"]:
+                        # Pour les autres graphiques, une seule variable suffit
+                        y_variable = x_variable
+                    
                     with st.spinner("🔄 Génération du graphique en cours..."):
                         try:
-                            # Créer le graphique
-                            fig, analysis_df = create_statistical_graphs(
-                                df, selected_year, x_variable, y_variable, graph_type
+                            # Créer le graphique (réutilisé si les paramètres n'ont pas changé)
+                            fig, analysis_df = run_if_changed(
+                                'tableaux_analyse',
+                                (digest, selected_year, graph_type, x_variable, y_variable),
+                                lambda: create_statistical_graphs(
+                                    df, selected_year, x_variable, y_variable, graph_type
+                                )
                             )
                             
                             if fig:
                                 # Afficher le graphique
                                 st.markdown('<div class="graph-card">', unsafe_allow_html=True)
-                                st.plotly_chart(fig, use_container_width=True)
+                                with stage("Sérialisation du graphique"):
+                                    st.plotly_chart(fig, use_container_width=True)
                                 st.markdown('</div>', unsafe_allow_html=True)
                                 
                                 # Afficher les statistiques résumées
@@ -622,22 +684,26 @@ def main():
                                 
                                 # Afficher un aperçu des données d'analyse
                                 with st.expander("🔍 Voir les données d'analyse", expanded=False):
-                                    st.dataframe(
-                                        analysis_df.sort_values('Ratio élèves/DP', ascending=False),
-                                        use_container_width=True
+                                    paginated_dataframe(
+                                        analysis_df,
+                                        'tableaux_donnees_analyse',
+                                        (digest,) + params,
+                                        sort_column='Ratio élèves/DP'
                                     )
                                     
                                     # Option pour télécharger les données d'analyse
-                                    csv_data = analysis_df.to_csv(index=False).encode('utf-8')
-                                    st.download_button(
-                                        label="📥 Télécharger les données d'analyse (CSV)",
-                                        data=csv_data,
-                                        file_name=f"donnees_analyse_annee_{selected_year}.csv",
-                                        mime="text/csv"
+                                    # Fichier construit à la demande (seulement les lignes du filtre actif)
+                                    export_buttons(
+                                        analysis_df,
+                                        'tableaux_export_analyse',
+                                        (digest,) + params,
+                                        f"donnees_analyse_annee_{selected_year}"
                                     )
                             
                         except Exception as e:
                             st.error(f"❌ Erreur lors de la génération du graphique : {str(e)}")
+                    
+                    show_rerun_counter('tableaux_analyse')
                 
                 # Section d'exemples de graphiques
                 with st.expander("💡 Exemples d'analyses possibles", expanded=False):
@@ -655,6 +721,208 @@ def main():
                     - Le box plot permet de comparer les distributions entre régions
                     - La carte thermique révèle les corrélations entre toutes les variables
                     """)
+            
+            with tab3:
+                st.markdown("## 📉 Tendances pluriannuelles")
+                st.markdown("Croissance annuelle, taux de croissance annuel moyen (TCAM) et tendance sur les six années.")
+                
+                if len(df.columns) != 21:
+                    st.warning("⚠️ Les tendances nécessitent la structure à 21 colonnes (3 indicateurs × 6 années).")
+                else:
+                    # Indicateurs de toutes les écoles calculés en une passe, une fois par fichier
+                    trends_df = run_if_changed('tableaux_tendances', digest, lambda: growth_metrics(df))
+                    totals_df = run_if_changed('tableaux_totaux_nationaux', digest, lambda: national_totals(df))
+                    
+                    # Évolution nationale
+                    with st.expander("🌍 Évolution nationale", expanded=True):
+                        col1, col2 = st.columns(2)
+                        
+                        with col1:
+                            fig = px.line(
+                                totals_df.melt(id_vars='Année', value_vars=YEAR_METRICS,
+                                               var_name='Indicateur', value_name='Total'),
+                                x='Année', y='Total', color='Indicateur', markers=True,
+                                title="Totaux par année"
+                            )
+                            fig.update_layout(template="plotly_white", height=350)
+                            with stage("Sérialisation du graphique"):
+                                st.plotly_chart(fig, use_container_width=True)
+                        
+                        with col2:
+                            fig = px.bar(
+                                totals_df.melt(id_vars='Année',
+                                               value_vars=[f'Croissance {metric} (%)' for metric in YEAR_METRICS],
+                                               var_name='Indicateur', value_name='Croissance (%)'),
+                                x='Année', y='Croissance (%)', color='Indicateur', barmode='group',
+                                title="Croissance d'une année sur l'autre"
+                            )
+                            fig.update_layout(template="plotly_white", height=350)
+                            with stage("Sérialisation du graphique"):
+                                st.plotly_chart(fig, use_container_width=True)
+                    
+                    # Filtres appliqués par masques vectorisés (aucun recalcul des indicateurs)
+                    col1, col2, col3 = st.columns(3)
+                    
+                    with col1:
+                        trend_metric = st.selectbox(
+                            "Indicateur:",
+                            options=YEAR_METRICS,
+                            index=2,
+                            key="tableaux_tendances_indicateur"
+                        )
+                    
+                    with col2:
+                        direction = st.selectbox(
+                            "Tendance:",
+                            options=["Toutes", "En hausse", "En baisse"],
+                            key="tableaux_tendances_sens"
+                        )
+                    
+                    with col3:
+                        moughataas = st.multiselect(
+                            "Moughataa:",
+                            options=sorted(trends_df['Moughataa'].dropna().astype(str).unique()),
+                            key="tableaux_tendances_moughataa"
+                        )
+                    
+                    slope_col = f'Tendance {trend_metric} (/an)'
+                    mask = np.ones(len(trends_df), dtype=bool)
+                    if direction == "En hausse":
+                        mask &= (trends_df[slope_col] > 0).to_numpy()
+                    elif direction == "En baisse":
+                        mask &= (trends_df[slope_col] < 0).to_numpy()
+                    if moughataas:
+                        mask &= trends_df['Moughataa'].astype(str).isin(moughataas).to_numpy()
+                    
+                    display_cols = ['Region', 'Moughataa', "Nom de l'ecole"] + [
+                        col for col in trends_df.columns if trend_metric in col
+                    ]
+                    filtered_df = trends_df.loc[mask, display_cols]
+                    filter_key = (digest, trend_metric, direction, tuple(moughataas))
+                    
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        st.metric("Écoles retenues", f"{len(filtered_df):,}")
+                    with col2:
+                        st.metric("Tendance médiane", f"{filtered_df[slope_col].median():.2f} /an")
+                    with col3:
+                        st.metric("TCAM médian", f"{filtered_df[f'TCAM {trend_metric} (%)'].median():.1f} %")
+                    
+                    fig = px.histogram(
+                        filtered_df, x=slope_col, nbins=40,
+                        title=f"Distribution des tendances - {trend_metric}"
+                    )
+                    fig.update_layout(template="plotly_white", height=300)
+                    st.plotly_chart(fig, use_container_width=True)
+                    
+                    # Tri et recherche instantanés (ordres de tri mis en cache)
+                    paginated_dataframe(
+                        filtered_df,
+                        'tableaux_tendances_table',
+                        filter_key,
+                        sort_column=slope_col
+                    )
+                    
+                    export_buttons(
+                        filtered_df,
+                        'tableaux_export_tendances',
+                        filter_key,
+                        f"tendances_{trend_metric.replace(' ', '_').lower()}"
+                    )
+            
+            with tab4:
+                st.markdown("## 🔮 Prévisions par école")
+                st.markdown("Projection des élèves et des DP de chaque école à partir des six années observées.")
+                
+                if len(df.columns) != 21:
+                    st.warning("⚠️ Les prévisions nécessitent la structure à 21 colonnes (3 indicateurs × 6 années).")
+                else:
+                    with st.form("tableaux_previsions"):
+                        horizon = st.selectbox(
+                            "Horizon de prévision:",
+                            options=[1, 2, 3],
+                            format_func=lambda h: f"Année {N_YEARS + h} (+{h} an{'s' if h > 1 else ''})"
+                        )
+                        st.caption(
+                            "Trois modèles (" + ", ".join(MODELS).lower() + ") sont comparés sur la dernière "
+                            "année observée ; le plus précis est retenu pour chaque école."
+                        )
+                        forecast_button = st.form_submit_button(
+                            "🔮 Calculer les prévisions",
+                            type="primary",
+                            use_container_width=True
+                        )
+                    
+                    if forecast_button:
+                        submit_params('tableaux_previsions', digest, (horizon,))
+                    
+                    params = submitted_params('tableaux_previsions', digest)
+                    if params is not None:
+                        horizon, = params
+                        target_year = N_YEARS + horizon
+                        
+                        with st.spinner("🔄 Calcul des prévisions..."):
+                            # Toutes les écoles en une passe (réutilisé si l'horizon n'a pas changé)
+                            forecast_df = run_if_changed(
+                                'tableaux_previsions',
+                                (digest, horizon),
+                                lambda: forecast_schools(df, horizon)
+                            )
+                        
+                        col1, col2, col3 = st.columns(3)
+                        
+                        with col1:
+                            observed = forecast_df[f'Élèves année {N_YEARS}'].sum()
+                            projected = forecast_df[f'Élèves prévus année {target_year}'].sum()
+                            st.metric(
+                                f"Élèves prévus (année {target_year})",
+                                f"{projected:,.0f}",
+                                f"{projected - observed:+,.0f}"
+                            )
+                        
+                        with col2:
+                            observed = forecast_df[f'DP année {N_YEARS}'].sum()
+                            projected = forecast_df[f'DP prévus année {target_year}'].sum()
+                            st.metric(
+                                f"DP prévus (année {target_year})",
+                                f"{projected:,.0f}",
+                                f"{projected - observed:+,.0f}"
+                            )
+                        
+                        with col3:
+                            st.metric(
+                                "Ratio élèves/DP médian prévu",
+                                f"{forecast_df[f'Ratio élèves/DP prévu année {target_year}'].median():.1f}"
+                            )
+                        
+                        # Modèles retenus
+                        model_counts = pd.DataFrame({
+                            label: forecast_df[f'Modèle {label}'].value_counts().reindex(MODELS, fill_value=0)
+                            for label in FORECAST_METRICS.values()
+                        }).rename_axis('Modèle').reset_index()
+                        fig = px.bar(
+                            model_counts.melt(id_vars='Modèle', var_name='Indicateur', value_name='Écoles'),
+                            x='Modèle', y='Écoles', color='Indicateur', barmode='group',
+                            title="Modèle retenu par école"
+                        )
+                        fig.update_layout(template="plotly_white", height=300)
+                        st.plotly_chart(fig, use_container_width=True)
+                        
+                        paginated_dataframe(
+                            forecast_df,
+                            'tableaux_previsions_table',
+                            (digest, horizon),
+                            sort_column=f'Ratio élèves/DP prévu année {target_year}'
+                        )
+                        
+                        export_buttons(
+                            forecast_df,
+                            'tableaux_export_previsions',
+                            (digest, horizon),
+                            f"previsions_annee_{target_year}"
+                        )
+                        
+                        show_rerun_counter('tableaux_previsions')
         
         except Exception as e:
             st.error(f"❌ Erreur lors de la lecture du fichier : {str(e)}")
@@ -7,6 +7,21 @@ from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+from modules.lecture import UPLOAD_TYPES, load_sheet, load_sheet4_with_density
+from modules.validation import route_sheet
+from modules.nettoyage import SHEET_SCHEMAS, clean_sheet3_data, clean_sheet4_data
+from modules.formulaires import submit_params, submitted_params, run_if_changed, show_rerun_counter
+from modules.pagination import paginated_dataframe
+from modules.exportation import export_buttons
+from modules.correspondance import school_index_section
+from modules.consolidation import consolidation_uploader
+from modules.anomalies import quality_section
+from modules.allocation import RESOURCES, OBJECTIVES, allocate_resources, category_shift
+from modules.regroupement import clustering_section
+from modules.voisins import cached_neighbor_index, show_similar_schools
+from modules.stockage import save_dataset, load_dataset, stored_dataset_picker, aggregate_dataset
+from modules.actualisation import ingest_snapshot, ranked_positions
+from modules.mesures import stage, measured
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -111,146 +126,78 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-def clean_sheet4_data(df):
-    """Nettoie et prépare les données de la feuille Sheet4"""
+@measured("Statistiques récapitulatives")
+def create_summary_statistics(snapshot):
+    """Crée des statistiques récapitulatives pour Sheet4 à partir de l'état agrégé (cube par région, classements)"""
     
-    # Renommer les colonnes pour uniformité
-    rename_dict = {}
-    for col in df.columns:
-        col_str = str(col)
-        
-        if 'Région' in col_str:
-            rename_dict[col] = 'Région'
-        elif 'Ecole' in col_str or 'Ecole' in col_str:
-            rename_dict[col] = 'Ecole'
-        elif 'Nbre DP' in col_str:
-            rename_dict[col] = 'Nbre DP total'
-        elif 'Nbre enseign' in col_str:
-            rename_dict[col] = 'Nbre enseignants total'
-        elif 'Nbre Eleves' in col_str:
-            rename_dict[col] = 'Nbre élèves total'
-    
-    df = df.rename(columns=rename_dict)
-    
-    # Nettoyer les données numériques
-    numeric_columns = ['Nbre DP total', 'Nbre enseignants total', 'Nbre élèves total']
-    
-    for col in numeric_columns:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-    
-    # Calculer des métriques supplémentaires
-    # Ratio élèves/DP
-    if 'Nbre élèves total' in df.columns and 'Nbre DP total' in df.columns:
-        df['Ratio élèves/DP total'] = (df['Nbre élèves total'] / df['Nbre DP total']).round(1)
-    
-    # Ratio élèves/enseignants
-    if 'Nbre élèves total' in df.columns and 'Nbre enseignants total' in df.columns:
-        df['Ratio élèves/enseignants total'] = (df['Nbre élèves total'] / df['Nbre enseignants total']).round(1)
-    
-    # Ratio enseignants/DP
-    if 'Nbre enseignants total' in df.columns and 'Nbre DP total' in df.columns:
-        df['Ratio enseignants/DP total'] = (df['Nbre enseignants total'] / df['Nbre DP total']).round(1)
-    
-    # Calculer la charge par enseignant
-    if 'Nbre élèves total' in df.columns and 'Nbre enseignants total' in df.columns:
-        df['Charge par enseignant'] = df['Nbre élèves total'] / df['Nbre enseignants total']
-    
-    # Calculer l'efficacité DP (élèves par DP)
-    if 'Nbre élèves total' in df.columns and 'Nbre DP total' in df.columns:
-        df['Efficacité DP'] = df['Nbre élèves total'] / df['Nbre DP total']
+    cube, rankings = snapshot['cube'], snapshot['rankings']
+    stats = {}
     
-    # Catégoriser les écoles par taille
-    if 'Nbre élèves total' in df.columns:
-        conditions = [
-            df['Nbre élèves total'] >= 500,
-            df['Nbre élèves total'] >= 300,
-            df['Nbre élèves total'] >= 100,
-            df['Nbre élèves total'] < 100
-        ]
-        choices = ['Très grande (≥500)', 'Grande (300-500)', 'Moyenne (100-300)', 'Petite (<100)']
-        df['Catégorie taille'] = np.select(conditions, choices, default='Non définie')
+    def total(metric):
+        return cube[f'{metric}|somme'].sum()
     
-    # Catégoriser par ratio élèves/DP
-    if 'Ratio élèves/DP total' in df.columns:
-        conditions = [
-            df['Ratio élèves/DP total'] >= 60,
-            df['Ratio élèves/DP total'] >= 40,
-            df['Ratio élèves/DP total'] >= 20,
-            df['Ratio élèves/DP total'] < 20
-        ]
-        choices = ['Très élevé (≥60)', 'Élevé (40-60)', 'Normal (20-40)', 'Faible (<20)']
-        df['Catégorie ratio'] = np.select(conditions, choices, default='Non définie')
+    def mean(metric):
+        # Comme pandas : une valeur infinie l'emporte, deux infinis de signes opposés donnent NaN
+        positive, negative = cube[f'{metric}|+inf'].sum(), cube[f'{metric}|-inf'].sum()
+        if positive or negative:
+            return np.nan if positive and negative else (np.inf if positive else -np.inf)
+        count = cube[f'{metric}|n'].sum()
+        return round(total(metric) / count, 1) if count else np.nan
     
-    # Calculer la densité (si on avait la superficie)
-    # df['Densité élèves/m²'] = df['Nbre élèves total'] / df['Superficie totale']
+    def extreme(metric, last=False):
+        values = rankings[metric]['Valeur']
+        return values.iloc[-1 if last else 0] if len(values) else np.nan
     
-    return df
-
-def create_summary_statistics(df):
-    """Crée des statistiques récapitulatives pour Sheet4"""
-    
-    stats = {}
+    regions = cube.drop(index='Non renseignée', errors='ignore').sort_index()
     
     # Statistiques de base
-    stats['Nombre d\'écoles'] = len(df)
-    stats['Nombre de régions'] = df['Région'].nunique() if 'Région' in df.columns else 0
+    stats['Nombre d\'écoles'] = int(cube['Lignes'].sum())
+    stats['Nombre de régions'] = len(regions)
     
     # Totaux globaux
-    if 'Nbre élèves total' in df.columns:
-        stats['Total élèves'] = int(df['Nbre élèves total'].sum())
-        stats['Moyenne élèves par école'] = df['Nbre élèves total'].mean().round(1)
-        stats['Max élèves'] = int(df['Nbre élèves total'].max())
-        stats['Min élèves'] = int(df['Nbre élèves total'].min())
+    if 'Nbre élèves total' in rankings:
+        stats['Total élèves'] = int(total('Nbre élèves total'))
+        stats['Moyenne élèves par école'] = mean('Nbre élèves total')
+        stats['Max élèves'] = int(extreme('Nbre élèves total'))
+        stats['Min élèves'] = int(extreme('Nbre élèves total', last=True))
     
-    if 'Nbre enseignants total' in df.columns:
-        stats['Total enseignants'] = int(df['Nbre enseignants total'].sum())
-        stats['Moyenne enseignants par école'] = df['Nbre enseignants total'].mean().round(1)
+    if 'Nbre enseignants total' in rankings:
+        stats['Total enseignants'] = int(total('Nbre enseignants total'))
+        stats['Moyenne enseignants par école'] = mean('Nbre enseignants total')
     
-    if 'Nbre DP total' in df.columns:
-        stats['Total DP'] = int(df['Nbre DP total'].sum())
-        stats['Moyenne DP par école'] = df['Nbre DP total'].mean().round(1)
+    if 'Nbre DP total' in rankings:
+        stats['Total DP'] = int(total('Nbre DP total'))
+        stats['Moyenne DP par école'] = mean('Nbre DP total')
     
     # Ratios moyens
-    if 'Ratio élèves/DP total' in df.columns:
-        stats['Ratio élèves/DP moyen'] = df['Ratio élèves/DP total'].mean().round(1)
-        stats['Ratio élèves/DP max'] = df['Ratio élèves/DP total'].max().round(1)
-        stats['Ratio élèves/DP min'] = df['Ratio élèves/DP total'].min().round(1)
-    
-    if 'Ratio élèves/enseignants total' in df.columns:
-        stats['Ratio élèves/enseignants moyen'] = df['Ratio élèves/enseignants total'].mean().round(1)
+    if 'Ratio élèves/DP total' in rankings:
+        stats['Ratio élèves/DP moyen'] = mean('Ratio élèves/DP total')
+        stats['Ratio élèves/DP max'] = round(extreme('Ratio élèves/DP total'), 1)
+        stats['Ratio élèves/DP min'] = round(extreme('Ratio élèves/DP total', last=True), 1)
     
-    # Distribution par catégorie de taille
-    if 'Catégorie taille' in df.columns:
-        taille_counts = df['Catégorie taille'].value_counts()
-        for cat, count in taille_counts.items():
-            stats[f'Écoles {cat}'] = count
+    if 'Ratio élèves/enseignants total' in rankings:
+        stats['Ratio élèves/enseignants moyen'] = mean('Ratio élèves/enseignants total')
     
-    # Distribution par catégorie de ratio
-    if 'Catégorie ratio' in df.columns:
-        ratio_counts = df['Catégorie ratio'].value_counts()
-        for cat, count in ratio_counts.items():
-            stats[f'Ratio {cat}'] = count
+    # Distribution par catégorie de taille, puis de ratio
+    for category, label in [('Catégorie taille', 'Écoles'), ('Catégorie ratio', 'Ratio')]:
+        counts = cube.filter(like=f'{category}=').sum().sort_values(ascending=False)
+        for col, count in counts.items():
+            stats[f'{label} {col.split("=", 1)[1]}'] = int(count)
     
     # Statistiques par région
-    if 'Région' in df.columns and 'Nbre élèves total' in df.columns:
-        region_stats = df.groupby('Région').agg({
-            'Nbre élèves total': ['sum', 'mean', 'count'],
-            'Nbre enseignants total': 'sum',
-            'Nbre DP total': 'sum'
-        })
-        
-        for region in region_stats.index:
-            stats[f'{region} - Nombre d\'écoles'] = int(region_stats.loc[region, ('Nbre élèves total', 'count')])
-            stats[f'{region} - Total élèves'] = int(region_stats.loc[region, ('Nbre élèves total', 'sum')])
+    if 'Nbre élèves total' in rankings:
+        for region, row in regions.iterrows():
+            stats[f'{region} - Nombre d\'écoles'] = int(row['Nbre élèves total|n'])
+            stats[f'{region} - Total élèves'] = int(row['Nbre élèves total|somme'])
     
     return pd.Series(stats)
 
+@measured("Construction du graphique")
 def create_binary_statistical_graphs(df, x_variable, y_variable, graph_type, color_variable=None):
     """Crée des graphiques statistiques binaires"""
     
-    # Préparer les données
-    analysis_df = df.copy()
+    # Données lues sans copie : le résultat mémorisé ne duplique pas la table filtrée
+    analysis_df = df
     
     # Vérifier que les variables existent
     if x_variable not in analysis_df.columns:
@@ -486,20 +433,59 @@ def create_binary_statistical_graphs(df, x_variable, y_variable, graph_type, col
 def main():
     # Section de téléversement
     st.markdown('<div class="upload-section">', unsafe_allow_html=True)
-    uploaded_file = st.file_uploader(
-        "📤 Téléversez votre fichier Excel (FIFA project.xlsx)",
-        type=['xlsx', 'xls'],
-        help="Le fichier doit contenir une feuille 'Sheet4' avec les totaux par école"
+    consolidation = st.checkbox(
+        "📚 Consolider plusieurs fichiers (un par région)", key="totaux_consolidation"
     )
+    uploaded_file, consolidated_df, consolidated_digest = None, None, None
+    if consolidation:
+        consolidated_df, consolidated_digest = consolidation_uploader(
+            'Sheet4', 'totaux_consolidation', cleaner=clean_sheet4_data, schema=SHEET_SCHEMAS['Sheet4']
+        )
+    else:
+        uploaded_file = st.file_uploader(
+            "📤 Téléversez votre fichier (FIFA project.xlsx, ou export CSV, Parquet, JSON Lines)",
+            type=UPLOAD_TYPES,
+            help="Le fichier doit contenir une feuille 'Sheet4' avec les totaux par école (ou en être un export CSV, Parquet, JSON Lines)"
+        )
+    stored_dataset_id = None
+    if uploaded_file is None and not consolidation:
+        stored_dataset_id = stored_dataset_picker('Sheet4', key="totaux_jeu_enregistre")
     st.markdown('</div>', unsafe_allow_html=True)
     
-    if uploaded_file is not None:
+    if uploaded_file is not None or consolidated_df is not None or stored_dataset_id is not None:
         try:
-            # Lire uniquement la feuille Sheet4
-            df = pd.read_excel(uploaded_file, sheet_name='Sheet4', engine='openpyxl')
+            if uploaded_file is not None:
+                # Vérifier la structure sur les seuls en-têtes avant toute lecture complète
+                sheet_name = route_sheet(uploaded_file, 'Sheet4')
+                if sheet_name is None:
+                    return
+                
+                # Lire et nettoyer la feuille Sheet4, enrichie des superficies de Sheet5
+                # (mis en cache tant que le fichier ne change pas)
+                df, digest = load_sheet4_with_density(uploaded_file, sheet_name)
+                
+                # Conserver la feuille nettoyée pour pouvoir la rouvrir sans le classeur
+                dataset_id = run_if_changed(
+                    'totaux_stockage', digest,
+                    lambda: save_dataset(df, 'Sheet4', uploaded_file.name, digest)
+                )
+            elif consolidated_df is not None:
+                df, digest = consolidated_df, consolidated_digest
+                
+                # Conserver la table consolidée (colonne Source comprise)
+                dataset_id = run_if_changed(
+                    'totaux_stockage', digest,
+                    lambda: save_dataset(df, 'Sheet4', f"Consolidation de {df['Source'].nunique()} fichier(s)", digest)
+                )
+            else:
+                df, digest = load_dataset(stored_dataset_id)
+                dataset_id = stored_dataset_id
             
-            # Nettoyer les données
-            df = clean_sheet4_data(df)
+            # Cube par région, classements et statistiques mis à jour pour les seules écoles
+            # modifiées depuis la dernière version (recalcul complet si le schéma change)
+            snapshot, refresh = run_if_changed(
+                'totaux_actualisation', digest, lambda: ingest_snapshot('Sheet4', df, digest)
+            )
             
             # Afficher les informations sur la structure
             st.markdown('<div class="info-box">', unsafe_allow_html=True)
@@ -551,17 +537,24 @@ def main():
             st.markdown('</div>', unsafe_allow_html=True)
             
             # Créer des onglets pour différentes fonctionnalités
-            tab1, tab2, tab3 = st.tabs(["📋 Vue d'ensemble", "📈 Analyse Statistique", "🏆 Classements"])
+            tab1, tab2, tab3, tab4, tab5 = st.tabs([
+                "📋 Vue d'ensemble", "📈 Analyse Statistique", "🏆 Classements", "⚖️ Répartition des ressources", "🧩 Regroupement"
+            ])
             
             with tab1:
                 # Aperçu des données
                 with st.expander("🔍 Aperçu des données brutes", expanded=True):
-                    st.dataframe(df.head(20), use_container_width=True)
+                    paginated_dataframe(df, 'totaux_apercu', digest)
                     st.caption(f"Dimensions : {df.shape[0]} lignes × {df.shape[1]} colonnes")
                 
                 # Statistiques récapitulatives
                 with st.expander("📊 Statistiques descriptives", expanded=True):
-                    stats = create_summary_statistics(df)
+                    stats = run_if_changed('totaux_statistiques', digest, lambda: create_summary_statistics(snapshot))
+                    if refresh['mode'] == 'incrémental':
+                        st.caption(
+                            f"♻️ Mise à jour incrémentale : {refresh['modifiées']} école(s) recalculée(s) "
+                            f"sur {refresh['écoles']}"
+                        )
                     
                     # Afficher les métriques clés
                     st.subheader("📊 Métriques Clés")
@@ -569,7 +562,7 @@ def main():
                     col1, col2, col3, col4 = st.columns(4)
                     
                     key_metrics = {
-                        'Total écoles': f"{stats.get('Nombre d\'écoles', 0)}",
+                        'Total écoles': str(stats.get("Nombre d'écoles", 0)),
                         'Élèves/école': f"{stats.get('Moyenne élèves par école', 0):.0f}",
                         'Enseignants/école': f"{stats.get('Moyenne enseignants par école', 0):.1f}",
                         'Ratio élèves/DP': f"{stats.get('Ratio élèves/DP moyen', 0):.1f}"
@@ -604,12 +597,18 @@ def main():
                             )
                             fig1.update_layout(template="plotly_white", height=300,
                                              xaxis_title="Nombre d'élèves", yaxis_title="Nombre d'écoles")
-                            st.plotly_chart(fig1, use_container_width=True)
+                            with stage("Sérialisation du graphique"):
+                                st.plotly_chart(fig1, use_container_width=True)
                     
                     with col2:
                         # Diagramme en barres par région
                         if 'Région' in df.columns and 'Nbre élèves total' in df.columns:
-                            region_totals = df.groupby('Région')['Nbre élèves total'].sum().sort_values(ascending=False)
+                            # Agrégation exécutée par la base (colonne Région indexée)
+                            region_totals = (
+                                aggregate_dataset(dataset_id, 'Région', {'Nbre élèves total': 'sum'})
+                                .set_index('Région')['Nbre élèves total']
+                                .sort_values(ascending=False)
+                            )
                             fig2 = px.bar(
                                 x=region_totals.index,
                                 y=region_totals.values,
@@ -619,35 +618,51 @@ def main():
                             )
                             fig2.update_layout(template="plotly_white", height=300, 
                                              xaxis_title="Région", yaxis_title="Nombre d'élèves")
-                            st.plotly_chart(fig2, use_container_width=True)
+                            with stage("Sérialisation du graphique"):
+                                st.plotly_chart(fig2, use_container_width=True)
                 
                 # Téléchargement des données nettoyées
                 with st.expander("💾 Télécharger les données", expanded=False):
-                    csv_data = df.to_csv(index=False).encode('utf-8')
-                    st.download_button(
-                        label="📥 Télécharger les données nettoyées (CSV)",
-                        data=csv_data,
-                        file_name="donnees_totaux_ecoles_nettoyees.csv",
-                        mime="text/csv",
-                        use_container_width=True
+                    # Fichier construit à la demande, par blocs
+                    export_buttons(
+                        df,
+                        'totaux_export_nettoyees',
+                        (digest, 'Sheet4', 'nettoyees'),
+                        "donnees_totaux_ecoles_nettoyees"
                     )
+                
+                # Correspondance des écoles avec les autres feuilles du classeur
+                with st.expander("🔗 Correspondance entre feuilles", expanded=False):
+                    school_index_section(uploaded_file, 'totaux_correspondance')
+                
+                # Règles de cohérence et valeurs aberrantes
+                with st.expander("🚨 Contrôle de qualité des données", expanded=False):
+                    quality_section(df, 'Sheet4', 'totaux_qualite', digest)
             
             with tab2:
                 st.markdown("## 📈 Analyse Statistique Binaire")
                 st.markdown("Générez des graphiques pour analyser les relations entre différentes variables.")
                 
-                # Section de sélection des paramètres
-                with st.container():
+                # Variables disponibles pour l'analyse
+                available_variables = list(df.columns)
+                numeric_vars = df.select_dtypes(include=[np.number]).columns.tolist()
+                categorical_vars = df.select_dtypes(include=['object']).columns.tolist()
+                
+                # Le choix de la variable de filtre détermine les valeurs proposées dans le formulaire
+                filter_variable = st.selectbox(
+                    "Filtrer par (optionnel):",
+                    options=["Aucun filtre"] + categorical_vars,
+                    index=0,
+                    key="totaux_filtre"
+                )
+                
+                # Section de sélection des paramètres (aucun rerun avant validation)
+                with st.form("totaux_analyse"):
                     st.markdown("### ⚙️ Paramètres de l'analyse")
                     
                     col1, col2, col3 = st.columns(3)
                     
                     with col1:
-                        # Sélection des variables
-                        available_variables = list(df.columns)
-                        numeric_vars = df.select_dtypes(include=[np.number]).columns.tolist()
-                        categorical_vars = df.select_dtypes(include=['object']).columns.tolist()
-                        
                         x_variable = st.selectbox(
                             "Variable X:",
                             options=available_variables,
@@ -694,12 +709,7 @@ def main():
                                 color_variable = None
                         
                         with col2:
-                            filter_variable = st.selectbox(
-                                "Filtrer par (optionnel):",
-                                options=["Aucun filtre"] + categorical_vars,
-                                index=0
-                            )
-                            
+                            selected_filter = None
                             if filter_variable != "Aucun filtre" and filter_variable in df.columns:
                                 filter_values = df[filter_variable].unique()
                                 selected_filter = st.multiselect(
@@ -709,31 +719,42 @@ def main():
                                 )
                     
                     # Bouton pour générer le graphique
-                    generate_graph_button = st.button(
+                    generate_graph_button = st.form_submit_button(
                         "📊 Générer le graphique",
                         type="primary",
                         use_container_width=True
                     )
                 
-                # Section d'affichage des résultats
                 if generate_graph_button:
+                    submit_params('totaux_analyse', digest, (
+                        x_variable, y_variable, graph_type, color_variable, filter_variable, selected_filter
+                    ))
+                
+                # Section d'affichage des résultats (paramètres de la dernière validation)
+                params = submitted_params('totaux_analyse', digest)
+                if params is not None:
+                    x_variable, y_variable, graph_type, color_variable, filter_variable, selected_filter = params
+                    
+                    def compute_graph():
+                        # Appliquer les filtres
+                        filtered_df = df
+                        if selected_filter is not None:
+                            filtered_df = df[df[filter_variable].isin(selected_filter)]
+                        
+                        return create_binary_statistical_graphs(
+                            filtered_df, x_variable, y_variable, graph_type, color_variable
+                        )
+                    
                     with st.spinner("🔄 Génération du graphique en cours..."):
                         try:
-                            # Appliquer les filtres
-                            filtered_df = df.copy()
-                            
-                            if filter_variable != "Aucun filtre" and filter_variable in df.columns and 'selected_filter' in locals():
-                                filtered_df = filtered_df[filtered_df[filter_variable].isin(selected_filter)]
-                            
-                            # Créer le graphique
-                            fig, analysis_df = create_binary_statistical_graphs(
-                                filtered_df, x_variable, y_variable, graph_type, color_variable
-                            )
+                            # Créer le graphique (réutilisé si les paramètres n'ont pas changé)
+                            fig, analysis_df = run_if_changed('totaux_analyse', (digest,) + params, compute_graph)
                             
                             if fig:
                                 # Afficher le graphique
                                 st.markdown('<div class="graph-card">', unsafe_allow_html=True)
-                                st.plotly_chart(fig, use_container_width=True)
+                                with stage("Sérialisation du graphique"):
+                                    st.plotly_chart(fig, use_container_width=True)
                                 st.markdown('</div>', unsafe_allow_html=True)
                                 
                                 # Afficher les statistiques
@@ -773,24 +794,27 @@ def main():
                                     if color_variable:
                                         display_cols.append(color_variable)
                                     display_cols.extend(['Ecole', 'Région'])
+                                    display_cols = list(dict.fromkeys(display_cols))
                                     
-                                    st.dataframe(
-                                        analysis_df[display_cols].head(20),
-                                        use_container_width=True
+                                    paginated_dataframe(
+                                        analysis_df[display_cols],
+                                        'totaux_donnees_analyse',
+                                        (digest,) + params
                                     )
                                     
                                     # Option pour télécharger les données d'analyse
-                                    csv_data = analysis_df.to_csv(index=False).encode('utf-8')
-                                    st.download_button(
-                                        label="📥 Télécharger les données d'analyse (CSV)",
-                                        data=csv_data,
-                                        file_name=f"donnees_analyse_{x_variable}_vs_{y_variable}.csv",
-                                        mime="text/csv",
-                                        use_container_width=True
+                                    # Fichier construit à la demande (seulement les lignes du filtre actif)
+                                    export_buttons(
+                                        analysis_df,
+                                        'totaux_export_analyse',
+                                        (digest,) + params,
+                                        f"donnees_analyse_{x_variable}_vs_{y_variable}"
                                     )
                             
                         except Exception as e:
                             st.error(f"❌ Erreur lors de la génération du graphique : {str(e)}")
+                    
+                    show_rerun_counter('totaux_analyse')
                 
                 # Section d'exemples d'analyses
                 with st.expander("💡 Exemples d'analyses possibles", expanded=True):
@@ -802,11 +826,13 @@ def main():
                     3. **Distribution par Région** : Comparer les totaux entre régions
                     4. **Ratio vs Taille école** : Comment les ratios varient avec la taille
                     5. **Enseignants vs DP** : Relation entre personnel et salles
+                    6. **Élèves vs Densité élèves/m²** : Repérer les écoles à l'étroit (feuille Sheet5 requise)
                     
                     **Variables numériques disponibles :**
                     - Nbre élèves total, Nbre enseignants total, Nbre DP total
                     - Ratio élèves/DP total, Ratio élèves/enseignants total, Ratio enseignants/DP total
                     - Charge par enseignant, Efficacité DP
+                    - Superficie totale (m²), Salles à réhabiliter, Densité élèves/m², Élèves par salle (depuis Sheet5)
                     
                     **Variables catégorielles disponibles :**
                     - Région, Nom de l'école
@@ -827,14 +853,22 @@ def main():
                 # Classement par nombre d'élèves
                 with st.expander("🥇 Classement par Nombre d'Élèves", expanded=True):
                     if 'Nbre élèves total' in df.columns and 'Ecole' in df.columns:
-                        ranked_df = df.sort_values('Nbre élèves total', ascending=False)
+                        # Ordre tenu à jour dans l'état agrégé (fusion des seules écoles modifiées)
+                        ranked_df = df.iloc[run_if_changed(
+                            'totaux_classement', digest,
+                            lambda: ranked_positions(snapshot, df, 'Sheet4', 'Nbre élèves total')
+                        )]
                         ranked_df = ranked_df[['Ecole', 'Région', 'Nbre élèves total', 
                                               'Nbre enseignants total', 'Nbre DP total', 'Ratio élèves/DP total']]
                         ranked_df['Rang'] = range(1, len(ranked_df) + 1)
                         
-                        st.dataframe(
-                            ranked_df.head(10),
-                            use_container_width=True,
+                        paginated_dataframe(
+                            ranked_df,
+                            'totaux_classement_eleves',
+                            digest,
+                            sort_column='Rang',
+                            ascending=True,
+                            page_size=10,
                             column_config={
                                 "Rang": st.column_config.NumberColumn(format="%d"),
                                 "Nbre élèves total": st.column_config.NumberColumn(format="%d"),
@@ -864,9 +898,13 @@ def main():
                                                     'Nbre élèves total', 'Nbre DP total']]
                         ratio_ranked['Rang'] = range(1, len(ratio_ranked) + 1)
                         
-                        st.dataframe(
-                            ratio_ranked.head(10),
-                            use_container_width=True,
+                        paginated_dataframe(
+                            ratio_ranked,
+                            'totaux_classement_ratio',
+                            digest,
+                            sort_column='Rang',
+                            ascending=True,
+                            page_size=10,
                             column_config={
                                 "Rang": st.column_config.NumberColumn(format="%d"),
                                 "Ratio élèves/DP total": st.column_config.NumberColumn(format="%.1f"),
@@ -875,6 +913,35 @@ def main():
                             }
                         )
                 
+                # Comparaison avec les écoles de profil semblable
+                with st.expander("👥 Écoles similaires", expanded=False):
+                    # Indicateurs de Sheet3 ajoutés lorsque le classeur complet est disponible
+                    sheet3_df = None
+                    if uploaded_file is not None:
+                        try:
+                            sheet3_df, _ = load_sheet(uploaded_file, 'Sheet3', clean_sheet3_data, SHEET_SCHEMAS['Sheet3'])
+                        except ValueError:
+                            sheet3_df = None
+                    
+                    peers_df, neighbor_index = cached_neighbor_index(
+                        (digest, sheet3_df is not None), df, sheet3_df
+                    )
+                    
+                    col1, col2 = st.columns([3, 1])
+                    with col1:
+                        peer_key = st.selectbox(
+                            "École de référence:",
+                            options=peers_df.index.tolist(),
+                            format_func=lambda key: peers_df.at[key, 'Ecole'],
+                            key="totaux_voisins_ecole"
+                        )
+                    with col2:
+                        n_peers = st.number_input(
+                            "Nombre d'écoles:", min_value=1, max_value=50, value=10, key="totaux_voisins_nombre"
+                        )
+                    
+                    show_similar_schools(peers_df, neighbor_index, peer_key, int(n_peers))
+                
                 # Analyse par catégorie de taille
                 with st.expander("🏢 Analyse par Catégorie de Taille", expanded=False):
                     if 'Catégorie taille' in df.columns:
@@ -919,6 +986,101 @@ def main():
                             st.metric("Écoles ratio ≥60", len(ratio_eleve))
                             st.metric("Moyenne élèves ratio élevé", 
                                     f"{ratio_eleve['Nbre élèves total'].mean():.0f}")
+            
+            with tab4:
+                st.markdown("## ⚖️ Répartition des ressources")
+                st.markdown("Attribuez des DP ou des enseignants supplémentaires aux écoles les plus chargées de chaque zone.")
+                
+                group_options = [col for col in ['Moughataa', 'Région'] if col in df.columns]
+                resource_options = [col for col in RESOURCES if col in df.columns]
+                
+                if not group_options or not resource_options or 'Nbre élèves total' not in df.columns:
+                    st.warning("⚠️ Colonnes nécessaires absentes (zone, nombre d'élèves, DP ou enseignants).")
+                else:
+                    with st.form("totaux_allocation"):
+                        col1, col2, col3, col4 = st.columns(4)
+                        
+                        with col1:
+                            resource_col = st.selectbox("Ressource à répartir:", options=resource_options)
+                        with col2:
+                            group_col = st.selectbox("Répartir par:", options=group_options)
+                        with col3:
+                            budget = st.number_input(
+                                "Unités par zone:", min_value=1, max_value=10_000, value=5, step=1
+                            )
+                        with col4:
+                            objective = st.selectbox("Objectif:", options=OBJECTIVES)
+                        
+                        allocate_button = st.form_submit_button(
+                            "⚖️ Calculer la répartition",
+                            type="primary",
+                            use_container_width=True
+                        )
+                    
+                    if allocate_button:
+                        submit_params('totaux_allocation', digest, (resource_col, group_col, int(budget), objective))
+                    
+                    params = submitted_params('totaux_allocation', digest)
+                    if params is not None:
+                        resource_col, group_col, budget, objective = params
+                        
+                        allocation_df = run_if_changed(
+                            'totaux_allocation',
+                            (digest,) + params,
+                            lambda: allocate_resources(df, group_col, resource_col, budget, objective)
+                        )
+                        ratio_col = RESOURCES[resource_col]
+                        
+                        col1, col2, col3 = st.columns(3)
+                        with col1:
+                            st.metric("Unités attribuées", f"{allocation_df['Unités ajoutées'].sum():,}")
+                        with col2:
+                            before = allocation_df[f'{ratio_col} (avant)'].max()
+                            after = allocation_df[f'{ratio_col} (après)'].max()
+                            st.metric("Ratio maximal", f"{after:.1f}", f"{after - before:+.1f}", delta_color="inverse")
+                        with col3:
+                            before = allocation_df[f'{ratio_col} (avant)'].std()
+                            after = allocation_df[f'{ratio_col} (après)'].std()
+                            st.metric("Écart-type des ratios", f"{after:.1f}", f"{after - before:+.1f}", delta_color="inverse")
+                        
+                        # Distribution des catégories avant / après
+                        shift_df = category_shift(allocation_df).reset_index()
+                        fig = px.bar(
+                            shift_df.melt(id_vars='Catégorie ratio', var_name='Situation', value_name='Écoles'),
+                            x='Catégorie ratio', y='Écoles', color='Situation', barmode='group',
+                            title="Catégories de ratio avant et après répartition"
+                        )
+                        fig.update_layout(template="plotly_white", height=350)
+                        st.plotly_chart(fig, use_container_width=True)
+                        
+                        # Écoles bénéficiaires
+                        beneficiaries = allocation_df[allocation_df['Unités ajoutées'] > 0]
+                        st.markdown(f"**{len(beneficiaries)} école(s) bénéficiaire(s)**")
+                        paginated_dataframe(
+                            beneficiaries,
+                            'totaux_allocation_table',
+                            (digest,) + params,
+                            sort_column='Unités ajoutées'
+                        )
+                        
+                        export_buttons(
+                            allocation_df,
+                            'totaux_export_allocation',
+                            (digest,) + params,
+                            "repartition_ressources"
+                        )
+                        
+                        show_rerun_counter('totaux_allocation')
+            
+            with tab5:
+                st.markdown("## 🧩 Regroupement des écoles")
+                st.markdown("Groupes d'écoles aux profils semblables (k-means sur variables centrées-réduites).")
+                clustering_section(
+                    df,
+                    'totaux_regroupement',
+                    digest,
+                    ['Nbre élèves total', 'Ratio élèves/DP total', 'Ratio élèves/enseignants total', 'Densité élèves/m²']
+                )
         
         except Exception as e:
             st.error(f"❌ Erreur lors de la lecture du fichier : {str(e)}")
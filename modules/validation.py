@@ -0,0 +1,171 @@
+import zipfile
+import openpyxl
+import pandas as pd
+import streamlit as st
+from modules.annees import BASE_COLUMNS, YEAR_METRICS, N_YEARS
+from modules.lecture import file_digest, file_format, read_headers, pq
+
+# En-têtes attendus par feuille (fragments recherchés comme dans les fonctions de nettoyage)
+REQUIRED_HEADERS = {
+    'Sheet4': ['Région', 'Ecole', 'Nbre DP', 'Nbre enseign', 'Nbre Eleves'],
+    'Sheet3': ['Région', 'Ecole', 'Ratio moyen', "Nombre total de salles de classe dans l'école",
+               'Salle de classe utilisée', 'Salle de classe non utilisée'],
+    'Sheet5': ['Moughataa', 'Ecole', 'La superficie de la salle', 'Nombre de prises de la salle',
+               'La salle nécessite-t-elle une réhabilitation'],
+    'BD': BASE_COLUMNS + YEAR_METRICS
+}
+
+# Nombre exact de colonnes exigé (base BD : 3 colonnes + 3 indicateurs × 6 années)
+REQUIRED_WIDTH = {'BD': len(BASE_COLUMNS) + len(YEAR_METRICS) * N_YEARS}
+
+# Page à utiliser pour chaque disposition reconnue
+LAYOUT_PAGES = {
+    'Sheet4': 'Totaux par École',
+    'Sheet3': 'Ratios et Statistiques',
+    'Sheet5': 'Analyse des Salles',
+    'BD': 'Tableaux Scolaires'
+}
+
+
+def header_coverage(headers, layout):
+    """Part des en-têtes attendus d'une disposition présents dans une ligne d'en-tête"""
+    headers = [str(header) for header in headers if header is not None]
+    required = REQUIRED_HEADERS[layout]
+    found = sum(1 for fragment in required if any(fragment in header for header in headers))
+    return found / len(required)
+
+def _matches(sheet, layout):
+    """Une feuille inspectée correspond-elle entièrement à la disposition ?"""
+    width = REQUIRED_WIDTH.get(layout)
+    return sheet['coverage'][layout] == 1 and (width is None or sheet['columns'] == width)
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _inspect(digest, _uploaded_file):
+    """Lit uniquement les métadonnées et la ligne d'en-tête de chaque feuille (mode read_only)"""
+    _uploaded_file.seek(0)
+    workbook = openpyxl.load_workbook(_uploaded_file, read_only=True, data_only=True)
+
+    try:
+        sheets = []
+        for worksheet in workbook.worksheets:
+            headers = next(worksheet.iter_rows(min_row=1, max_row=1, values_only=True), ())
+            # Colonnes vides en fin de ligne ignorées, comme le fait pandas
+            headers = list(headers)
+            while headers and headers[-1] is None:
+                headers.pop()
+
+            sheets.append({
+                'name': worksheet.title,
+                'rows': max((worksheet.max_row or 1) - 1, 0),
+                'columns': len(headers),
+                'coverage': {layout: header_coverage(headers, layout) for layout in REQUIRED_HEADERS}
+            })
+    finally:
+        workbook.close()
+        _uploaded_file.seek(0)
+
+    return sheets
+
+def _inspect_flat(uploaded_file):
+    """Structure d'un fichier à table unique (CSV, Parquet, JSON Lines) d'après ses seuls en-têtes"""
+    headers = read_headers(uploaded_file)
+    rows = None
+    if file_format(uploaded_file) == 'parquet':
+        # Nombre de lignes disponible dans les métadonnées
+        rows = pq.ParquetFile(uploaded_file).metadata.num_rows
+        uploaded_file.seek(0)
+
+    return [{
+        'name': uploaded_file.name,
+        'rows': rows,
+        'columns': len(headers),
+        'coverage': {layout: header_coverage(headers, layout) for layout in REQUIRED_HEADERS}
+    }]
+
+def inspect_workbook(uploaded_file):
+    """Structure du classeur (feuilles, dimensions, couverture des en-têtes) sans lecture complète
+
+    Un fichier CSV, Parquet ou JSON Lines est décrit comme une feuille unique.
+    Retourne None pour les formats que openpyxl ne sait pas ouvrir (.xls).
+    """
+    if file_format(uploaded_file) != 'excel':
+        return _inspect_flat(uploaded_file)
+
+    uploaded_file.seek(0)
+    if not zipfile.is_zipfile(uploaded_file):
+        uploaded_file.seek(0)
+        return None
+
+    return _inspect(file_digest(uploaded_file), uploaded_file)
+
+def matching_layout(uploaded_file, layouts):
+    """Première disposition de `layouts` à laquelle correspond un fichier à table unique (ou None)"""
+    sheet = _inspect_flat(uploaded_file)[0]
+    return next((layout for layout in layouts if _matches(sheet, layout)), None)
+
+def layout_table(sheets):
+    """Tableau récapitulatif de l'inspection"""
+    return pd.DataFrame([
+        {
+            'Feuille': sheet['name'],
+            'Lignes': sheet['rows'],
+            'Colonnes': sheet['columns'],
+            **{f'{layout} (%)': round(coverage * 100) for layout, coverage in sheet['coverage'].items()}
+        }
+        for sheet in sheets
+    ])
+
+def _locate(sheets, uploaded_file, layout, default_sheet):
+    """Feuille inspectée correspondant à la disposition (feuille attendue d'abord), ou None"""
+    if file_format(uploaded_file) != 'excel':
+        # Table unique : elle convient ou non, il n'y a pas d'autre feuille à proposer
+        return 0 if _matches(sheets[0], layout) else None
+
+    expected = sheets[default_sheet] if isinstance(default_sheet, int) and default_sheet < len(sheets) else \
+        next((sheet for sheet in sheets if sheet['name'] == default_sheet), None)
+    if expected is not None and _matches(expected, layout):
+        return default_sheet
+
+    candidate = next((sheet for sheet in sheets if _matches(sheet, layout)), None)
+    return None if candidate is None else candidate['name']
+
+def locate_sheet(uploaded_file, layout, default_sheet=None):
+    """Feuille à lire pour une disposition, sans affichage (None si aucune ne convient)"""
+    default_sheet = layout if default_sheet is None else default_sheet
+    sheets = inspect_workbook(uploaded_file)
+
+    return default_sheet if sheets is None else _locate(sheets, uploaded_file, layout, default_sheet)
+
+def route_sheet(uploaded_file, layout, default_sheet=None):
+    """Choisit la feuille à lire pour une disposition avant toute lecture complète
+
+    Retourne le nom (ou l'indice) de la feuille à lire, éventuellement une autre feuille dont les
+    en-têtes correspondent, ou None après avoir affiché une erreur si aucune ne convient.
+    """
+    default_sheet = layout if default_sheet is None else default_sheet
+    sheets = inspect_workbook(uploaded_file)
+
+    if sheets is None:
+        # Ancien format .xls : pas d'inspection possible, lecture habituelle
+        return default_sheet
+
+    with st.expander("🧾 Structure du classeur", expanded=False):
+        st.dataframe(layout_table(sheets), use_container_width=True, hide_index=True)
+
+    sheet = _locate(sheets, uploaded_file, layout, default_sheet)
+    if sheet is not None:
+        if isinstance(sheet, str) and sheet != default_sheet:
+            st.info(f"ℹ️ En-têtes attendus trouvés dans la feuille « {sheet} » : elle est utilisée.")
+        return sheet
+
+    # Aucune feuille ne convient : indiquer la page adaptée au fichier
+    other_pages = sorted({
+        LAYOUT_PAGES[other] for sheet in sheets for other in REQUIRED_HEADERS
+        if other != layout and _matches(sheet, other)
+    })
+    message = f"❌ Aucune feuille du fichier ne correspond à la structure attendue ({LAYOUT_PAGES[layout]})."
+    if other_pages:
+        message += f" Ce fichier convient à : {', '.join(other_pages)}."
+    st.error(message)
+
+    return None
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from modules.nettoyage import normalize_school_names
+from modules.regroupement import standardize
+
+# Indicateurs de taille et de moyens utilisés pour comparer les écoles
+SHEET4_FEATURES = ['Nbre élèves total', 'Nbre DP total', 'Nbre enseignants total',
+                   'Ratio élèves/DP total', 'Ratio élèves/enseignants total']
+SHEET3_FEATURES = ['Total salles', 'Ratio moyen', 'Taux utilisation (%)']
+
+
+def peer_features(sheet4_df, sheet3_df=None):
+    """Table des indicateurs par école (Sheet4, complétée par Sheet3), indexée par nom normalisé"""
+    columns = ['Région', 'Ecole'] + [col for col in SHEET4_FEATURES if col in sheet4_df.columns]
+    features = sheet4_df[columns].assign(_key=normalize_school_names(sheet4_df['Ecole']))
+    features = features[features['_key'] != ''].drop_duplicates('_key')
+
+    if sheet3_df is not None:
+        sheet3_columns = [col for col in SHEET3_FEATURES if col in sheet3_df.columns]
+        sheet3_features = sheet3_df[sheet3_columns].assign(_key=normalize_school_names(sheet3_df['Ecole']))
+        features = features.merge(sheet3_features.drop_duplicates('_key'), on='_key', how='left')
+
+    # Indicateurs sans aucune valeur (aucun nom Sheet3 apparié, par exemple) : inutilisables
+    empty = [col for col in features.columns if col not in ('Région', 'Ecole', '_key') and features[col].isna().all()]
+    return features.drop(columns=empty).set_index('_key')
+
+def build_neighbor_index(features):
+    """Index des plus proches voisins : points centrés-réduits et normes précalculées"""
+    numeric = features.drop(columns=['Région', 'Ecole']).apply(pd.to_numeric, errors='coerce')
+    points = standardize(numeric.to_numpy())
+
+    return {
+        'keys': features.index.to_numpy(),
+        'positions': {key: position for position, key in enumerate(features.index)},
+        'points': points,
+        'sq_norms': (points ** 2).sum(axis=1)
+    }
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def cached_neighbor_index(data_key, _sheet4_df, _sheet3_df=None):
+    """Indicateurs et index des voisins, construits une fois par téléversement"""
+    features = peer_features(_sheet4_df, _sheet3_df)
+    return features, build_neighbor_index(features)
+
+def similar_schools(index, key, k=10):
+    """Les `k` écoles les plus proches de `key` (distance euclidienne sur variables centrées-réduites)
+
+    Un seul produit matrice-vecteur sur toutes les écoles puis une sélection partielle
+    (argpartition) : pas de tri complet.
+    """
+    position = index['positions'].get(key)
+    if position is None:
+        return pd.DataFrame(columns=['Clé', 'Distance'])
+
+    # L'école elle-même est écartée par position
+    others = np.delete(np.arange(len(index['keys'])), position)
+    k = min(k, len(others))
+    if k <= 0:
+        return pd.DataFrame(columns=['Clé', 'Distance'])
+
+    query = index['points'][position]
+    distances = index['sq_norms'][others] - 2 * index['points'][others] @ query + index['sq_norms'][position]
+
+    nearest = np.argpartition(distances, k - 1)[:k]
+    nearest = nearest[np.argsort(distances[nearest])]
+
+    return pd.DataFrame({
+        'Clé': index['keys'][others[nearest]],
+        'Distance': np.sqrt(np.maximum(distances[nearest], 0)).round(2)
+    })
+
+def show_similar_schools(features, index, key, k=10):
+    """Tableau des écoles similaires avec leurs indicateurs"""
+    neighbors = similar_schools(index, key, k)
+
+    if neighbors.empty:
+        st.info("ℹ️ Aucun indicateur disponible pour comparer cette école.")
+        return
+
+    table = features.loc[neighbors['Clé']].reset_index(drop=True)
+    table.insert(2, 'Distance', neighbors['Distance'].to_numpy())
+    st.dataframe(table, use_container_width=True, hide_index=True)